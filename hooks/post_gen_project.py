@@ -5,6 +5,7 @@ import shutil
 import socket
 import subprocess
 import sys
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
 
 
 def find_available_port(start_port=8000, max_attempts=100):
@@ -49,7 +50,6 @@ SECRET_KEY={dev_secret}
 
 APP_HOST=0.0.0.0
 APP_PORT={prod_port}
-APP_WORKERS=3
 APP_HOT_RELOAD=False
 SECRET_KEY={prod_secret}
 """
@@ -94,6 +94,18 @@ def setup_database():
         paths_to_remove = [
             "app/db",
             "migrations",
+            "app/routers/export.py",
+            "bench/db_sync_vs_async.py",
+            "bench/export_memory.py",
+            "bench/bulk_insert.py",
+            "bench/pagination.py",
+            "bench/replica_routing.py",
+            "bench/job_queue.py",
+            "app/worker.py",
+            "tests/test_export.py",
+            "tests/test_database.py",
+            "tests/test_jobs.py",
+            "tests/test_replica_routing.py",
         ]
 
         for path in paths_to_remove:
@@ -123,19 +135,11 @@ def setup_database():
 import sys
 try:
     import psycopg2
-    from sqlalchemy.engine.url import make_url
-    
-    url = make_url('{database_url}')
-    conn = psycopg2.connect(
-        host=url.host,
-        port=url.port or 5432,
-        user=url.username,
-        password=url.password,
-        database='postgres',
-        connect_timeout=10
-    )
+
+    # Keyword arguments override the ones in the URL.
+    conn = psycopg2.connect('{database_url}', dbname='postgres', connect_timeout=10)
     conn.close()
-    print('  ✓ Successfully connected to PostgreSQL server at', url.host)
+    print('  ✓ Successfully connected to PostgreSQL server at', '{urlsplit(database_url).hostname}')
 except Exception as e:
     print('  ✗ Failed to connect to PostgreSQL server')
     print('    Error:', str(e))
@@ -162,40 +166,14 @@ except Exception as e:
         print(f"  ✗ Failed to test connection: {e}")
         sys.exit(1)
 
-    # Parse URL using project's Python environment
-    parse_url_script = f"""
-from sqlalchemy.engine.url import make_url
-url = make_url('{database_url}')
-print(url.database)
-dev_db = url.database + "_dev"
-print(dev_db)
-
-# Add sslmode=disable to both prod and dev URLs
-prod_url = url.update_query_dict(dict(sslmode='disable'))
-dev_url = url.set(database=dev_db).update_query_dict(dict(sslmode='disable'))
-
-# Render with password visible
-print(prod_url.render_as_string(hide_password=False))
-print(dev_url.render_as_string(hide_password=False))
-"""
-
     try:
-        result = subprocess.run(
-            ["uv", "run", "python", "-c", parse_url_script],
-            capture_output=True,
-            text=True,
-            timeout=5,
-        )
-        if result.returncode != 0:
-            print("  ⚠ Failed to parse DATABASE_URL")
-            print(result.stderr)
-            return
-
-        lines = result.stdout.strip().split("\n")
-        prod_db_name = lines[0]
-        dev_db_name = lines[1]
-        prod_url_str = lines[2]
-        dev_url_str = lines[3]
+        url = urlsplit(database_url)
+        prod_db_name = unquote(url.path.lstrip("/"))
+        dev_db_name = prod_db_name + "_dev"
+        # Add sslmode=disable to both prod and dev URLs
+        query = urlencode({**dict(parse_qsl(url.query)), "sslmode": "disable"})
+        prod_url_str = urlunsplit(url._replace(query=query))
+        dev_url_str = urlunsplit(url._replace(path="/" + quote(dev_db_name), query=query))
 
         # Write to .env.prod
         env_prod_path = ".env.prod"
@@ -279,9 +257,6 @@ print(dev_url.render_as_string(hide_password=False))
         print(f"  Production DB: {prod_db_name}")
         print(f"  Development DB: {dev_db_name}")
 
-    except ImportError:
-        print("  ⚠ sqlalchemy not installed - skipping URL parsing")
-        print("    Please install: pip install sqlalchemy")
     except Exception as e:
         print(f"  ⚠ Error setting up database: {e}")
 
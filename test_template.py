@@ -128,7 +128,7 @@ def test_cookiecutter_generation(test_dir, with_db=False):
             main_py = generated_project / "app/main.py"
             content = main_py.read_text()
 
-            if "from db.connection import get_connection" in content:
+            if "from db.pool import" in content:
                 print("  OK: Database import found in main.py")
             else:
                 print("  ERROR: Database import NOT found in main.py")
@@ -145,7 +145,7 @@ def test_cookiecutter_generation(test_dir, with_db=False):
             main_py = generated_project / "app/main.py"
             content = main_py.read_text()
 
-            if "from db.connection import get_connection" not in content:
+            if "from db.pool import" not in content:
                 print("  OK: No database import in main.py (as expected)")
             else:
                 print(
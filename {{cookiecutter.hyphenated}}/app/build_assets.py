@@ -0,0 +1,44 @@
+"""Build static assets ahead of time.
+
+Compiles Tailwind, then fingerprints and precompresses everything under ``app/static/``
+into ``app/static/build/`` (see ``core.assets``). Run from the project root::
+
+    uv run app/build_assets.py                          # production build
+    uv run app/build_assets.py --precompile-templates   # also compile Jinja templates
+    uv run app/build_assets.py --watch                  # development: recompile Tailwind
+"""
+
+import argparse
+
+from loguru import logger
+
+from core import assets
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build static assets.")
+    parser.add_argument(
+        "--watch", action="store_true", help="only run Tailwind in watch mode (development)"
+    )
+    parser.add_argument("--skip-css", action="store_true", help="do not run Tailwind")
+    parser.add_argument(
+        "--precompile-templates",
+        action="store_true",
+        help=f"compile app/templates/ into {assets.COMPILED_TEMPLATES_DIR}",
+    )
+    args = parser.parse_args()
+
+    if args.watch:
+        assets.compile_css(watch=True)
+        return
+    if not args.skip_css:
+        assets.compile_css()
+    manifest = assets.build()
+    logger.info(f"Built {len(manifest)} assets into {assets.BUILD_DIR}")
+    if args.precompile_templates:
+        count = assets.precompile_templates()
+        logger.info(f"Compiled {count} templates into {assets.COMPILED_TEMPLATES_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Admission control: a per-worker limit on requests in flight that adapts to latency.
+
+Without it a worker accepts every request, and under a spike they all queue for the
+threadpool and the database together until every user waits seconds.
+``AdmissionMiddleware`` lets ``limit`` requests run at once. The others wait in a bounded
+FIFO queue (``ADMISSION_QUEUE_SIZE``) for at most ``ADMISSION_QUEUE_TIMEOUT`` seconds. A
+request arriving to a full queue, or still waiting at its deadline, is answered right
+away with ``503`` and ``Retry-After``, which costs the server next to nothing.
+
+The limit is adapted AIMD-style to the time to first byte of admitted requests (streamed
+bodies don't count):
+
+- above ``ADMISSION_LATENCY_TARGET`` the limit is cut by 10%, at most once per target
+  interval so one slow burst doesn't collapse it;
+- otherwise, while the limit is what holds requests back, it grows by ``1 / limit`` per
+  request, about one per round of ``limit`` requests;
+
+always within ``ADMISSION_MIN_LIMIT`` and ``ADMISSION_MAX_LIMIT``.
+
+Requests are classed by path prefix. ``ADMISSION_BYPASS_PATHS`` (health checks, static
+files, metrics) are never held back; ``ADMISSION_LOW_PRIORITY_PATHS`` are admitted only
+when no other request waits, and are shed first to make room in a full queue.
+"""
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import Sequence
+from enum import Enum
+
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core import metrics
+from core.config import settings
+
+# Share of the limit kept when latency is over target.
+BACKOFF = 0.9
+
+
+class Priority(Enum):
+    BYPASS = "bypass"
+    NORMAL = "normal"
+    LOW = "low"
+
+
+class OverloadedError(Exception):
+    """A request was shed: ``reason`` is ``queue_full``, ``timeout`` or ``evicted``."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    """Counts requests in flight against an adaptive limit and queues the rest.
+
+    Parameters
+    ----------
+    initial_limit, min_limit, max_limit
+        Requests allowed to run at once: at first, and the bounds of adaptation.
+    latency_target
+        Seconds to first byte above which the limit is lowered.
+    queue_size
+        Requests allowed to wait; further ones are shed.
+    queue_timeout
+        Seconds a request may wait before it is shed.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial_limit: int = 32,
+        min_limit: int = 4,
+        max_limit: int = 256,
+        latency_target: float = 0.5,
+        queue_size: int = 64,
+        queue_timeout: float = 2.0,
+    ) -> None:
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError(
+                f"invalid admission limits: min={min_limit}, initial={initial_limit},"
+                f" max={max_limit}"
+            )
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._queues: dict[Priority, deque[asyncio.Future]] = {
+            Priority.NORMAL: deque(),
+            Priority.LOW: deque(),
+        }
+        self._last_decrease = 0.0
+        # Reported from requests, so a preloading parent process never reports one.
+        self._reported_limit = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def acquire(self, priority: Priority = Priority.NORMAL) -> None:
+        """Wait until the request may run; raises ``OverloadedError`` if it is shed instead.
+
+        Every successful ``acquire`` must be followed by ``release``.
+        """
+        if self.in_flight < int(self.limit) and not self.queued:
+            self._admit()
+            return
+        if self.queued >= self.queue_size:
+            low = self._queues[Priority.LOW]
+            if priority is Priority.LOW or not low:
+                raise OverloadedError("queue_full")
+            # Make room at the expense of the newest low-priority request.
+            low.pop().set_result(False)
+            metrics.ADMISSION_QUEUED.labels(Priority.LOW.value).dec()
+
+        queue = self._queues[priority]
+        queued = metrics.ADMISSION_QUEUED.labels(priority.value)
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        queued.inc()
+        start = time.perf_counter()
+        try:
+            # asyncio.wait, unlike wait_for, leaves the future alone on timeout.
+            await asyncio.wait((waiter,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # The client went away while waiting.
+            if waiter.done():
+                if waiter.result():
+                    self.release(None)
+            else:
+                queue.remove(waiter)
+                queued.dec()
+            raise
+        finally:
+            metrics.ADMISSION_QUEUE_WAIT.observe(time.perf_counter() - start)
+        if not waiter.done():
+            queue.remove(waiter)
+            queued.dec()
+            raise OverloadedError("timeout")
+        if not waiter.result():
+            raise OverloadedError("evicted")
+
+    def release(self, latency: float | None) -> None:
+        """End an admitted request; ``latency`` (seconds to first byte) adapts the limit."""
+        if latency is not None:
+            self._adapt(latency)
+        if int(self.limit) != self._reported_limit:
+            self._reported_limit = int(self.limit)
+            metrics.ADMISSION_LIMIT.set(self._reported_limit)
+        self.in_flight -= 1
+        metrics.ADMISSION_IN_FLIGHT.dec()
+        self._wake()
+
+    def _admit(self) -> None:
+        self.in_flight += 1
+        metrics.ADMISSION_IN_FLIGHT.inc()
+
+    def _adapt(self, latency: float) -> None:
+        if latency > self.latency_target:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.latency_target:
+                self.limit = max(self.min_limit, self.limit * BACKOFF)
+                self._last_decrease = now
+        elif self.in_flight >= int(self.limit) or self.queued:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _wake(self) -> None:
+        """Hand free slots to waiting requests, normal ones first."""
+        for priority, queue in self._queues.items():
+            while queue and self.in_flight < int(self.limit):
+                self._admit()
+                queue.popleft().set_result(True)
+                metrics.ADMISSION_QUEUED.labels(priority.value).dec()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting HTTP requests through an ``AdmissionController``.
+
+    Parameters
+    ----------
+    controller
+        The worker's controller, normally ``core.admission.admission``.
+    bypass_paths, low_priority_paths
+        Path prefixes of requests never held back, and of low-priority ones.
+    retry_after
+        Seconds sent in ``Retry-After`` with a 503.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController,
+        bypass_paths: Sequence[str] = (),
+        low_priority_paths: Sequence[str] = (),
+        retry_after: int = 1,
+    ) -> None:
+        self.app = app
+        self.controller = controller
+        self.bypass_paths = tuple(bypass_paths)
+        self.low_priority_paths = tuple(low_priority_paths)
+        self.retry_after = retry_after
+
+    def priority(self, path: str) -> Priority:
+        if path.startswith(self.bypass_paths):
+            return Priority.BYPASS
+        if path.startswith(self.low_priority_paths):
+            return Priority.LOW
+        return Priority.NORMAL
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority = self.priority(scope["path"])
+        if priority is Priority.BYPASS:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(priority)
+        except OverloadedError as e:
+            metrics.ADMISSION_SHED.labels(priority.value, e.reason).inc()
+            response = PlainTextResponse(
+                "Server busy, please retry shortly.",
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        latency = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal latency
+            if latency is None and message["type"] == "http.response.start":
+                latency = time.perf_counter() - start
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.controller.release(latency)
+
+
+admission = AdmissionController(
+    initial_limit=settings.admission_initial_limit,
+    min_limit=settings.admission_min_limit,
+    max_limit=settings.admission_max_limit,
+    latency_target=settings.admission_latency_target,
+    queue_size=settings.admission_queue_size,
+    queue_timeout=settings.admission_queue_timeout,
+)
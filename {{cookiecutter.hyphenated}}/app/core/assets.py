@@ -0,0 +1,154 @@
+"""Static asset build and lookup.
+
+``app/build_assets.py`` runs ``build()`` at image build time: Tailwind is compiled once,
+every file under ``app/static/`` is copied to ``app/static/build/`` under a content-hashed
+name, compressible files get ``.gz`` (and ``.br`` when ``brotli`` is installed) siblings,
+and ``manifest.json`` maps logical paths to the fingerprinted ones.
+
+At runtime the app only calls ``load_manifest()``, and templates resolve URLs through the
+``static_url`` global, e.g. ``static_url('css/tailwind.css')``.
+
+``precompile_templates()`` optionally compiles ``app/templates/`` to Python modules as part
+of the same build; ``core.templates`` loads them instead of parsing the sources.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader
+from loguru import logger
+
+STATIC_DIR = Path("app/static")
+BUILD_DIR = STATIC_DIR / "build"
+MANIFEST_PATH = BUILD_DIR / "manifest.json"
+STATIC_URL_PREFIX = "/static/"
+
+TEMPLATES_DIR = Path("app/templates")
+COMPILED_TEMPLATES_DIR = Path("app/templates_compiled")
+# Compiled templates bake these options in, so core.templates must use the same ones.
+TEMPLATE_ENV_OPTIONS = {"autoescape": True}
+
+TAILWIND_INPUT = STATIC_DIR / "css" / "input.css"
+TAILWIND_OUTPUT = STATIC_DIR / "css" / "tailwind.css"
+
+COMPRESSIBLE_SUFFIXES = {
+    ".css",
+    ".js",
+    ".mjs",
+    ".map",
+    ".json",
+    ".svg",
+    ".txt",
+    ".xml",
+    ".html",
+    ".webmanifest",
+}
+MIN_COMPRESS_SIZE = 256
+HASH_LENGTH = 12
+
+# Sources that are inputs to the build rather than assets to serve.
+_SKIP_NAMES = {".gitkeep", "README.md", TAILWIND_INPUT.name}
+
+_manifest: dict[str, str] = {}
+
+
+def compile_css(watch: bool = False) -> None:
+    """Compile ``input.css`` with the standalone Tailwind CLI."""
+    # Build-time only, like gzip and shutil below: the app itself never loads them.
+    import subprocess
+
+    command = [
+        "uv",
+        "tool",
+        "run",
+        "--from",
+        "pytailwindcss",
+        "tailwindcss",
+        "-i",
+        str(TAILWIND_INPUT),
+        "-o",
+        str(TAILWIND_OUTPUT),
+    ]
+    command.append("--watch" if watch else "--minify")
+    subprocess.run(command, check=True)
+
+
+def fingerprint(path: Path, digest: str) -> Path:
+    """``css/site.css`` -> ``css/site.<digest>.css``."""
+    return path.with_name(f"{path.stem}.{digest[:HASH_LENGTH]}{path.suffix}")
+
+
+def build(static_dir: Path = STATIC_DIR, build_dir: Path = BUILD_DIR) -> dict[str, str]:
+    """Fingerprint and precompress every asset in ``static_dir``; return the manifest."""
+    import gzip
+    import shutil
+
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        logger.warning("brotli is not installed; skipping .br variants")
+
+    if build_dir.exists():
+        shutil.rmtree(build_dir)
+    build_dir.mkdir(parents=True)
+
+    manifest: dict[str, str] = {}
+    for source in sorted(static_dir.rglob("*")):
+        if not source.is_file() or source.name in _SKIP_NAMES or build_dir in source.parents:
+            continue
+        relative = source.relative_to(static_dir)
+        data = source.read_bytes()
+        hashed = fingerprint(relative, hashlib.sha256(data).hexdigest())
+        target = build_dir / hashed
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        manifest[relative.as_posix()] = hashed.as_posix()
+
+        if source.suffix not in COMPRESSIBLE_SUFFIXES or len(data) < MIN_COMPRESS_SIZE:
+            continue
+        variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(data):
+                target.with_name(target.name + suffix).write_bytes(compressed)
+
+    (build_dir / MANIFEST_PATH.name).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+def precompile_templates(
+    templates_dir: Path = TEMPLATES_DIR, target: Path = COMPILED_TEMPLATES_DIR
+) -> int:
+    """Compile every template to a Python module loadable by ``jinja2.ModuleLoader``."""
+    import shutil
+
+    if target.exists():
+        shutil.rmtree(target)
+    target.mkdir(parents=True)
+    env = Environment(loader=FileSystemLoader(templates_dir), **TEMPLATE_ENV_OPTIONS)
+    names = env.list_templates()
+    env.compile_templates(target, zip=None, ignore_errors=False)
+    return len(names)
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> dict[str, str]:
+    """Load the build manifest; without one, ``static_url`` serves unhashed sources."""
+    global _manifest
+    try:
+        _manifest = json.loads(path.read_text())
+    except FileNotFoundError:
+        logger.warning(f"No asset manifest at {path}; run app/build_assets.py")
+        _manifest = {}
+    return _manifest
+
+
+def static_url(path: str) -> str:
+    """URL of a static asset, fingerprinted when it is in the manifest."""
+    path = path.lstrip("/")
+    hashed = _manifest.get(path)
+    if hashed is None:
+        return STATIC_URL_PREFIX + path
+    return f"{STATIC_URL_PREFIX}{BUILD_DIR.relative_to(STATIC_DIR).as_posix()}/{hashed}"
@@ -0,0 +1,386 @@
+"""In-process response cache for rendered pages.
+
+Decorate a route to cache its response per worker::
+
+    @router.get("/")
+    @cached(
+        ttl=60,
+        vary=(
+            "HX-Request",
+            "HX-Target",
+        ),
+        tags=("home",),
+    )
+    def home_page(
+        request: Request,
+    ): ...
+
+Entries are keyed by path, query string, the listed request headers and session fields,
+and kept in a size-bounded LRU (``RESPONSE_CACHE_MAX_BYTES``). Concurrent misses for the
+same key wait for a single render. Every cached response carries a strong ``ETag`` and
+``If-None-Match`` is answered with 304. An optional shared backend (see
+``ResponseCache.backend``) lets several workers reuse each other's entries.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from dataclasses import dataclass
+from typing import ParamSpec, Protocol
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+from starlette.responses import Response, StreamingResponse
+
+from core.config import settings
+from core.profiling import profile_thread
+
+RawHeaders = list[tuple[bytes, bytes]]
+
+# Per-entry bookkeeping cost on top of the body and headers, for size accounting.
+_ENTRY_OVERHEAD = 256
+_UNCACHEABLE_HEADERS = (b"set-cookie",)
+
+P = ParamSpec("P")
+Route = Callable[P, Response | Awaitable[Response]]
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    status: int
+    headers: RawHeaders
+    body: bytes
+    etag: str
+    expires_at: float
+    tags: tuple[str, ...] = ()
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers) + _ENTRY_OVERHEAD
+
+    def is_fresh(self, now: float | None = None) -> bool:
+        return (now or time.time()) < self.expires_at
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    entries: int
+    bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
+    coalesced: int
+    backend_hits: int
+    evictions: int
+    not_modified: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CacheBackend(Protocol):
+    """Second-level store shared between workers."""
+
+    async def get(self, key: str) -> CachedResponse | None: ...
+
+    async def set(self, key: str, entry: CachedResponse) -> None: ...
+
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None: ...
+
+    async def clear(self) -> None: ...
+
+
+class ResponseCache:
+    """Size-bounded LRU of rendered responses with single-flight misses.
+
+    Only used from the event loop, so it needs no locking.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        *,
+        max_entry_bytes: int | None = None,
+        backend: CacheBackend | None = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self.backend = backend
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._backend_hits = 0
+        self._evictions = 0
+        self._not_modified = 0
+
+    async def get_or_render(
+        self,
+        key: str,
+        render: Callable[[], Awaitable[Response]],
+        ttl: float,
+        tags: Sequence[str] = (),
+    ) -> tuple[CachedResponse | None, Response | None]:
+        """Return the cached entry for ``key``, rendering it at most once per worker.
+
+        Returns ``(entry, None)`` when the response is cached or cacheable, and
+        ``(None, response)`` when the rendered response cannot be cached.
+        """
+        entry = self._get_local(key)
+        if entry is not None:
+            self._hits += 1
+            return entry, None
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._coalesced += 1
+            entry = await asyncio.shield(inflight)
+            if entry is not None:
+                self._hits += 1
+                return entry, None
+            return None, await render()
+
+        self._misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = await self._get_backend(key)
+            if entry is not None:
+                self._backend_hits += 1
+                self._store(key, entry)
+                future.set_result(entry)
+                return entry, None
+
+            response = await render()
+            entry = await _snapshot(response, ttl, tags)
+            future.set_result(entry)
+            if entry is None:
+                return None, response
+            self._store(key, entry)
+            await self._set_backend(key, entry)
+            return entry, None
+        except asyncio.CancelledError:
+            # The leading request went away; let the waiters render for themselves.
+            if not future.done():
+                future.set_result(None)
+            raise
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                future.exception()  # waiters re-raise it; don't log it as unretrieved
+            raise
+        finally:
+            del self._inflight[key]
+
+    def respond(self, entry: CachedResponse, if_none_match: str | None = None) -> Response:
+        """Build the response for ``entry``: a 304 when ``If-None-Match`` matches."""
+        if _etag_matches(if_none_match, entry.etag):
+            self._not_modified += 1
+            return _not_modified(entry)
+        return _from_entry(entry)
+
+    def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> int:
+        """Drop entries by key or tag from this worker; returns how many were dropped."""
+        doomed = set(keys)
+        for tag in tags:
+            doomed |= self._tags.get(tag, set())
+        dropped = 0
+        for key in doomed:
+            if self._discard(key):
+                dropped += 1
+        return dropped
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            entries=len(self._entries),
+            bytes=self._bytes,
+            max_bytes=self.max_bytes,
+            hits=self._hits,
+            misses=self._misses,
+            coalesced=self._coalesced,
+            backend_hits=self._backend_hits,
+            evictions=self._evictions,
+            not_modified=self._not_modified,
+        )
+
+    def _get_local(self, key: str) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.is_fresh():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, entry: CachedResponse) -> None:
+        if entry.size > self.max_entry_bytes:
+            return
+        self._discard(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while self._bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self._evictions += 1
+
+    def _discard(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+    async def _get_backend(self, key: str) -> CachedResponse | None:
+        if self.backend is None:
+            return None
+        try:
+            entry = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache backend read failed: {e}")
+            return None
+        return entry if entry is not None and entry.is_fresh() else None
+
+    async def _set_backend(self, key: str, entry: CachedResponse) -> None:
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set(key, entry)
+        except Exception as e:
+            logger.warning(f"Response cache backend write failed: {e}")
+
+
+response_cache = ResponseCache(
+    settings.response_cache_max_bytes, max_entry_bytes=settings.response_cache_max_entry_bytes
+)
+
+
+def cache_key(request: Request, vary: Sequence[str] = (), session_keys: Sequence[str] = ()) -> str:
+    parts = [request.url.path, request.url.query]
+    parts += [f"{name.lower()}={request.headers.get(name, '')}" for name in vary]
+    if session_keys:
+        session = request.session
+        parts += [f"{name}={session.get(name)!r}" for name in session_keys]
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).hexdigest()
+
+
+def cached(
+    ttl: float,
+    *,
+    vary: Sequence[str] = (),
+    session_keys: Sequence[str] = (),
+    tags: Sequence[str] = (),
+) -> Callable[[Route[P]], Callable[P, Awaitable[Response]]]:
+    """Cache a route's ``GET`` responses in ``response_cache`` for ``ttl`` seconds.
+
+    The route must take the ``Request`` as a parameter. Only 200 responses without
+    ``Set-Cookie``, ``Cache-Control: no-store`` or ``private`` are stored.
+    """
+
+    def decorator(func: Route[P]) -> Callable[P, Awaitable[Response]]:
+        request_param = _request_parameter(func)
+        is_async = inspect.iscoroutinefunction(func)
+
+        def call_sync(*args: P.args, **kwargs: P.kwargs) -> Response:
+            with profile_thread():
+                return func(*args, **kwargs)
+
+        async def call(*args: P.args, **kwargs: P.kwargs) -> Response:
+            if is_async:
+                return await func(*args, **kwargs)
+            return await run_in_threadpool(call_sync, *args, **kwargs)
+
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> Response:
+            request: Request = kwargs[request_param]
+            if request.method not in ("GET", "HEAD"):
+                return await call(*args, **kwargs)
+
+            key = cache_key(request, vary, session_keys)
+            entry, response = await response_cache.get_or_render(
+                key, lambda: call(*args, **kwargs), ttl, tags
+            )
+            if entry is None:
+                return response
+            return response_cache.respond(entry, request.headers.get("if-none-match"))
+
+        return wrapper
+
+    return decorator
+
+
+def _request_parameter(func: Callable) -> str:
+    for name, param in inspect.signature(func).parameters.items():
+        if param.annotation is Request or name == "request":
+            return name
+    raise TypeError(f"@cached route {func.__qualname__} must take a `request: Request` parameter")
+
+
+async def _snapshot(response: Response, ttl: float, tags: Sequence[str]) -> CachedResponse | None:
+    if not isinstance(response, Response) or isinstance(response, StreamingResponse):
+        return None
+    if response.status_code != 200 or response.background is not None:
+        return None
+    cache_control = response.headers.get("cache-control", "")
+    if "no-store" in cache_control or "private" in cache_control:
+        return None
+    if any(name in _UNCACHEABLE_HEADERS for name, _ in response.raw_headers):
+        return None
+
+    body = bytes(response.body)
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    headers = [(k, v) for k, v in response.raw_headers if k != b"etag"]
+    headers.append((b"etag", etag.encode()))
+    return CachedResponse(
+        status=response.status_code,
+        headers=headers,
+        body=body,
+        etag=etag,
+        expires_at=time.time() + ttl,
+        tags=tuple(tags),
+    )
+
+
+def _from_entry(entry: CachedResponse) -> Response:
+    response = Response(content=entry.body, status_code=entry.status)
+    response.raw_headers = list(entry.headers)
+    return response
+
+
+def _not_modified(entry: CachedResponse) -> Response:
+    response = Response(status_code=304)
+    response.raw_headers = [
+        (k, v) for k, v in entry.headers if k in (b"etag", b"cache-control", b"vary")
+    ]
+    return response
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
@@ -1,61 +1,215 @@
+{% if cookiecutter.database_url %}from functools import cached_property
+{% endif %}from pathlib import Path
+from typing import Literal
+{% if cookiecutter.database_url %}from urllib.parse import SplitResult, unquote, urlsplit
+{% endif %}
 from pydantic import Field
 from pydantic_settings import BaseSettings
-{% if cookiecutter.database_url %}
-from sqlalchemy.engine.url import make_url
-{% endif %}
+
 
 class Settings(BaseSettings):
     # App
-    project_name: str = "{{ cookiecutter.project_name }}"""
+    project_name: str = "{{ cookiecutter.project_name }}"
     version: str = "1.0.0"
 
     # Server
     app_host: str = Field(validation_alias="APP_HOST")
     app_port: int = Field(validation_alias="APP_PORT")
-    app_workers: int = Field(validation_alias="APP_WORKERS")
+    # Unset: one worker per available CPU (app/server.py)
+    app_workers: int | None = Field(default=None, validation_alias="APP_WORKERS")
     app_hot_reload: bool = Field(validation_alias="APP_HOT_RELOAD")
-    
-    {% if cookiecutter.database_url %}
+    app_preload: bool = True
+    # Restart a worker after this many requests; unset never restarts
+    app_max_requests: int | None = None
+    app_graceful_timeout: int = 30
+{% if cookiecutter.database_url %}
     # Database
     database_url: str = Field(validation_alias="DATABASE_URL")
-    
+
+    # Connection pools, per uvicorn worker: a sync and an async one, each up to
+    # DB_POOL_MAX_SIZE. DB_MAX_CONNECTIONS, when set, is the budget for the whole app on a
+    # server: each worker's share keeps one connection for the invalidation bus and splits
+    # the rest between its pools, and each replica gets a whole share per worker. Job
+    # worker processes (app/worker.py) come on top of it.
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 10
+    db_max_connections: int | None = None
+    db_pool_timeout: float = 30.0
+    db_pool_idle_timeout: float = 600.0
+    db_pool_max_lifetime: float = 3600.0
+    db_pool_check_after: float | None = 5.0
+    # Rows fetched per round trip when streaming results (db/streaming.py)
+    db_stream_fetch_size: int = 2000
+    # Rows per INSERT statement for batched inserts and upserts (db/bulk.py)
+    db_bulk_page_size: int = 1000
+    # Executions of a query on a connection before psycopg 3 prepares it (empty: never)
+    db_prepare_threshold: int | None = 5
+    db_prepared_max: int = 100
+
+    # Read replicas (db/routing.py), e.g. DATABASE_REPLICA_URLS='["postgresql://..."]'.
+    # Replicas lagging more than DB_REPLICA_MAX_LAG seconds are skipped, and a session
+    # that wrote reads from the primary for DB_REPLICA_STICKY_SECONDS afterwards.
+    database_replica_urls: list[str] = []
+    db_replica_strategy: Literal["round_robin", "least_busy"] = "round_robin"
+    db_replica_max_lag: float = 5.0
+    db_replica_check_interval: float = 2.0
+    db_replica_sticky_seconds: float = 5.0
+
+    # Background jobs (db/jobs.py) and the worker running them (app/worker.py)
+    jobs_channel: str = "app_jobs"
+    job_max_attempts: int = 5
+    # Retry delays double from the base up to the max, with jitter
+    job_retry_base_delay: float = 5.0
+    job_retry_max_delay: float = 3600.0
+    # Seconds a claimed job stays locked; renewed while it runs, so this only delays
+    # picking up the jobs of a worker that died
+    job_lease: float = 60.0
+    worker_queues: list[str] = ["default"]
+    # Jobs running at once per worker process, and claimed per dequeue
+    worker_concurrency: int = 16
+    worker_batch_size: int = 16
+    # Processes for sync handlers; 0 runs them in threads instead
+    worker_processes: int = 0
+    # Longest sleep without a notification, as a safety net for lost ones
+    worker_poll_interval: float = 30.0
+{% endif %}
+    # Response cache (core/cache.py), per worker
+    response_cache_max_bytes: int = 32 * 1024 * 1024
+    response_cache_max_entry_bytes: int = 1024 * 1024
+{%- if cookiecutter.database_url %}
+    # "postgres" also shares entries between workers through the response_cache table
+    response_cache_backend: Literal["memory", "postgres"] = "memory"
+    # LISTEN/NOTIFY channel used to invalidate per-worker caches (db/bus.py)
+    cache_bus_channel: str = "app_invalidate"
+{%- endif %}
+
+    # Sessions (core/sessions.py). "cookie" signs the whole session into the cookie;
+    # the others keep it on the server and put only its ID in the cookie.
+{%- if cookiecutter.database_url %}
+    session_backend: Literal["cookie", "memory", "postgres"] = "cookie"
+{%- else %}
+    session_backend: Literal["cookie", "memory"] = "cookie"
+{%- endif %}
+    session_cookie: str = "session"
+    session_max_age: int = 14 * 24 * 3600
+    session_https_only: bool = False
+    # Sessions kept per worker, in front of the database with "postgres"
+    session_cache_max_entries: int = 10_000
+    session_purge_interval: float = 300.0
+
+    # Admission control (core/admission.py), per worker. Requests beyond the limit wait in
+    # a queue; a full queue or a wait past ADMISSION_QUEUE_TIMEOUT is answered with 503.
+    # The limit moves between its bounds to keep time to first byte under the target.
+    admission_enabled: bool = True
+    admission_initial_limit: int = 32
+    admission_min_limit: int = 4
+    admission_max_limit: int = 256
+    admission_latency_target: float = 0.5
+    admission_queue_size: int = 64
+    admission_queue_timeout: float = 2.0
+    admission_retry_after: int = 1
+    # Path prefixes never held back, and ones admitted only when nothing else waits
+    admission_bypass_paths: list[str] = ["/health", "/static/", "/metrics"]
+    admission_low_priority_paths: list[str] = [{% if cookiecutter.database_url %}"/export/"{% endif %}]
+
+    # Prometheus metrics at /metrics (core/metrics.py)
+    metrics_enabled: bool = True
+
+    # Server-Timing header on every response (core/timing.py)
+    server_timing_enabled: bool = True
+    # Requests presenting this token are profiled (core/profiling.py); unset disables it
+    profiling_token: str | None = None
+    profiling_interval: float = 0.001
+
+    # User-Agent parsing (services/user_agent.py): results cached per worker, and an
+    # optional file of User-Agents, one per line, parsed at startup
+    user_agent_cache_size: int = 4096
+    user_agent_warmup_file: Path | None = None
+
+    # Templates. The bytecode cache defaults to Jinja's per-user temp directory.
+    templates_bytecode_cache: bool = True
+    templates_cache_dir: Path | None = None
+
+    # Security
+    secret_key: str = Field(validation_alias="SECRET_KEY")
+    algorithm: str = "HS256"
+    access_token_expire_minutes: int = 30
+    # Verified bearer tokens cached per worker (core/security.py)
+    token_cache_max_entries: int = 10_000
+
+    log_format: str = "[<level>{level: <8}</level>] <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+    log_level: str = "INFO"
+    # Structured JSON lines written by a background thread (core/log.py) instead of log_format
+    log_json: bool = False
+    log_buffer_size: int = 10_000
+    log_batch_size: int = 512
+    log_flush_interval: float = 0.2
+    # One record per request; LOG_SAMPLE_RATES='{"INFO": 0.1}' keeps 10% of INFO ones
+    log_access: bool = True
+    log_sample_rates: dict[str, float] = {}
+{%- if cookiecutter.database_url %}
+
+    @property
+    def _db_worker_share(self) -> int | None:
+        # Connections a worker process may open on one server, if there is a budget.
+        if self.db_max_connections is None:
+            return None
+        return self.db_max_connections // max(self.app_workers or 1, 1)
+
+    @property
+    def db_sync_pool_size(self) -> int:
+        """Maximum size of a worker's sync pool (db/pool.py)."""
+        share = self._db_worker_share
+        if share is None:
+            return self.db_pool_max_size
+        return max(1, min(self.db_pool_max_size, (share - 1) // 2))
+
+    @property
+    def db_async_pool_size(self) -> int:
+        """Maximum size of a worker's async pool (db/async_pool.py)."""
+        share = self._db_worker_share
+        if share is None:
+            return self.db_pool_max_size
+        return max(1, min(self.db_pool_max_size, share - 1 - self.db_sync_pool_size))
+
+    @property
+    def db_replica_pool_size(self) -> int:
+        """Maximum size of a worker's pool per read replica (db/routing.py)."""
+        share = self._db_worker_share
+        if share is None:
+            return self.db_pool_max_size
+        return max(1, min(self.db_pool_max_size, share))
+
+    @cached_property
+    def _database_url(self) -> SplitResult:
+        # Parsed once; the settings object lives for the whole process.
+        return urlsplit(self.database_url)
+
     @property
     def db_host(self) -> str:
         """Parse and return database host from database_url."""
-        url = make_url(self.database_url)
-        return url.host
-    
+        return self._database_url.hostname
+
     @property
     def db_port(self) -> int:
         """Parse and return database port from database_url."""
-        url = make_url(self.database_url)
-        return url.port or 5432
-    
+        return self._database_url.port or 5432
+
     @property
     def db_username(self) -> str:
         """Parse and return database username from database_url."""
-        url = make_url(self.database_url)
-        return url.username
-    
+        return unquote(self._database_url.username or "")
+
     @property
     def db_password(self) -> str:
         """Parse and return database password from database_url."""
-        url = make_url(self.database_url)
-        return url.password
-    
+        return unquote(self._database_url.password or "")
+
     @property
     def db_name(self) -> str:
         """Parse and return database name from database_url."""
-        url = make_url(self.database_url)
-        return url.database
-    {% endif %}
-    
-    # Security
-    secret_key: str = Field(validation_alias="SECRET_KEY")
-    algorithm: str = "HS256"
-    access_token_expire_minutes: int = 30
-    
-    log_format: str ="[<level>{level: <8}</level>] <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
-    log_level: str = "INFO"
+        return unquote(self._database_url.path.lstrip("/"))
+{%- endif %}
+
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,304 @@
+"""Logging setup: human-readable in development, batched JSON lines in production.
+
+``setup_logging()`` runs once when ``main.py`` is imported. With ``LOG_JSON=true`` every
+record becomes one JSON object per line::
+
+    {"ts": "2026-10-18T09:12:03.512+00:00", "level": "INFO", "logger": "core.log",
+     "msg": "GET / 200", "request_id": "4b1f...", "method": "GET", "path": "/", ...}
+
+Records are serialized on the calling thread and handed to a ``BatchedWriter``, whose
+background thread writes them in batches. Its buffer is bounded: when the output can't
+keep up, new records are dropped rather than blocking requests, and the number dropped is
+reported in the log and as ``log_records_dropped_total``.
+
+``RequestLogMiddleware`` gives every request an ID (an incoming ``X-Request-ID`` is kept)
+that is attached to all records logged while handling it and echoed in the response, and
+writes one access record per request. ``LOG_SAMPLE_RATES`` (e.g. ``{"INFO": 0.1}``) keeps
+only a fraction of the access records at a given level; 4xx and 5xx responses are logged at
+WARNING and ERROR and are kept unless listed too. Standard library loggers (uvicorn's
+included) are routed through the same setup.
+"""
+
+import atexit
+import inspect
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from collections.abc import Mapping
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from typing import Any, TextIO
+
+from loguru import logger
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings
+from core.metrics import LOG_RECORDS_DROPPED
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+_writer: "BatchedWriter | None" = None
+
+
+def get_request_id() -> str | None:
+    """ID of the request being handled, if any."""
+    return _request_id.get()
+
+
+class BatchedWriter:
+    """Write lines to ``stream`` in batches from a background thread.
+
+    Parameters
+    ----------
+    stream
+        Text stream to write to.
+    max_buffer
+        Lines held at most; ``write`` drops new lines while the buffer is full.
+    batch_size
+        Wake the writer thread as soon as this many lines are waiting.
+    flush_interval
+        Seconds after which waiting lines are written even if the batch isn't full.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO,
+        *,
+        max_buffer: int = 10_000,
+        batch_size: int = 512,
+        flush_interval: float = 0.2,
+    ) -> None:
+        self.stream = stream
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._reported_drops = 0
+        self._start()
+
+    def write(self, line: str) -> None:
+        with self._cond:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return
+            self._buffer.append(line)
+            if len(self._buffer) == self.batch_size:
+                self._cond.notify()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write out everything buffered and stop the thread."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _start(self) -> None:
+        self._buffer: deque[str] = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closing or len(self._buffer) >= self.batch_size,
+                    self.flush_interval,
+                )
+                batch = list(self._buffer)
+                self._buffer.clear()
+                closing = self._closing
+                dropped = self.dropped - self._reported_drops
+                self._reported_drops = self.dropped
+            if dropped:
+                LOG_RECORDS_DROPPED.inc(dropped)
+                batch.append(_dropped_line(dropped))
+            if batch:
+                try:
+                    self.stream.write("".join(batch))
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    pass
+                self.written += len(batch)
+            if closing:
+                return
+
+
+def json_line(record: Mapping[str, Any]) -> str:
+    """Serialize a loguru record to one line of JSON."""
+    data = {
+        "ts": record["time"].isoformat(timespec="milliseconds"),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "msg": record["message"],
+    }
+    data.update(record["extra"])
+    exception = record["exception"]
+    if exception is not None:
+        data["exc"] = "".join(
+            traceback.format_exception(exception.type, exception.value, exception.traceback)
+        )
+    return json.dumps(data, default=str, separators=(",", ":")) + "\n"
+
+
+def _dropped_line(count: int) -> str:
+    data = {
+        "ts": datetime.now(UTC).isoformat(timespec="milliseconds"),
+        "level": "WARNING",
+        "logger": __name__,
+        "msg": f"Dropped {count} log records: log buffer full",
+    }
+    return json.dumps(data, separators=(",", ":")) + "\n"
+
+
+def _add_request_id(record: dict) -> None:
+    request_id = _request_id.get()
+    if request_id is not None:
+        record["extra"].setdefault("request_id", request_id)
+
+
+class InterceptHandler(logging.Handler):
+    """Forward standard library log records to loguru."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            level: str | int = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        # Report the caller of the logging call, not the logging module.
+        frame, depth = inspect.currentframe(), 0
+        while frame is not None and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).bind(logger=record.name).log(
+            level, record.getMessage()
+        )
+
+
+def setup_logging() -> None:
+    """Configure loguru and the standard library loggers from ``settings``."""
+    global _writer
+    logger.remove()
+    logger.configure(patcher=_add_request_id)
+    if settings.log_json:
+        if _writer is None:
+            _writer = BatchedWriter(
+                sys.stderr,
+                max_buffer=settings.log_buffer_size,
+                batch_size=settings.log_batch_size,
+                flush_interval=settings.log_flush_interval,
+            )
+            atexit.register(shutdown_logging)
+        writer = _writer
+        logger.add(
+            lambda message: writer.write(json_line(message.record)),
+            level=settings.log_level,
+            format="{message}",
+        )
+    else:
+        logger.add(sys.stderr, level=settings.log_level, format=settings.log_format)
+
+    logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        stdlib_logger = logging.getLogger(name)
+        stdlib_logger.handlers = []
+        stdlib_logger.propagate = True
+    # RequestLogMiddleware writes the access log.
+    logging.getLogger("uvicorn.access").disabled = settings.log_access
+
+
+def shutdown_logging() -> None:
+    """Flush buffered records; registered to run at exit."""
+    if _writer is not None:
+        _writer.close()
+
+
+def _restart_writer() -> None:
+    # The writer thread doesn't survive fork(); give the child its own.
+    if _writer is not None:
+        _writer._start()
+
+
+os.register_at_fork(after_in_child=_restart_writer)
+
+
+class RequestLogMiddleware:
+    """Assign request IDs and write the access log.
+
+    Parameters
+    ----------
+    access_log
+        Log one record per request.
+    sample_rates
+        Fraction of access records to keep, by level name; unlisted levels are all kept.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        access_log: bool = True,
+        sample_rates: Mapping[str, float] | None = None,
+    ) -> None:
+        self.app = app
+        self.access_log = access_log
+        self.sample_rates = {k.upper(): v for k, v in (sample_rates or {}).items()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                value = value.decode("latin-1")
+                if _REQUEST_ID_PATTERN.fullmatch(value):
+                    request_id = value
+                break
+        if request_id is None:
+            request_id = uuid.uuid4().hex
+        token = _request_id.set(request_id)
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append(REQUEST_ID_HEADER, request_id)
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if self.access_log:
+                self._log(scope, status, time.perf_counter() - start)
+            _request_id.reset(token)
+
+    def _log(self, scope: Scope, status: int, elapsed: float) -> None:
+        level = "ERROR" if status >= 500 else "WARNING" if status >= 400 else "INFO"
+        rate = self.sample_rates.get(level)
+        if rate is not None and random.random() >= rate:
+            return
+        client = scope.get("client")
+        logger.bind(
+            method=scope["method"],
+            path=scope["path"],
+            status=status,
+            duration_ms=round(elapsed * 1000, 2),
+            client=client[0] if client else None,
+        ).log(level, f"{scope['method']} {scope['path']} {status}")
@@ -0,0 +1,245 @@
+"""Prometheus metrics for requests, admission control, templates and connection pools.
+
+``MetricsMiddleware`` records, per method and route template (``/items/{item_id}``, never
+the raw URL), request counts by status class and a latency histogram, plus the requests
+in flight.
+``core.admission`` reports its limit and queued and shed requests, ``core.templates.render``
+times template rendering and ``PoolSampler`` exports the connection pool statistics.
+``routers/metrics.py`` serves everything at ``/metrics``.
+
+With several worker processes each one writes its samples to files in
+``PROMETHEUS_MULTIPROC_DIR`` and the scrape aggregates them, so every worker's requests are
+counted whichever worker answers. The directory has to be set and emptied before the
+workers start; ``app/server.py`` does that.
+"""
+
+import asyncio
+import os
+import time
+from collections.abc import Callable, Mapping
+from typing import Any
+
+from loguru import logger
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MULTIPROC_ENV = "PROMETHEUS_MULTIPROC_DIR"
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Anything else is reported as OTHER so arbitrary methods can't create new series.
+_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+RENDER_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+REQUESTS = Counter("http_requests", "HTTP requests handled.", ["method", "route", "status"])
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the end of its response.",
+    ["method", "route"],
+    buckets=REQUEST_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled.",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+TEMPLATE_RENDER_DURATION = Histogram(
+    "template_render_seconds",
+    "Time spent rendering templates; mode is 'full' or 'partial' (HTMX block).",
+    ["template", "mode"],
+    buckets=RENDER_BUCKETS,
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Connections in the pool by state (in_use, idle), plus waiting checkouts.",
+    ["pool", "state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts", "Connections checked out.", ["pool"])
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts", "Checkouts that timed out.", ["pool"])
+DB_POOL_WAIT = Counter("db_pool_wait_seconds", "Time spent waiting for a connection.", ["pool"])
+
+ADMISSION_LIMIT = Gauge(
+    "admission_limit",
+    "Requests the admission controller lets run at once, summed over workers.",
+    multiprocess_mode="livesum",
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight",
+    "Requests admitted and not finished.",
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUED = Gauge(
+    "admission_queued",
+    "Requests waiting for admission.",
+    ["priority"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds",
+    "Time requests waited for admission, shed or not.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+ADMISSION_SHED = Counter(
+    "admission_shed",
+    "Requests answered with 503 instead of being admitted.",
+    ["priority", "reason"],
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped", "Log records dropped because the log buffer was full."
+)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get(MULTIPROC_ENV))
+
+
+def mark_process_dead() -> None:
+    """Drop this worker's live gauges from the shared directory. Called on shutdown."""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Metrics in the Prometheus text format, aggregated over all workers."""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def route_template(scope: Scope, root_path: str = "") -> str:
+    """The path template of the route that handled ``scope``.
+
+    Read after the app has run: the router records the matched route in the scope, and
+    mounted apps such as ``/static`` are reported by their mount path.
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is not None:
+        return path
+    mount_path = scope.get("root_path", "")
+    if mount_path != root_path:
+        return mount_path[len(root_path) :] or "/"
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request metrics.
+
+    Labelled children are cached so the per-request cost is a couple of dict lookups,
+    a clock read and the metric updates. The route is only known once routing has run,
+    so requests in flight are tracked per method.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._in_progress: dict[str, Any] = {}
+        self._children: dict[tuple[str, str], tuple[Any, dict[int, Any]]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in _METHODS else "OTHER"
+        root_path = scope.get("root_path", "")
+        in_progress = self._in_progress.get(method)
+        if in_progress is None:
+            in_progress = self._in_progress[method] = REQUESTS_IN_PROGRESS.labels(method)
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            self._record(method, route_template(scope, root_path), status, elapsed)
+
+    def _record(self, method: str, route: str, status: int, elapsed: float) -> None:
+        key = (method, route)
+        children = self._children.get(key)
+        if children is None:
+            children = self._children[key] = (REQUEST_DURATION.labels(method, route), {})
+        duration, counters = children
+        duration.observe(elapsed)
+        status_class = status // 100
+        counter = counters.get(status_class)
+        if counter is None:
+            counter = counters[status_class] = REQUESTS.labels(method, route, f"{status_class}xx")
+        counter.inc()
+
+
+class PoolSampler:
+    """Copy connection pool statistics into the pool metrics every ``interval`` seconds.
+
+    Parameters
+    ----------
+    pools
+        Pool name to a callable returning its ``stats()`` snapshot (``db.pool.PoolStats``).
+    interval
+        Seconds between samples.
+    """
+
+    def __init__(self, pools: Mapping[str, Callable[[], Any]], interval: float = 5.0) -> None:
+        self.pools = dict(pools)
+        self.interval = interval
+        self._last: dict[str, tuple[int, int, float]] = {}
+        self._task: asyncio.Task | None = None
+
+    def sample(self) -> None:
+        for name, stats_fn in self.pools.items():
+            try:
+                stats = stats_fn()
+            except Exception as e:
+                logger.debug(f"Skipping metrics for pool '{name}': {e}")
+                continue
+            DB_POOL_CONNECTIONS.labels(name, "in_use").set(stats.in_use)
+            DB_POOL_CONNECTIONS.labels(name, "idle").set(stats.idle)
+            DB_POOL_CONNECTIONS.labels(name, "waiting").set(stats.waiting)
+            checkouts, timeouts, waited = self._last.get(name, (0, 0, 0.0))
+            DB_POOL_CHECKOUTS.labels(name).inc(stats.checkouts - checkouts)
+            DB_POOL_TIMEOUTS.labels(name).inc(stats.timeouts - timeouts)
+            DB_POOL_WAIT.labels(name).inc(stats.wait_time_total - waited)
+            self._last[name] = (stats.checkouts, stats.timeouts, stats.wait_time_total)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="metrics:pools")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.sample()
+
+    async def _run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,157 @@
+"""On-demand sampling profiles of single requests.
+
+When ``PROFILING_TOKEN`` is set, a request carrying it in an ``X-Profile`` header or a
+``profile`` query parameter runs under `pyinstrument <https://pyinstrument.readthedocs.io>`_
+and the response is replaced by the profile::
+
+    curl -H "X-Profile: $PROFILING_TOKEN" https://example.com/ -o home.speedscope.json
+
+The default is a `speedscope <https://www.speedscope.app>`_ file (open it there for a
+flamegraph); ``X-Profile-Format: html`` (or ``profile_format=html``) returns pyinstrument's
+own HTML report instead. Sync endpoints on a ``TimedRoute`` are profiled in the threadpool
+thread they run in. Only one request per worker is profiled at a time.
+
+pyinstrument is an optional dependency: ``uv sync --extra profiling``.
+"""
+
+import asyncio
+import secrets
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qs
+
+from loguru import logger
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+if TYPE_CHECKING:
+    from pyinstrument.session import Session
+
+FORMATS = {
+    "speedscope": ("application/json", "speedscope.json"),
+    "html": ("text/html; charset=utf-8", "html"),
+}
+
+# (sampling interval, sessions from other threads) while a request is being profiled.
+_active: ContextVar[tuple[float, list["Session"]] | None] = ContextVar("profile", default=None)
+
+
+@contextmanager
+def profile_thread() -> Iterator[None]:
+    """Profile the block in the current thread when the request is being profiled."""
+    active = _active.get()
+    if active is None:
+        yield
+        return
+    from pyinstrument import Profiler
+
+    interval, sessions = active
+    profiler = Profiler(interval=interval, async_mode="disabled")
+    profiler.start()
+    try:
+        yield
+    finally:
+        sessions.append(profiler.stop())
+
+
+class ProfilingMiddleware:
+    """Replace the response of requests carrying ``token`` with their profile.
+
+    Parameters
+    ----------
+    token
+        Secret the request must present.
+    interval
+        Sampling interval in seconds.
+    """
+
+    def __init__(self, app: ASGIApp, token: str, interval: float = 0.001) -> None:
+        self.app = app
+        self.token = token
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        try:
+            import pyinstrument  # noqa: F401
+        except ImportError:
+            self.enabled = False
+            logger.warning("PROFILING_TOKEN is set but pyinstrument is not installed")
+        else:
+            self.enabled = True
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        output_format = self._requested_format(scope)
+        if output_format is None:
+            await self.app(scope, receive, send)
+            return
+
+        async with self._lock:
+            body, status = await self._profile(scope, receive, output_format)
+        content_type, extension = FORMATS[output_format]
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"cache-control", b"no-store"),
+                (b"x-profiled-status", str(status).encode()),
+                (
+                    b"content-disposition",
+                    f'attachment; filename="profile.{extension}"'.encode(),
+                ),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def _requested_format(self, scope: Scope) -> str | None:
+        headers = Headers(scope=scope)
+        token = headers.get("x-profile")
+        output_format = headers.get("x-profile-format")
+        if token is None and b"profile" in scope.get("query_string", b""):
+            query = parse_qs(scope["query_string"].decode("latin-1"))
+            token = query.get("profile", [None])[0]
+            output_format = output_format or query.get("profile_format", [None])[0]
+        if token is None or not secrets.compare_digest(token.encode(), self.token.encode()):
+            return None
+        return output_format if output_format in FORMATS else "speedscope"
+
+    async def _profile(
+        self, scope: Scope, receive: Receive, output_format: str
+    ) -> tuple[bytes, int]:
+        from pyinstrument import Profiler
+        from pyinstrument.session import Session
+
+        status = 500
+
+        async def discard(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        sessions: list[Session] = []
+        token = _active.set((self.interval, sessions))
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        except Exception:
+            logger.exception("Profiled request failed")
+        finally:
+            session = profiler.stop()
+            _active.reset(token)
+
+        for thread_session in sessions:
+            session = Session.combine(session, thread_session)
+        return _render(session, output_format), status
+
+
+def _render(session: "Session", output_format: str) -> bytes:
+    from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+
+    renderer = SpeedscopeRenderer() if output_format == "speedscope" else HTMLRenderer()
+    return renderer.render(session).encode()
@@ -0,0 +1,259 @@
+"""Bearer tokens: signed JWTs, verified once per worker and then served from a cache.
+
+Issue a token after checking the user's credentials, and protect routes with the
+dependencies::
+
+    token = create_access_token(
+        str(user.id),
+        claims={
+            "role": user.role
+        },
+    )
+
+
+    @router.get(
+        "/api/orders"
+    )
+    async def orders(
+        token: TokenPayload = Depends(
+            require_token
+        ),
+    ): ...
+
+API clients send the same token on many requests, so ``TokenVerifier`` keeps verified
+tokens in an LRU keyed by a digest of the token (``TOKEN_CACHE_MAX_ENTRIES``). A cached
+token skips the signature check and claim parsing but is still rejected once it expires
+or its ID is revoked. Invalid tokens are never cached.
+
+``token_verifier.revoke`` only affects this worker.{% if cookiecutter.database_url %} ``db.tokens.revoke_token``
+stores the revocation and tells every worker.{% else %} With several workers, each of
+them has to be told.{% endif %}
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import timedelta
+from types import MappingProxyType
+from typing import Annotated, Any
+
+import jwt
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from core.config import settings
+
+_REGISTERED_CLAIMS = ("sub", "exp", "iat", "jti")
+
+
+@dataclass(frozen=True)
+class TokenPayload:
+    subject: str
+    token_id: str
+    expires_at: float
+    # The token's other claims; read-only because the payload is shared through the cache.
+    claims: Mapping[str, Any]
+
+
+@dataclass(frozen=True)
+class TokenCacheStats:
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    revoked: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class TokenVerifier:
+    """Issue and verify JWTs, caching verified ones.
+
+    Parameters
+    ----------
+    secret_key
+        Key the tokens are signed with.
+    algorithm
+        JWT signing algorithm.
+    expire_minutes
+        Default token lifetime.
+    max_entries
+        Verified tokens kept; 0 disables the cache.
+    """
+
+    def __init__(
+        self,
+        secret_key: str,
+        *,
+        algorithm: str = "HS256",
+        expire_minutes: int = 30,
+        max_entries: int = 10_000,
+    ) -> None:
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.expire_minutes = expire_minutes
+        self.max_entries = max_entries
+        # Dependencies of sync routes run in the threadpool, so the cache is shared by threads.
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[bytes, TokenPayload] = OrderedDict()
+        self._revoked: dict[str, float] = {}  # token ID -> when it would have expired
+        self._next_scan = 1024
+        self._hits = 0
+        self._misses = 0
+
+    def create(
+        self,
+        subject: str,
+        *,
+        expires_delta: timedelta | None = None,
+        claims: Mapping[str, Any] | None = None,
+    ) -> str:
+        """A signed token for ``subject`` with extra ``claims``."""
+        now = int(time.time())
+        lifetime = expires_delta or timedelta(minutes=self.expire_minutes)
+        payload = dict(claims or {})
+        payload.update(
+            sub=subject,
+            iat=now,
+            exp=now + int(lifetime.total_seconds()),
+            jti=uuid.uuid4().hex,
+        )
+        return jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
+
+    def verify(self, token: str) -> TokenPayload:
+        """Return the payload of a valid token; raises ``jwt.InvalidTokenError`` otherwise."""
+        key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        now = time.time()
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                if now < payload.expires_at and payload.token_id not in self._revoked:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return payload
+                del self._entries[key]
+            self._misses += 1
+
+        payload = self._decode(token)
+        if payload.token_id in self._revoked:
+            raise jwt.InvalidTokenError("Token has been revoked")
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = payload
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return payload
+
+    def revoke(self, token_id: str, expires_at: float | None = None) -> None:
+        """Reject the token with ID ``token_id`` from now on.
+
+        ``expires_at`` is when the token expires anyway and the revocation can be
+        forgotten; by default, the longest a token issued now could live.
+        """
+        if expires_at is None:
+            expires_at = time.time() + self.expire_minutes * 60
+        with self._lock:
+            self._revoked[token_id] = expires_at
+            self._forget_expired_revocations()
+
+    def clear(self) -> None:
+        """Forget verified tokens, so each is checked again on its next use."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> TokenCacheStats:
+        return TokenCacheStats(
+            entries=len(self._entries),
+            max_entries=self.max_entries,
+            hits=self._hits,
+            misses=self._misses,
+            revoked=len(self._revoked),
+        )
+
+    def _decode(self, token: str) -> TokenPayload:
+        claims = jwt.decode(
+            token,
+            self.secret_key,
+            algorithms=[self.algorithm],
+            options={"require": ["sub", "exp", "jti"]},
+        )
+        return TokenPayload(
+            subject=str(claims["sub"]),
+            token_id=str(claims["jti"]),
+            expires_at=float(claims["exp"]),
+            claims=MappingProxyType({
+                k: v for k, v in claims.items() if k not in _REGISTERED_CLAIMS
+            }),
+        )
+
+    def _forget_expired_revocations(self) -> None:
+        # Amortized: only scan once the list has doubled since the last scan.
+        if len(self._revoked) < self._next_scan:
+            return
+        now = time.time()
+        self._revoked = {k: exp for k, exp in self._revoked.items() if exp > now}
+        self._next_scan = max(1024, 2 * len(self._revoked))
+
+
+token_verifier = TokenVerifier(
+    settings.secret_key,
+    algorithm=settings.algorithm,
+    expire_minutes=settings.access_token_expire_minutes,
+    max_entries=settings.token_cache_max_entries,
+)
+
+
+def create_access_token(
+    subject: str,
+    *,
+    expires_delta: timedelta | None = None,
+    claims: Mapping[str, Any] | None = None,
+) -> str:
+    """Issue a token for ``subject``, valid for ``ACCESS_TOKEN_EXPIRE_MINUTES`` by default."""
+    return token_verifier.create(subject, expires_delta=expires_delta, claims=claims)
+
+
+def verify_access_token(token: str) -> TokenPayload:
+    return token_verifier.verify(token)
+
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def optional_token(
+    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(_bearer)],
+) -> TokenPayload | None:
+    """Dependency: the payload of the request's bearer token, ``None`` without one.
+
+    An invalid token is still rejected with 401.
+    """
+    if credentials is None:
+        return None
+    try:
+        return token_verifier.verify(credentials.credentials)
+    except jwt.InvalidTokenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Invalid token: {e}",
+            headers={"WWW-Authenticate": 'Bearer error="invalid_token"'},
+        ) from None
+
+
+async def require_token(
+    token: Annotated[TokenPayload | None, Depends(optional_token)],
+) -> TokenPayload:
+    """Dependency: the payload of the request's bearer token; 401 without a valid one."""
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return token
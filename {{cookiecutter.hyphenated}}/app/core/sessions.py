@@ -0,0 +1,310 @@
+"""Server-side sessions: the cookie holds only a random session ID.
+
+``ServerSessionMiddleware`` provides ``request.session`` like Starlette's
+``SessionMiddleware``, but the data stays on the server. Each worker keeps recently used
+sessions in an LRU (``SESSION_CACHE_MAX_ENTRIES``); with ``SESSION_BACKEND=postgres`` they
+are also stored in the ``sessions`` table (see ``db.sessions``), so every worker sees them.
+
+Work per request is kept to what changed:
+
+- a request without a session cookie does no lookup, and no cookie is set until something
+  is stored in the session;
+- a session is written back only when it was modified. Changes inside nested values
+  aren't noticed; set ``request.session.modified = True`` after them;
+- ``Set-Cookie`` is sent when a session is created, when its ID changes and, to keep
+  active users signed in, once less than half of ``SESSION_MAX_AGE`` is left.
+
+Call ``request.session.regenerate_id()`` on sign-in so a session ID planted before it
+can't be used afterwards. Emptying the session deletes it and its cookie.
+"""
+
+import asyncio
+import json
+import re
+import secrets
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+from typing import Protocol
+
+from loguru import logger
+from starlette.datastructures import MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings
+
+# secrets.token_urlsafe(32)
+_SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{43}")
+
+
+class Session(dict[str, object]):
+    """``request.session``: a dict that records whether it was changed."""
+
+    def __init__(self, data: Mapping[str, object] = (), /) -> None:
+        super().__init__(data)
+        self.modified = False
+        self.regenerate = False
+
+    def regenerate_id(self) -> None:
+        """Move the session to a new ID when the response is sent."""
+        self.regenerate = True
+        self.modified = True
+
+    def __setitem__(self, key: str, value: object) -> None:
+        super().__setitem__(key, value)
+        self.modified = True
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self.modified = True
+
+    def clear(self) -> None:
+        super().clear()
+        self.modified = True
+
+    def pop(self, key: str, *default: object) -> object:
+        self.modified = self.modified or key in self
+        return super().pop(key, *default)
+
+    def popitem(self) -> tuple[str, object]:
+        self.modified = True
+        return super().popitem()
+
+    def setdefault(self, key: str, default: object = None) -> object:
+        self.modified = self.modified or key not in self
+        return super().setdefault(key, default)
+
+    def update(
+        self, *args: Mapping[str, object] | Iterable[tuple[str, object]], **kwargs: object
+    ) -> None:
+        super().update(*args, **kwargs)
+        self.modified = True
+
+
+@dataclass(frozen=True)
+class SessionRecord:
+    # JSON text, so every request gets its own copy of the data to modify.
+    data: str
+    expires_at: float
+
+    def is_fresh(self, now: float | None = None) -> bool:
+        return (now or time.time()) < self.expires_at
+
+
+class SessionBackend(Protocol):
+    """Store shared between workers."""
+
+    async def load(self, session_id: str) -> SessionRecord | None: ...
+
+    async def save(self, session_id: str, record: SessionRecord) -> None: ...
+
+    async def delete(self, session_id: str) -> None: ...
+
+    async def purge_expired(self) -> int: ...
+
+
+class SessionStore:
+    """Per-worker LRU of sessions in front of an optional ``SessionBackend``.
+
+    Without a backend the LRU is the only copy, so sessions are lost on restart or
+    eviction and not shared between workers. Only used from the event loop.
+    """
+
+    def __init__(self, max_entries: int, *, backend: SessionBackend | None = None) -> None:
+        self.max_entries = max_entries
+        self.backend = backend
+        self._entries: OrderedDict[str, SessionRecord] = OrderedDict()
+        self._purge_task: asyncio.Task | None = None
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, session_id: str) -> SessionRecord | None:
+        record = self._entries.get(session_id)
+        if record is not None:
+            if record.is_fresh():
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return record
+            del self._entries[session_id]
+        self.misses += 1
+        if self.backend is None:
+            return None
+        try:
+            record = await self.backend.load(session_id)
+        except Exception as e:
+            logger.warning(f"Session backend read failed: {e}")
+            return None
+        if record is None or not record.is_fresh():
+            return None
+        self._store(session_id, record)
+        return record
+
+    async def save(self, session_id: str, record: SessionRecord) -> None:
+        if self.backend is not None:
+            await self.backend.save(session_id, record)
+        self._store(session_id, record)
+
+    async def delete(self, session_id: str) -> None:
+        self._entries.pop(session_id, None)
+        if self.backend is not None:
+            await self.backend.delete(session_id)
+
+    def invalidate(self, session_ids: list[str]) -> None:
+        """Drop sessions from this worker's LRU only, e.g. after another worker wrote them."""
+        for session_id in session_ids:
+            self._entries.pop(session_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def purge_expired(self) -> int:
+        """Drop expired sessions from the LRU and the backend; returns the backend count."""
+        now = time.time()
+        for session_id in [k for k, r in self._entries.items() if not r.is_fresh(now)]:
+            del self._entries[session_id]
+        if self.backend is None:
+            return 0
+        return await self.backend.purge_expired()
+
+    def start_purging(self, interval: float) -> None:
+        """Run ``purge_expired`` every ``interval`` seconds until ``stop``."""
+        if self._purge_task is None:
+            self._purge_task = asyncio.create_task(self._purge_loop(interval), name="sessions")
+
+    async def stop(self) -> None:
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            try:
+                await self._purge_task
+            except asyncio.CancelledError:
+                pass
+            self._purge_task = None
+
+    async def _purge_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                purged = await self.purge_expired()
+            except Exception as e:
+                logger.warning(f"Purging expired sessions failed: {e}")
+            else:
+                if purged:
+                    logger.debug(f"Purged {purged} expired sessions")
+
+    def _store(self, session_id: str, record: SessionRecord) -> None:
+        self._entries[session_id] = record
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+session_store = SessionStore(settings.session_cache_max_entries)
+
+
+class ServerSessionMiddleware:
+    """Load ``scope["session"]`` from ``store`` by the ID in the session cookie.
+
+    Parameters
+    ----------
+    store
+        Where sessions are kept.
+    cookie_name
+        Name of the cookie holding the session ID.
+    max_age
+        Seconds a session lives without being renewed.
+    same_site
+        ``SameSite`` attribute of the cookie.
+    https_only
+        Mark the cookie ``Secure``.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: SessionStore,
+        *,
+        cookie_name: str = "session",
+        max_age: int = 14 * 24 * 3600,
+        same_site: str = "lax",
+        https_only: bool = False,
+    ) -> None:
+        self.app = app
+        self.store = store
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+        attributes = f"path=/; httponly; samesite={same_site}"
+        if https_only:
+            attributes += "; secure"
+        self._cookie_attributes = attributes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id = self._session_id(scope)
+        record = await self.store.get(session_id) if session_id else None
+        if record is None:
+            session_id = None
+        session = Session(json.loads(record.data) if record else ())
+        scope["session"] = session
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                try:
+                    cookie = await self._commit(session_id, record, session)
+                except Exception:
+                    # The response is still sent; only the changes to the session are lost.
+                    logger.exception("Saving the session failed")
+                    cookie = None
+                if cookie is not None:
+                    MutableHeaders(scope=message).append("set-cookie", cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _session_id(self, scope: Scope) -> str | None:
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                session_id = cookie_parser(value.decode("latin-1")).get(self.cookie_name)
+                if session_id and _SESSION_ID_PATTERN.fullmatch(session_id):
+                    return session_id
+                return None
+        return None
+
+    async def _commit(
+        self, session_id: str | None, record: SessionRecord | None, session: Session
+    ) -> str | None:
+        """Store what changed; returns the ``Set-Cookie`` value to send, if any."""
+        now = time.time()
+        if session_id is not None and (session.regenerate or not session):
+            if not (session.modified or session.regenerate):
+                return None
+            await self.store.delete(session_id)
+            if not session:
+                return f"{self.cookie_name}=; max-age=0; {self._cookie_attributes}"
+            session_id = record = None
+        if not session:
+            return None
+
+        if session_id is None:
+            session_id = secrets.token_urlsafe(32)
+            renew = True
+        else:
+            # The cookie and the stored session expire together, so the stored expiry is
+            # only moved when the cookie is sent again.
+            renew = record.expires_at - now < self.max_age / 2
+            if not (session.modified or renew):
+                return None
+        expires_at = now + self.max_age if renew else record.expires_at
+        await self.store.save(session_id, SessionRecord(_dumps(session), expires_at))
+        if not renew:
+            return None
+        max_age = self.max_age
+        return f"{self.cookie_name}={session_id}; max-age={max_age}; {self._cookie_attributes}"
+
+
+def _dumps(data: Mapping[str, object]) -> str:
+    return json.dumps(data, separators=(",", ":"))
@@ -0,0 +1,313 @@
+"""Static file serving from an in-memory index.
+
+``StaticAssets`` replaces Starlette's ``StaticFiles`` for ``/static``. The directory is
+walked once at startup; each file's size, mtime, ETag, content type and precompressed
+``.br``/``.gz`` siblings (written by ``app/build_assets.py``) are kept in memory, and small
+files keep their bytes too, so a request never touches the filesystem just to answer
+a 304 or serve a stylesheet.
+
+- Fingerprinted files under ``build/`` get ``Cache-Control: public, max-age=31536000,
+  immutable``; everything else must be revalidated.
+- ``If-None-Match`` / ``If-Modified-Since`` are answered with 304 from the index.
+- ``Accept-Encoding`` picks the ``.br`` or ``.gz`` variant when one exists.
+- Single ``Range`` requests (and ``If-Range``) are answered with 206.
+- Bodies go out through the ASGI ``zerocopysend`` or ``pathsend`` extensions when the
+  server offers them, and in chunks otherwise.
+"""
+
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+CHUNK_SIZE = 64 * 1024
+
+# Preferred first; keys are Accept-Encoding tokens, values the file suffixes.
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+mimetypes.add_type("text/javascript", ".mjs")
+
+
+@dataclass(frozen=True)
+class _File:
+    path: str
+    size: int
+    mtime: float
+    etag: str
+    last_modified: str
+    body: bytes | None = None
+
+
+@dataclass
+class _Asset:
+    file: _File
+    content_type: str
+    cache_control: str
+    variants: dict[str, _File] = field(default_factory=dict)
+
+
+class StaticAssets:
+    """ASGI app serving ``directory`` from an index built at startup.
+
+    Parameters
+    ----------
+    directory
+        Directory to serve.
+    immutable_prefix
+        Files under this relative prefix have content-hashed names and are cached forever.
+    max_cached_size
+        Files up to this many bytes are held in memory.
+    autorefresh
+        Look files up on disk on every request instead of trusting the startup index.
+        Meant for development with hot reload.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        *,
+        immutable_prefix: str = "build/",
+        max_cached_size: int = 64 * 1024,
+        autorefresh: bool = False,
+    ) -> None:
+        self.directory = Path(directory).resolve()
+        if not self.directory.is_dir():
+            raise RuntimeError(f"Directory '{directory}' does not exist")
+        self.immutable_prefix = immutable_prefix
+        self.max_cached_size = max_cached_size
+        self.autorefresh = autorefresh
+        self._index: dict[str, _Asset] = {}
+        self.reload()
+
+    def reload(self) -> None:
+        """Rebuild the index from disk."""
+        index = {}
+        for path in self.directory.rglob("*"):
+            if not path.is_file() or path.suffix in ENCODINGS.values():
+                continue
+            relative = path.relative_to(self.directory).as_posix()
+            index[relative] = self._load(relative)
+        self._index = index
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            await _respond(send, 405, [(b"allow", b"GET, HEAD")], b"Method Not Allowed")
+            return
+
+        path, root_path = scope["path"], scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path) :]
+        relative = path.lstrip("/")
+        if self.autorefresh:
+            asset = await anyio.to_thread.run_sync(self._lookup_on_disk, relative)
+        else:
+            asset = self._index.get(relative)
+        if asset is None:
+            await _respond(send, 404, [], b"Not Found")
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding, file = self._negotiate(asset, request_headers.get("accept-encoding", ""))
+        headers = [
+            (b"cache-control", asset.cache_control.encode()),
+            (b"etag", file.etag.encode()),
+            (b"last-modified", file.last_modified.encode()),
+            (b"accept-ranges", b"bytes"),
+        ]
+        if asset.variants:
+            headers.append((b"vary", b"Accept-Encoding"))
+
+        if _not_modified(request_headers, file):
+            await _respond(send, 304, headers)
+            return
+
+        headers.append((b"content-type", asset.content_type.encode()))
+        if encoding:
+            headers.append((b"content-encoding", encoding.encode()))
+
+        start, end = 0, file.size
+        status = 200
+        range_header = request_headers.get("range")
+        if range_header and _if_range_matches(request_headers, file):
+            byte_range = _parse_range(range_header, file.size)
+            if byte_range is None:
+                headers.append((b"content-range", f"bytes */{file.size}".encode()))
+                await _respond(send, 416, headers)
+                return
+            if byte_range != (0, file.size):
+                start, end = byte_range
+                status = 206
+                headers.append((b"content-range", f"bytes {start}-{end - 1}/{file.size}".encode()))
+
+        headers.append((b"content-length", str(end - start).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        if method == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await _send_file(scope, send, file, start, end)
+
+    def _negotiate(self, asset: _Asset, accept_encoding: str) -> tuple[str | None, _File]:
+        if asset.variants and accept_encoding:
+            accepted = _accepted_encodings(accept_encoding)
+            for encoding in ENCODINGS:
+                quality = accepted.get(encoding, accepted.get("*", 0.0))
+                if encoding in asset.variants and quality > 0:
+                    return encoding, asset.variants[encoding]
+        return None, asset.file
+
+    def _lookup_on_disk(self, relative: str) -> _Asset | None:
+        path = (self.directory / relative).resolve()
+        if self.directory not in path.parents or not path.is_file():
+            return None
+        return self._load(relative)
+
+    def _load(self, relative: str) -> _Asset:
+        path = self.directory / relative
+        content_type, _ = mimetypes.guess_type(relative)
+        content_type = content_type or "application/octet-stream"
+        if content_type.startswith("text/") or content_type.endswith(("json", "javascript")):
+            content_type += "; charset=utf-8"
+        if relative.startswith(self.immutable_prefix) and not relative.endswith(".json"):
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            cache_control = REVALIDATE_CACHE_CONTROL
+
+        asset = _Asset(self._stat(path, ""), content_type, cache_control)
+        for encoding, suffix in ENCODINGS.items():
+            variant = path.with_name(path.name + suffix)
+            if variant.is_file():
+                asset.variants[encoding] = self._stat(variant, encoding)
+        return asset
+
+    def _stat(self, path: Path, tag: str) -> _File:
+        stat = path.stat()
+        suffix = f"-{tag}" if tag else ""
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{suffix}"'
+        body = path.read_bytes() if stat.st_size <= self.max_cached_size else None
+        return _File(
+            path=str(path),
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            etag=etag,
+            last_modified=formatdate(stat.st_mtime, usegmt=True),
+            body=body,
+        )
+
+
+def _accepted_encodings(header: str) -> dict[str, float]:
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def _not_modified(headers: Headers, file: _File) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, file.etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(file.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _if_range_matches(headers: Headers, file: _File) -> bool:
+    if_range = headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return if_range == file.etag
+    return if_range == file.last_modified
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Parse a single ``bytes=`` range into ``(start, end)``, end exclusive.
+
+    Returns the whole file for multi-range or malformed headers, which RFC 9110 allows
+    servers to ignore, and ``None`` when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return 0, size
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            return (max(size - length, 0), size) if length > 0 and size else None
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    except ValueError:
+        return 0, size
+    if start >= size or start >= end:
+        return None
+    return start, end
+
+
+async def _respond(send: Send, status: int, headers: list, body: bytes = b"") -> None:
+    if body:
+        headers = [
+            *headers,
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_file(scope: Scope, send: Send, file: _File, start: int, end: int) -> None:
+    if file.body is not None:
+        await send({"type": "http.response.body", "body": file.body[start:end]})
+        return
+
+    extensions = scope.get("extensions") or {}
+    if "http.response.zerocopysend" in extensions:
+        with open(file.path, "rb") as f:
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": f.fileno(),
+                "offset": start,
+                "count": end - start,
+            })
+        return
+    if "http.response.pathsend" in extensions and (start, end) == (0, file.size):
+        await send({"type": "http.response.pathsend", "path": file.path})
+        return
+
+    async with await anyio.open_file(file.path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,116 @@
+"""Shared Jinja2 templates for every router.
+
+A single environment per worker, so templates are parsed and compiled once and shared by
+all routers. It loads modules precompiled by ``app/build_assets.py --precompile-templates``
+when they exist, keeps a filesystem bytecode cache for everything else, and only checks
+sources for changes when hot reload is on. ``warm_up()`` runs from the app ``lifespan``
+so the first requests after a deploy don't pay for template compilation.
+
+Route handlers render pages with ``render()``, which answers HTMX requests with just the
+swapped block instead of the whole layout.
+"""
+
+import time
+from collections.abc import Mapping
+from typing import Any
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import (
+    BaseLoader,
+    ChoiceLoader,
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    ModuleLoader,
+)
+
+from core.assets import (
+    COMPILED_TEMPLATES_DIR,
+    TEMPLATE_ENV_OPTIONS,
+    TEMPLATES_DIR,
+    static_url,
+)
+from core.config import settings
+from core.metrics import TEMPLATE_RENDER_DURATION
+from core.timing import record
+
+
+def create_environment() -> Environment:
+    loaders: list[BaseLoader] = []
+    if not settings.app_hot_reload and COMPILED_TEMPLATES_DIR.is_dir():
+        loaders.append(ModuleLoader(COMPILED_TEMPLATES_DIR))
+    loaders.append(FileSystemLoader(TEMPLATES_DIR))
+
+    bytecode_cache = None
+    if settings.templates_bytecode_cache:
+        if settings.templates_cache_dir:
+            settings.templates_cache_dir.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(settings.templates_cache_dir)
+
+    env = Environment(
+        loader=ChoiceLoader(loaders),
+        bytecode_cache=bytecode_cache,
+        auto_reload=settings.app_hot_reload,
+        cache_size=-1,
+        **TEMPLATE_ENV_OPTIONS,
+    )
+    env.globals["static_url"] = static_url
+    return env
+
+
+templates: Jinja2Templates = Jinja2Templates(env=create_environment())
+
+
+def warm_up() -> int:
+    """Load every template under ``app/templates/`` and return how many were loaded."""
+    names = FileSystemLoader(TEMPLATES_DIR).list_templates()
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
+
+
+def wants_partial(request: Request) -> bool:
+    """True for HTMX requests that swap part of the page.
+
+    Boosted links and forms (``hx-boost``) replace the whole body and get the full page.
+    """
+    headers = request.headers
+    return headers.get("hx-request") == "true" and headers.get("hx-boosted") != "true"
+
+
+def render(
+    request: Request,
+    name: str,
+    context: Mapping[str, Any] | None = None,
+    *,
+    block: str = "main_content",
+    status_code: int = 200,
+    headers: Mapping[str, str] | None = None,
+) -> HTMLResponse:
+    """Render ``name`` as a full page, or only one block of it for HTMX swaps.
+
+    For an HTMX request the block named by ``HX-Target`` (an element id) is rendered when
+    the template defines one, and ``block`` otherwise; the layout around it is skipped.
+    """
+    start = time.perf_counter()
+    template = templates.env.get_template(name)
+    values = {**(context or {}), "request": request}
+    partial = wants_partial(request)
+    if partial:
+        target = request.headers.get("hx-target")
+        block_name = target if target in template.blocks else block
+        try:
+            content = "".join(template.blocks[block_name](template.new_context(values)))
+        except Exception:
+            templates.env.handle_exception()
+    else:
+        content = template.render(values)
+    elapsed = time.perf_counter() - start
+    TEMPLATE_RENDER_DURATION.labels(name, "partial" if partial else "full").observe(elapsed)
+    record("render", elapsed)
+
+    response = HTMLResponse(content, status_code=status_code, headers=headers)
+    response.headers.append("Vary", "HX-Request, HX-Target")
+    return response
@@ -0,0 +1,192 @@
+"""Per-request timing spans, reported in the ``Server-Timing`` response header.
+
+``ServerTimingMiddleware`` starts a ``Timings`` collection for every request and writes
+it into the response headers, where browser dev tools show it next to the request::
+
+    Server-Timing: routing;dur=0.4, db;dur=3.1;desc="2 calls", render;dur=1.2, ...
+
+Any code running for the request, including ``services/`` and code run in the
+threadpool, can add its own phase::
+
+    from core.timing import (
+        span,
+    )
+
+    with span(
+        "pricing"
+    ):
+        prices = compute_prices(
+            cart
+        )
+
+Spans with the same name add up. Outside a request ``span`` does nothing, so library
+code can use it unconditionally. Built-in phases:
+
+- ``routing``: from receiving the request to the route handler, middleware included
+- ``handler``: the endpoint function itself
+- ``serialize``: dependency resolution and response serialization around the endpoint
+- ``db``: queries on connections from ``db.connection`` (and so the pools)
+- ``render``: ``core.templates.render``
+- ``total``: until the response headers are sent
+
+Routes only report ``routing``, ``handler`` and ``serialize`` when their router uses
+``route_class=TimedRoute``.
+"""
+
+import functools
+import inspect
+import time
+from collections.abc import Callable
+from contextvars import ContextVar
+from typing import Any, ParamSpec
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.profiling import profile_thread
+
+P = ParamSpec("P")
+
+_timings: ContextVar["Timings | None"] = ContextVar("timings", default=None)
+
+
+class Timings:
+    """Durations collected for one request, by phase name, in order of first use."""
+
+    __slots__ = ("start", "phases")
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.phases: dict[str, list[float]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        phase = self.phases.get(name)
+        if phase is None:
+            self.phases[name] = [seconds, 1]
+        else:
+            phase[0] += seconds
+            phase[1] += 1
+
+    def header(self) -> str:
+        """The ``Server-Timing`` header value, durations in milliseconds."""
+        entries = []
+        for name, (seconds, count) in self.phases.items():
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                entry += f';desc="{count} calls"'
+            entries.append(entry)
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def current_timings() -> Timings | None:
+    """The timings of the request being handled, if any."""
+    return _timings.get()
+
+
+def record(name: str, seconds: float) -> None:
+    """Add ``seconds`` to phase ``name`` of the current request."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+class span:  # noqa: N801 - used like a function: ``with span("db"):``
+    """Time a block as phase ``name`` of the current request."""
+
+    __slots__ = ("name", "_timings", "_start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._timings: Timings | None = None
+        self._start = 0.0
+
+    def __enter__(self) -> "span":
+        self._timings = _timings.get()
+        if self._timings is not None:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self._timings is not None:
+            self._timings.add(self.name, time.perf_counter() - self._start)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware collecting spans for each request into ``Server-Timing``."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = Timings()
+        token = _timings.set(timings)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+
+
+class TimedRoute(APIRoute):
+    """``APIRoute`` that reports the ``routing``, ``handler`` and ``serialize`` phases.
+
+    ```python
+    router = APIRouter(
+        route_class=TimedRoute
+    )
+    ```
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs) -> None:
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable[[Request], Any]:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            timings = _timings.get()
+            if timings is None:
+                return await handler(request)
+            start = time.perf_counter()
+            timings.add("routing", start - timings.start)
+            handled = timings.phases.get("handler", (0.0,))[0]
+            try:
+                return await handler(request)
+            finally:
+                handler_time = timings.phases.get("handler", (0.0,))[0] - handled
+                timings.add("serialize", time.perf_counter() - start - handler_time)
+
+        return timed_handler
+
+
+def _timed_endpoint(endpoint: Callable[P, object]) -> Callable[P, object]:
+    # Keeps the signature (for dependency injection) and sync/async-ness of the endpoint.
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def async_endpoint(*args: P.args, **kwargs: P.kwargs) -> object:
+            with span("handler"):
+                return await endpoint(*args, **kwargs)
+
+        return async_endpoint
+
+    # Runs in the threadpool, which a profiler started on the event loop doesn't see.
+    @functools.wraps(endpoint)
+    def sync_endpoint(*args: P.args, **kwargs: P.kwargs) -> object:
+        with span("handler"), profile_thread():
+            return endpoint(*args, **kwargs)
+
+    return sync_endpoint
@@ -0,0 +1,391 @@
+"""Per-worker asyncio connection pool and query helpers (psycopg 3).
+
+The async counterpart of ``db.pool``: same settings, same ``PoolStats``, opened and closed
+in the app ``lifespan``. Use it from ``async def`` routes so a query waits on the event
+loop instead of holding one of Starlette's threadpool slots::
+
+    @router.get(
+        "/customers/{customer_id}"
+    )
+    async def customer(
+        customer_id: int,
+        conn=Depends(
+            get_async_db
+        ),
+    ):
+        row = await fetch_one(
+            conn,
+            "SELECT id, name FROM customers WHERE id = %s",
+            (
+                customer_id,
+            ),
+        )
+
+
+    async with (
+        transaction() as conn
+    ):
+        await execute(
+            conn,
+            "UPDATE customers SET name = %s WHERE id = %s",
+            (
+                name,
+                customer_id,
+            ),
+        )
+
+Queries become prepared statements on a connection after ``DB_PREPARE_THRESHOLD`` runs
+there (see ``db.connection.get_async_connection``). Pass ``prepare=True`` to the helpers
+to prepare a query on its first run, or ``prepare=False`` for one that never repeats.
+"""
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any
+
+import psycopg
+from loguru import logger
+from psycopg.pq import TransactionStatus
+
+from core.config import settings
+from db.connection import get_async_connection
+from db.pool import PoolClosedError, PoolStats, PoolTimeoutError
+
+Params = Sequence[Any] | dict[str, Any] | None
+
+
+@dataclass
+class _Slot:
+    conn: psycopg.AsyncConnection
+    created_at: float
+    last_used: float
+
+
+class AsyncConnectionPool:
+    """Pool of psycopg ``AsyncConnection`` objects for a single event loop.
+
+    Behaves like ``db.pool.ConnectionPool``; see there for the meaning of the parameters.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[psycopg.AsyncConnection]],
+        *,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        idle_timeout: float = 600.0,
+        max_lifetime: float = 3600.0,
+        check_after: float | None = 5.0,
+    ) -> None:
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"invalid pool size: min_size={min_size}, max_size={max_size}")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+
+        self._cond = asyncio.Condition()
+        self._idle: deque[_Slot] = deque()
+        self._in_use: dict[int, _Slot] = {}
+        self._opening = 0
+        self._waiting = 0
+        self._closed = True
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    async def open(self) -> None:
+        """Open the pool and fill it up to ``min_size``."""
+        if not self._closed:
+            return
+        self._closed = False
+        slots = await asyncio.gather(*(self._new_slot() for _ in range(self.min_size)))
+        self._idle.extend(slots)
+
+    async def close(self) -> None:
+        """Close idle connections and refuse new checkouts."""
+        async with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for slot in idle:
+            await slot.conn.close()
+
+    async def getconn(self) -> psycopg.AsyncConnection:
+        """Check a connection out, waiting up to ``timeout`` seconds for one to free up."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            slot = None
+            expired: list[_Slot] = []
+            try:
+                async with self._cond:
+                    self._waiting += 1
+                    try:
+                        while True:
+                            if self._closed:
+                                raise PoolClosedError("connection pool is closed")
+                            expired += self._take_expired(time.monotonic())
+                            if self._idle:
+                                slot = self._idle.pop()
+                                break
+                            if self.size < self.max_size:
+                                self._opening += 1
+                                break
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                self._timeouts += 1
+                                raise PoolTimeoutError(
+                                    f"no connection available within {self.timeout:.1f}s "
+                                    f"(max_size={self.max_size})"
+                                )
+                            try:
+                                await asyncio.wait_for(self._cond.wait(), remaining)
+                            except TimeoutError:
+                                pass
+                    finally:
+                        self._waiting -= 1
+            finally:
+                for old in expired:
+                    await self._close_conn(old.conn)
+
+            if slot is None:
+                try:
+                    slot = await self._new_slot()
+                finally:
+                    self._opening -= 1
+                    if slot is None:
+                        async with self._cond:
+                            self._cond.notify()
+                    else:
+                        self._in_use[id(slot.conn)] = slot
+            else:
+                self._in_use[id(slot.conn)] = slot
+                if not await self._is_healthy(slot):
+                    del self._in_use[id(slot.conn)]
+                    async with self._cond:
+                        self._cond.notify()
+                    await self._close_conn(slot.conn)
+                    continue
+
+            now = time.monotonic()
+            waited = now - start
+            slot.last_used = now
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            return slot.conn
+
+    async def putconn(self, conn: psycopg.AsyncConnection, discard: bool = False) -> None:
+        """Return a connection to the pool, rolling back any open transaction."""
+        slot = self._in_use.pop(id(conn), None)
+        if slot is None:
+            raise ValueError("connection does not belong to this pool")
+
+        now = time.monotonic()
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != TransactionStatus.IDLE:
+                    await conn.rollback()
+            except psycopg.Error:
+                discard = True
+        if discard or conn.closed or self._closed or now - slot.created_at > self.max_lifetime:
+            await self._close_conn(conn)
+        else:
+            slot.last_used = now
+            self._idle.append(slot)
+        expired = self._take_expired(now)
+        async with self._cond:
+            self._cond.notify()
+        for old in expired:
+            await self._close_conn(old.conn)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[psycopg.AsyncConnection]:
+        """Check out a connection for the duration of an ``async with`` block."""
+        conn = await self.getconn()
+        try:
+            yield conn
+        except BaseException:
+            await self.putconn(conn, discard=conn.closed)
+            raise
+        await self.putconn(conn)
+
+    def stats(self) -> PoolStats:
+        return PoolStats(
+            min_size=self.min_size,
+            max_size=self.max_size,
+            size=self.size,
+            in_use=len(self._in_use),
+            idle=len(self._idle),
+            waiting=self._waiting,
+            checkouts=self._checkouts,
+            timeouts=self._timeouts,
+            wait_time_total=self._wait_total,
+            wait_time_max=self._wait_max,
+        )
+
+    async def _new_slot(self) -> _Slot:
+        conn = await self.connect()
+        now = time.monotonic()
+        return _Slot(conn=conn, created_at=now, last_used=now)
+
+    def _take_expired(self, now: float) -> list[_Slot]:
+        # Same as ConnectionPool._take_expired: the caller closes the returned slots after
+        # releasing the condition.
+        keep: deque[_Slot] = deque()
+        expired = []
+        total = len(self._idle) + len(self._in_use)
+        for slot in self._idle:
+            stale = now - slot.last_used > self.idle_timeout and total > self.min_size
+            if stale or now - slot.created_at > self.max_lifetime:
+                expired.append(slot)
+                total -= 1
+            else:
+                keep.append(slot)
+        self._idle = keep
+        return expired
+
+    async def _is_healthy(self, slot: _Slot) -> bool:
+        if slot.conn.closed:
+            return False
+        if self.check_after is None or time.monotonic() - slot.last_used < self.check_after:
+            return True
+        try:
+            await slot.conn.execute("SELECT 1")
+            await slot.conn.rollback()
+        except psycopg.Error as e:
+            logger.warning(f"Discarding broken pooled connection: {e}")
+            return False
+        return True
+
+    @staticmethod
+    async def _close_conn(conn: psycopg.AsyncConnection) -> None:
+        try:
+            await conn.close()
+        except psycopg.Error:
+            pass
+
+
+_pool: AsyncConnectionPool | None = None
+
+
+async def open_async_pool() -> AsyncConnectionPool:
+    """Create and open this worker's async pool. Called from the app ``lifespan``."""
+    global _pool
+    if _pool is None or _pool.closed:
+        _pool = AsyncConnectionPool(
+            get_async_connection,
+            min_size=min(settings.db_pool_min_size, settings.db_async_pool_size),
+            max_size=settings.db_async_pool_size,
+            timeout=settings.db_pool_timeout,
+            idle_timeout=settings.db_pool_idle_timeout,
+            max_lifetime=settings.db_pool_max_lifetime,
+            check_after=settings.db_pool_check_after,
+        )
+        await _pool.open()
+        logger.info(f"Opened async database pool (min={_pool.min_size}, max={_pool.max_size})")
+    return _pool
+
+
+async def close_async_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def get_async_pool() -> AsyncConnectionPool:
+    if _pool is None:
+        raise PoolClosedError("async database pool is not open; is the app lifespan running?")
+    return _pool
+
+
+async def get_async_db() -> AsyncIterator[psycopg.AsyncConnection]:
+    """FastAPI dependency yielding a pooled async connection for the current request."""
+    async with get_async_pool().connection() as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def transaction(
+    conn: psycopg.AsyncConnection | None = None,
+) -> AsyncIterator[psycopg.AsyncConnection]:
+    """Run a block in a transaction, committed on success and rolled back on error.
+
+    Uses ``conn`` when given (nesting as a savepoint if a transaction is already open),
+    otherwise checks a connection out of the pool for the duration of the block.
+    """
+    if conn is not None:
+        async with conn.transaction():
+            yield conn
+        return
+    async with get_async_pool().connection() as conn, conn.transaction():
+        yield conn
+
+
+async def execute(
+    conn: psycopg.AsyncConnection,
+    query: str,
+    params: Params = None,
+    *,
+    prepare: bool | None = None,
+) -> int:
+    """Execute a statement and return the number of affected rows."""
+    async with conn.cursor() as cur:
+        await cur.execute(query, params, prepare=prepare)
+        return cur.rowcount
+
+
+async def fetch_one(
+    conn: psycopg.AsyncConnection,
+    query: str,
+    params: Params = None,
+    *,
+    prepare: bool | None = None,
+) -> tuple | None:
+    async with conn.cursor() as cur:
+        await cur.execute(query, params, prepare=prepare)
+        return await cur.fetchone()
+
+
+async def fetch_all(
+    conn: psycopg.AsyncConnection,
+    query: str,
+    params: Params = None,
+    *,
+    prepare: bool | None = None,
+) -> list[tuple]:
+    async with conn.cursor() as cur:
+        await cur.execute(query, params, prepare=prepare)
+        return await cur.fetchall()
+
+
+async def fetch_val(
+    conn: psycopg.AsyncConnection,
+    query: str,
+    params: Params = None,
+    *,
+    prepare: bool | None = None,
+) -> object:
+    """Return the first column of the first row, or ``None`` if there are no rows."""
+    row = await fetch_one(conn, query, params, prepare=prepare)
+    return row[0] if row else None
@@ -0,0 +1,331 @@
+"""Bulk writes: ``COPY`` loaders and batched multi-row ``INSERT``/upserts.
+
+An ``INSERT`` per row costs a round trip per row, which dominates once there are more
+than a few hundred. ``copy_rows`` streams rows from any iterable (a generator, a CSV
+reader, another cursor) through ``COPY ... FROM STDIN``, encoding them a batch at a time,
+so the payload is never built in memory::
+
+    with (
+        get_pool().connection() as conn
+    ):
+        copy_rows(
+            conn,
+            "events",
+            (
+                "user_id",
+                "kind",
+                "created_at",
+            ),
+            read_events(),
+        )
+        conn.commit()
+
+``copy_rows`` can only append. ``insert_values`` and ``upsert_values`` send
+``DB_BULK_PAGE_SIZE`` rows per ``INSERT ... VALUES`` statement, which is slower than
+``COPY`` but can skip or update rows that already exist::
+
+    upsert_values(
+        conn,
+        "prices",
+        (
+            "sku",
+            "price",
+        ),
+        rows,
+        key=("sku",),
+    )
+
+None of these commit; the caller decides where the transaction ends. The ``_async``
+variants take a psycopg 3 ``AsyncConnection`` from ``db.async_pool``.
+"""
+
+import io
+import json
+import re
+from collections.abc import AsyncIterable, Callable, Iterable, Iterator, Sequence
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+from os import PathLike
+from types import ModuleType
+from typing import IO, Any
+from uuid import UUID
+
+import psycopg
+import psycopg2.extras
+from psycopg import sql as sql3
+from psycopg2 import sql as sql2
+from psycopg2.extensions import connection
+
+from core.config import settings
+
+# Rows encoded per chunk handed to COPY.
+COPY_BATCH_SIZE = 1000
+# Postgres accepts at most this many parameters per statement (psycopg 3 binds them).
+MAX_PARAMS = 65535
+
+
+def copy_rows(
+    conn: connection, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]
+) -> int:
+    """Append ``rows`` to ``table`` with ``COPY``; returns how many were copied.
+
+    Values are sent in ``COPY``'s text format: ``None`` is ``NULL``, dicts and lists are
+    written as JSON and anything else as ``str()``, which suits the usual column types.
+    """
+    statement = sql2.SQL("COPY {} FROM STDIN").format(_target(sql2, table, columns))
+    reader = _CopyReader(rows)
+    with conn.cursor() as cur:
+        cur.copy_expert(statement, reader)
+    return reader.rows
+
+
+def copy_file(
+    conn: connection,
+    table: str,
+    file: str | PathLike | IO[bytes],
+    columns: Sequence[str] | None = None,
+    *,
+    header: bool = True,
+) -> int:
+    """Load a CSV file (a path or a binary file object) into ``table`` with ``COPY``.
+
+    The file is read in chunks. Returns the number of rows loaded.
+    """
+    target = _target(sql2, table, columns) if columns else _table(sql2, table)
+    statement = sql2.SQL("COPY {} FROM STDIN WITH (FORMAT csv, HEADER {})").format(
+        target, sql2.SQL("true" if header else "false")
+    )
+    with conn.cursor() as cur:
+        if isinstance(file, str | PathLike):
+            with open(file, "rb") as f:
+                cur.copy_expert(statement, f)
+        else:
+            cur.copy_expert(statement, file)
+        return cur.rowcount
+
+
+def insert_values(
+    conn: connection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    *,
+    page_size: int | None = None,
+    ignore_conflicts: bool = False,
+) -> int:
+    """Insert ``rows`` with one multi-row ``INSERT`` per ``page_size`` rows.
+
+    ``ignore_conflicts`` skips rows violating a unique constraint. Returns the number of
+    rows inserted.
+    """
+    suffix = sql2.SQL(" ON CONFLICT DO NOTHING" if ignore_conflicts else "")
+    return _execute_values(conn, table, columns, rows, suffix, page_size)
+
+
+def upsert_values(
+    conn: connection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    *,
+    key: Sequence[str],
+    update: Sequence[str] | None = None,
+    page_size: int | None = None,
+) -> int:
+    """Insert ``rows``, updating the ``update`` columns of rows whose ``key`` exists.
+
+    ``key`` must match a unique index; ``update`` defaults to every column not in ``key``.
+    A key may appear only once per page, or Postgres rejects the statement. Returns the
+    number of rows inserted or updated.
+    """
+    suffix = _on_conflict(sql2, columns, key, update)
+    return _execute_values(conn, table, columns, rows, suffix, page_size)
+
+
+async def copy_rows_async(
+    conn: psycopg.AsyncConnection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]] | AsyncIterable[Sequence[Any]],
+) -> int:
+    """``copy_rows`` for psycopg 3, which adapts values like query parameters."""
+    statement = sql3.SQL("COPY {} FROM STDIN").format(_target(sql3, table, columns))
+    count = 0
+    async with conn.cursor() as cur, cur.copy(statement) as copy:
+        if isinstance(rows, AsyncIterable):
+            async for row in rows:
+                await copy.write_row(row)
+                count += 1
+        else:
+            for row in rows:
+                await copy.write_row(row)
+                count += 1
+    return count
+
+
+async def insert_values_async(
+    conn: psycopg.AsyncConnection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    *,
+    page_size: int | None = None,
+    ignore_conflicts: bool = False,
+) -> int:
+    suffix = sql3.SQL(" ON CONFLICT DO NOTHING" if ignore_conflicts else "")
+    return await _execute_values_async(conn, table, columns, rows, suffix, page_size)
+
+
+async def upsert_values_async(
+    conn: psycopg.AsyncConnection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    *,
+    key: Sequence[str],
+    update: Sequence[str] | None = None,
+    page_size: int | None = None,
+) -> int:
+    suffix = _on_conflict(sql3, columns, key, update)
+    return await _execute_values_async(conn, table, columns, rows, suffix, page_size)
+
+
+def _execute_values(
+    conn: connection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    suffix: sql2.Composable,
+    page_size: int | None,
+) -> int:
+    statement = (
+        sql2
+        .SQL("INSERT INTO {} VALUES %s{}")
+        .format(_target(sql2, table, columns), suffix)
+        .as_string(conn)
+    )
+    page_size = page_size or settings.db_bulk_page_size
+    count = 0
+    with conn.cursor() as cur:
+        for page in _pages(rows, page_size):
+            psycopg2.extras.execute_values(cur, statement, page, page_size=len(page))
+            count += cur.rowcount
+    return count
+
+
+async def _execute_values_async(
+    conn: psycopg.AsyncConnection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    suffix: sql3.Composable,
+    page_size: int | None,
+) -> int:
+    # psycopg 3 sends parameters separately, so a page must stay under MAX_PARAMS.
+    page_size = min(page_size or settings.db_bulk_page_size, MAX_PARAMS // len(columns))
+    row_sql = sql3.SQL("({})").format(sql3.SQL(", ").join([sql3.Placeholder()] * len(columns)))
+    target = _target(sql3, table, columns)
+    count = 0
+    async with conn.cursor() as cur:
+        for page in _pages(rows, page_size):
+            statement = sql3.SQL("INSERT INTO {} VALUES {}{}").format(
+                target, sql3.SQL(", ").join([row_sql] * len(page)), suffix
+            )
+            await cur.execute(statement, [value for row in page for value in row])
+            count += cur.rowcount
+    return count
+
+
+def _pages(rows: Iterable[Sequence[Any]], size: int) -> Iterator[list[Sequence[Any]]]:
+    rows = iter(rows)
+    while page := list(islice(rows, size)):
+        yield page
+
+
+# The helpers below take either ``psycopg2.sql`` or ``psycopg.sql`` as ``sql``; both have
+# the same API, and the result is a Composable of that module.
+def _table(sql: ModuleType, table: str) -> sql2.Composable | sql3.Composable:
+    # "schema.table" is quoted as two identifiers.
+    return sql.Identifier(*table.split("."))
+
+
+def _target(
+    sql: ModuleType, table: str, columns: Sequence[str]
+) -> sql2.Composable | sql3.Composable:
+    return sql.SQL("{} ({})").format(
+        _table(sql, table), sql.SQL(", ").join(map(sql.Identifier, columns))
+    )
+
+
+def _on_conflict(
+    sql: ModuleType, columns: Sequence[str], key: Sequence[str], update: Sequence[str] | None
+) -> sql2.Composable | sql3.Composable:
+    if update is None:
+        update = [column for column in columns if column not in key]
+    conflict = sql.SQL(", ").join(map(sql.Identifier, key))
+    if not update:
+        return sql.SQL(" ON CONFLICT ({}) DO NOTHING").format(conflict)
+    assignments = sql.SQL(", ").join(
+        sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column)) for column in update
+    )
+    return sql.SQL(" ON CONFLICT ({}) DO UPDATE SET {}").format(conflict, assignments)
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+_NEEDS_ESCAPE = re.compile(r"[\\\t\n\r]")
+
+
+def _copy_str(value: str) -> str:
+    return value.translate(_COPY_ESCAPES) if _NEEDS_ESCAPE.search(value) else value
+
+
+def _copy_other(value: object) -> str:
+    if isinstance(value, bytes | bytearray | memoryview):
+        return "\\\\x" + bytes(value).hex()
+    if isinstance(value, dict | list):
+        return _copy_str(json.dumps(value))
+    return _copy_str(str(value))
+
+
+# Looked up by exact type: encoding runs for every value and is most of copy_rows' time,
+# so common types skip the isinstance() checks in _copy_other.
+_COPY_ENCODERS: dict[type, Callable[[Any], str]] = {
+    str: _copy_str,
+    int: str,
+    float: str,
+    bool: lambda value: "t" if value else "f",
+    type(None): lambda value: "\\N",
+    datetime: str,
+    date: str,
+    Decimal: str,
+    UUID: str,
+}
+
+
+def _copy_value(value: object) -> str:
+    return _COPY_ENCODERS.get(type(value), _copy_other)(value)
+
+
+class _CopyReader(io.TextIOBase):
+    """File-like view of ``rows`` in ``COPY`` text format, encoded as ``read()`` asks."""
+
+    def __init__(self, rows: Iterable[Sequence[Any]]) -> None:
+        self._pages = _pages(rows, COPY_BATCH_SIZE)
+        self._buffer = ""
+        self.rows = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int | None = -1) -> str:
+        while size is None or size < 0 or len(self._buffer) < size:
+            page = next(self._pages, None)
+            if page is None:
+                break
+            self.rows += len(page)
+            self._buffer += "".join("\t".join(map(_copy_value, row)) + "\n" for row in page)
+        if size is None or size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
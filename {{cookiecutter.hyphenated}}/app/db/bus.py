@@ -0,0 +1,215 @@
+"""Cross-worker invalidation over Postgres LISTEN/NOTIFY.
+
+Every worker runs one listener (started in the app ``lifespan``) on a dedicated
+connection. Writers publish invalidation keys inside their own transaction, so the
+message is only delivered once the write commits::
+
+    with (
+        conn.cursor() as cur
+    ):
+        cur.execute(
+            "UPDATE products SET price = %s WHERE id = %s",
+            (
+                price,
+                product_id,
+            ),
+        )
+    publish(
+        conn,
+        {
+            "cache.tag": [
+                "products"
+            ]
+        },
+    )
+    conn.commit()
+
+Messages map a namespace to keys; subscribers register per namespace with
+``bus.subscribe()``. Because notifications sent while a listener is disconnected are lost,
+``on_reset`` callbacks run after every reconnect so local caches can start over.
+"""
+
+import asyncio
+import json
+import random
+from collections.abc import Callable, Mapping, Sequence
+
+import psycopg
+from loguru import logger
+from psycopg import sql
+from psycopg2.extensions import connection
+
+from core.config import settings
+from db.connection import get_async_connection
+
+# pg_notify payloads must stay below 8000 bytes.
+MAX_PAYLOAD_BYTES = 7900
+
+Handler = Callable[[list[str]], None]
+
+
+def _payloads(messages: Mapping[str, Sequence[str]]) -> list[str]:
+    """Split ``messages`` into JSON payloads that fit in a single NOTIFY."""
+    payloads = []
+    current: dict[str, list[str]] = {}
+    size = 2
+    for namespace, keys in messages.items():
+        for key in dict.fromkeys(keys):
+            cost = len(json.dumps(key)) + len(json.dumps(namespace)) + 4
+            if current and size + cost > MAX_PAYLOAD_BYTES:
+                payloads.append(json.dumps(current))
+                current, size = {}, 2
+            current.setdefault(namespace, []).append(key)
+            size += cost
+    if current:
+        payloads.append(json.dumps(current))
+    return payloads
+
+
+def publish(
+    conn: connection, messages: Mapping[str, Sequence[str]], channel: str | None = None
+) -> None:
+    """Queue invalidations on a psycopg2 connection; they are sent when it commits."""
+    channel = channel or settings.cache_bus_channel
+    with conn.cursor() as cur:
+        for payload in _payloads(messages):
+            cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+
+async def publish_async(
+    conn: psycopg.AsyncConnection,
+    messages: Mapping[str, Sequence[str]],
+    channel: str | None = None,
+) -> None:
+    """``publish`` for an asyncio connection from ``db.async_pool``."""
+    channel = channel or settings.cache_bus_channel
+    async with conn.cursor() as cur:
+        for payload in _payloads(messages):
+            await cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+
+class InvalidationBus:
+    """Background LISTEN loop dispatching notifications to subscribers.
+
+    Parameters
+    ----------
+    channel
+        Postgres channel to listen on.
+    health_check_interval
+        Seconds without notifications after which the connection is pinged, so a
+        silently dropped connection is noticed and replaced.
+    max_reconnect_delay
+        Upper bound for the exponential reconnect backoff.
+    """
+
+    def __init__(
+        self,
+        channel: str,
+        *,
+        health_check_interval: float = 30.0,
+        max_reconnect_delay: float = 30.0,
+    ) -> None:
+        self.channel = channel
+        self.health_check_interval = health_check_interval
+        self.max_reconnect_delay = max_reconnect_delay
+        self._handlers: dict[str, list[Handler]] = {}
+        self._reset_callbacks: list[Callable[[], None]] = []
+        self._task: asyncio.Task | None = None
+        self._listening = asyncio.Event()
+        self.received = 0
+        self.reconnects = 0
+
+    def subscribe(self, namespace: str, handler: Handler) -> None:
+        """Call ``handler(keys)`` for every message carrying ``namespace``."""
+        self._handlers.setdefault(namespace, []).append(handler)
+
+    def on_reset(self, callback: Callable[[], None]) -> None:
+        """Call ``callback()`` after a reconnect, when messages may have been missed."""
+        self._reset_callbacks.append(callback)
+
+    async def start(self, timeout: float = 10.0) -> None:
+        """Start listening and wait until the first ``LISTEN`` is active."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"bus:{self.channel}")
+        try:
+            await asyncio.wait_for(self._listening.wait(), timeout)
+        except TimeoutError:
+            logger.warning(f"Invalidation bus not listening yet on '{self.channel}'; retrying")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        delay = 0.1
+        connected_before = False
+        while True:
+            try:
+                conn = await get_async_connection(autocommit=True)
+            except Exception as e:
+                logger.warning(f"Invalidation bus cannot connect: {e}; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            try:
+                await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                if connected_before:
+                    self.reconnects += 1
+                    logger.info(f"Invalidation bus reconnected to '{self.channel}'")
+                    self._reset()
+                connected_before = True
+                delay = 0.1
+                self._listening.set()
+                await self._listen(conn)
+            except psycopg.Error as e:
+                logger.warning(f"Invalidation bus connection lost: {e}")
+            except Exception:
+                # Anything else is a bug, but ending the loop would leave every cache it
+                # keeps consistent stale until the worker restarts.
+                logger.exception(f"Invalidation bus listener failed; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, self.max_reconnect_delay)
+            finally:
+                self._listening.clear()
+                await conn.close()
+
+    async def _listen(self, conn: psycopg.AsyncConnection) -> None:
+        while True:
+            async for notify in conn.notifies(timeout=self.health_check_interval):
+                self.received += 1
+                try:
+                    self._dispatch(notify.payload)
+                except Exception:
+                    logger.exception(f"Dispatching invalidation failed: {notify.payload[:200]!r}")
+            await conn.execute("SELECT 1")
+
+    def _dispatch(self, payload: str) -> None:
+        try:
+            messages = json.loads(payload)
+        except ValueError:
+            messages = None
+        if not isinstance(messages, dict):
+            logger.warning(f"Ignoring malformed invalidation payload: {payload[:200]!r}")
+            return
+        for namespace, keys in messages.items():
+            for handler in self._handlers.get(namespace, ()):
+                try:
+                    handler(keys)
+                except Exception:
+                    logger.exception(f"Invalidation handler for '{namespace}' failed")
+
+    def _reset(self) -> None:
+        for callback in self._reset_callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Invalidation bus reset callback failed")
+
+
+bus = InvalidationBus(settings.cache_bus_channel)
@@ -1,13 +1,84 @@
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any, Self
+
+import psycopg
 import psycopg2
+import psycopg2.extensions
+from psycopg.abc import Params, Query
+from psycopg2 import sql
+
 from core.config import settings
+from core.timing import span
 
 
-def get_connection():
-    host = settings.db_host
-    port = settings.db_port
-    username = settings.db_username
-    password = settings.db_password
-    database = settings.db_name
-    return psycopg2.connect(
-        f"host={host} dbname={database} user={username} password={password} port={port}"
+def _conninfo() -> str:
+    # make_dsn quotes every value and leaves out the None ones, so an empty password or
+    # one with spaces or quotes can't shift the other parameters.
+    return psycopg2.extensions.make_dsn(
+        host=settings.db_host,
+        port=settings.db_port,
+        user=settings.db_username or None,
+        password=settings.db_password or None,
+        dbname=settings.db_name,
     )
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Cursor reporting its queries as the ``db`` phase of ``Server-Timing``."""
+
+    def execute(
+        self,
+        query: str | bytes | sql.Composable,
+        vars: Sequence[Any] | Mapping[str, Any] | None = None,
+    ) -> None:
+        with span("db"):
+            return super().execute(query, vars)
+
+    def executemany(
+        self,
+        query: str | bytes | sql.Composable,
+        vars_list: Iterable[Sequence[Any] | Mapping[str, Any]],
+    ) -> None:
+        with span("db"):
+            return super().executemany(query, vars_list)
+
+
+class TimedAsyncCursor(psycopg.AsyncCursor):
+    """``TimedCursor`` for psycopg 3 asyncio connections."""
+
+    async def execute(self, query: Query, params: Params | None = None, **kwargs) -> Self:
+        with span("db"):
+            return await super().execute(query, params, **kwargs)
+
+    async def executemany(self, query: Query, params_seq: Iterable[Params], **kwargs) -> None:
+        with span("db"):
+            return await super().executemany(query, params_seq, **kwargs)
+
+
+def get_connection() -> psycopg2.extensions.connection:
+    """Open a new, unpooled connection.
+
+    Request handlers should use the pooled ``db.pool.get_db`` dependency instead; this is
+    for scripts and the pool itself.
+    """
+    return psycopg2.connect(_conninfo(), cursor_factory=TimedCursor)
+
+
+async def get_async_connection(conninfo: str | None = None, **kwargs) -> psycopg.AsyncConnection:
+    """Open a new, unpooled asyncio connection (psycopg 3).
+
+    Async routes should use ``db.async_pool.get_async_db`` instead. ``conninfo`` (a
+    connection string or URL) defaults to ``DATABASE_URL``; ``kwargs`` are passed to
+    ``AsyncConnection.connect`` (e.g. ``autocommit=True``).
+
+    A query run ``DB_PREPARE_THRESHOLD`` times on the connection becomes a server-side
+    prepared statement, so later runs skip parsing and planning; the connection keeps the
+    ``DB_PREPARED_MAX`` most recently used. Pooled connections live for many requests, so
+    hot queries are prepared once per connection. Set ``DB_PREPARE_THRESHOLD`` to nothing
+    behind PgBouncer in transaction mode, which can't keep them.
+    """
+    kwargs.setdefault("cursor_factory", TimedAsyncCursor)
+    kwargs.setdefault("prepare_threshold", settings.db_prepare_threshold)
+    conn = await psycopg.AsyncConnection.connect(conninfo or _conninfo(), **kwargs)
+    conn.prepared_max = settings.db_prepared_max
+    return conn
@@ -0,0 +1,300 @@
+"""Durable background jobs in the ``jobs`` table, run by ``app/worker.py``.
+
+Slow work (emails, reports, imports) goes into a job instead of running in the request.
+A handler is a function in a module under ``app/services/``, registered by name; async
+handlers run on the worker's event loop, plain functions in threads or, with
+``WORKER_PROCESSES``, in a process pool::
+
+    from db.jobs import (
+        task,
+    )
+
+
+    @task(
+        "emails.welcome"
+    )
+    async def send_welcome(
+        customer_id: int,
+    ) -> None: ...
+
+Enqueue it on the connection doing the rest of the work. Like ``db.bus.publish``, nothing
+happens until that connection commits: then the job is stored and idle workers are
+woken through ``NOTIFY``::
+
+    enqueue(
+        conn,
+        "emails.welcome",
+        {
+            "customer_id": customer[
+                "id"
+            ]
+        },
+    )
+    conn.commit()
+
+Arguments are stored as JSON and passed as keyword arguments. ``run_at`` or ``delay``
+schedule a job for later, and a ``key`` makes enqueueing idempotent: while a job with
+that key is queued or running, another is not added. A job that raises is retried after
+``JOB_RETRY_BASE_DELAY`` seconds, doubling up to ``JOB_RETRY_MAX_DELAY``, until it has
+made ``JOB_MAX_ATTEMPTS`` attempts; then it stays in the table as ``failed`` with its
+last error. Jobs that succeed are deleted.
+"""
+
+import importlib
+import json
+import pkgutil
+import random
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+import psycopg
+from psycopg2.extensions import connection
+
+from core.config import settings
+from db.async_pool import execute, fetch_all, fetch_val
+from db.bus import publish, publish_async
+
+# Message namespace on JOBS_CHANNEL; the keys are queue names.
+NAMESPACE = "jobs"
+
+# Handlers by task name, filled by ``@task`` when their modules are imported.
+TASKS: dict[str, Callable[..., Any]] = {}
+
+_ENQUEUE_SQL = """
+INSERT INTO jobs (queue, task, args, run_at, priority, max_attempts, key)
+VALUES (%s, %s, %s::jsonb, coalesce(%s, now()) + make_interval(secs => %s), %s, %s, %s)
+ON CONFLICT (key) WHERE status <> 'failed' DO NOTHING
+RETURNING id
+"""
+
+# Claims due jobs for this worker, skipping rows other workers are claiming right now.
+_DEQUEUE_SQL = """
+UPDATE jobs SET status = 'running', attempts = attempts + 1,
+    locked_until = now() + make_interval(secs => %(lease)s)
+WHERE id IN (
+    SELECT id FROM jobs
+    WHERE status = 'queued' AND queue = ANY(%(queues)s) AND run_at <= now()
+    ORDER BY priority DESC, run_at, id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id, queue, task, args, attempts, max_attempts
+"""
+
+# Requeues jobs whose worker stopped renewing their lease, or fails them if that was
+# their last attempt.
+_RECOVER_SQL = """
+UPDATE jobs SET locked_until = NULL, last_error = 'lease expired',
+    status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END
+WHERE id IN (
+    SELECT id FROM jobs WHERE status = 'running' AND locked_until < now()
+    FOR UPDATE SKIP LOCKED
+)
+"""
+
+
+@dataclass(frozen=True)
+class Job:
+    id: int
+    queue: str
+    task: str
+    args: dict[str, Any]
+    attempts: int
+    max_attempts: int
+
+
+def task(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Register the decorated function as the handler of jobs named ``name``."""
+
+    def register(fn: Callable[..., Any]) -> Callable[..., Any]:
+        if TASKS.get(name, fn) is not fn:
+            raise ValueError(f"task {name!r} is already registered")
+        TASKS[name] = fn
+        return fn
+
+    return register
+
+
+def load_tasks(package: str = "services") -> dict[str, Callable[..., Any]]:
+    """Import every module of ``package`` so their ``@task`` handlers register."""
+    module = importlib.import_module(package)
+    for info in pkgutil.walk_packages(module.__path__, f"{package}."):
+        importlib.import_module(info.name)
+    return TASKS
+
+
+def run_task(name: str, args: Mapping[str, Any]) -> object:
+    """Call a sync handler; runs in the worker's threads or process pool."""
+    if name not in TASKS:
+        load_tasks()
+    return TASKS[name](**args)
+
+
+def _enqueue_params(
+    task: str,
+    args: Mapping[str, Any] | None,
+    queue: str,
+    run_at: datetime | None,
+    delay: float,
+    priority: int,
+    max_attempts: int | None,
+    key: str | None,
+) -> tuple:
+    return (
+        queue,
+        task,
+        json.dumps(args or {}),
+        run_at,
+        delay,
+        priority,
+        max_attempts or settings.job_max_attempts,
+        key,
+    )
+
+
+def enqueue(
+    conn: connection,
+    task: str,
+    args: Mapping[str, Any] | None = None,
+    *,
+    queue: str = "default",
+    run_at: datetime | None = None,
+    delay: float = 0,
+    priority: int = 0,
+    max_attempts: int | None = None,
+    key: str | None = None,
+) -> int | None:
+    """Add a job on a psycopg2 connection; it is stored and run once ``conn`` commits.
+
+    Parameters
+    ----------
+    task
+        Name the handler was registered under with ``@task``.
+    args
+        Keyword arguments for the handler; must be JSON-serializable.
+    queue
+        Queue to put it on; workers take jobs from ``WORKER_QUEUES``.
+    run_at, delay
+        Run it no earlier than ``run_at`` (default now) plus ``delay`` seconds.
+    priority
+        Due jobs with a higher priority run first.
+    max_attempts
+        Attempts before the job is marked failed; defaults to ``JOB_MAX_ATTEMPTS``.
+    key
+        Skip adding the job while another job with this key is queued or running.
+
+    Returns
+    -------
+    int | None
+        The job's ID, or None if a job with ``key`` already exists.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            _ENQUEUE_SQL,
+            _enqueue_params(task, args, queue, run_at, delay, priority, max_attempts, key),
+        )
+        row = cur.fetchone()
+    publish(conn, {NAMESPACE: [queue]}, channel=settings.jobs_channel)
+    return row[0] if row else None
+
+
+async def enqueue_async(
+    conn: psycopg.AsyncConnection,
+    task: str,
+    args: Mapping[str, Any] | None = None,
+    *,
+    queue: str = "default",
+    run_at: datetime | None = None,
+    delay: float = 0,
+    priority: int = 0,
+    max_attempts: int | None = None,
+    key: str | None = None,
+) -> int | None:
+    """``enqueue`` for an asyncio connection from ``db.async_pool``."""
+    job_id = await fetch_val(
+        conn,
+        _ENQUEUE_SQL,
+        _enqueue_params(task, args, queue, run_at, delay, priority, max_attempts, key),
+    )
+    await publish_async(conn, {NAMESPACE: [queue]}, channel=settings.jobs_channel)
+    return job_id
+
+
+async def dequeue(
+    conn: psycopg.AsyncConnection, queues: Sequence[str], limit: int, lease: float
+) -> list[Job]:
+    """Claim up to ``limit`` due jobs and commit, locking them for ``lease`` seconds."""
+    rows = await fetch_all(
+        conn, _DEQUEUE_SQL, {"queues": list(queues), "limit": limit, "lease": lease}
+    )
+    await conn.commit()
+    # RETURNING comes in no particular order.
+    return sorted((Job(*row) for row in rows), key=lambda job: job.id)
+
+
+async def complete(conn: psycopg.AsyncConnection, job_ids: Sequence[int]) -> None:
+    """Delete jobs that ran successfully."""
+    await execute(conn, "DELETE FROM jobs WHERE id = ANY(%s)", (list(job_ids),))
+    await conn.commit()
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before retrying a job that has failed ``attempts`` times."""
+    delay = min(settings.job_retry_base_delay * 2 ** (attempts - 1), settings.job_retry_max_delay)
+    return delay * random.uniform(0.5, 1.5)
+
+
+async def fail(conn: psycopg.AsyncConnection, job: Job, error: str) -> bool:
+    """Record a failed attempt; returns True if the job will be retried."""
+    retry = job.attempts < job.max_attempts
+    await execute(
+        conn,
+        "UPDATE jobs SET locked_until = NULL, last_error = %s, status = %s,"
+        " run_at = now() + make_interval(secs => %s) WHERE id = %s",
+        (error, "queued" if retry else "failed", retry_delay(job.attempts), job.id),
+    )
+    await conn.commit()
+    return retry
+
+
+async def release(conn: psycopg.AsyncConnection, job_ids: Sequence[int]) -> None:
+    """Put interrupted jobs back in the queue, without counting the attempt."""
+    await execute(
+        conn,
+        "UPDATE jobs SET status = 'queued', locked_until = NULL, attempts = attempts - 1"
+        " WHERE id = ANY(%s) AND status = 'running'",
+        (list(job_ids),),
+    )
+    await conn.commit()
+
+
+async def renew(conn: psycopg.AsyncConnection, job_ids: Sequence[int], lease: float) -> None:
+    """Extend the lease of jobs that are still running."""
+    await execute(
+        conn,
+        "UPDATE jobs SET locked_until = now() + make_interval(secs => %s)"
+        " WHERE id = ANY(%s) AND status = 'running'",
+        (lease, list(job_ids)),
+    )
+    await conn.commit()
+
+
+async def recover_expired(conn: psycopg.AsyncConnection) -> int:
+    """Requeue (or fail) running jobs whose lease ran out; returns how many."""
+    recovered = await execute(conn, _RECOVER_SQL)
+    await conn.commit()
+    return recovered
+
+
+async def seconds_until_due(conn: psycopg.AsyncConnection, queues: Sequence[str]) -> float | None:
+    """Seconds until the next queued job in ``queues`` is due, or None if there is none."""
+    seconds = await fetch_val(
+        conn,
+        "SELECT extract(epoch FROM min(run_at) - now())::float8 FROM jobs"
+        " WHERE status = 'queued' AND queue = ANY(%s)",
+        (list(queues),),
+    )
+    await conn.commit()
+    return None if seconds is None else max(seconds, 0.0)
@@ -0,0 +1,380 @@
+"""Per-worker PostgreSQL connection pool.
+
+Every uvicorn worker opens its own pool in the app ``lifespan`` (see ``main.py``), next to
+an async pool (``db.async_pool``) and the invalidation bus connection (``db.bus``). Each
+pool holds up to ``DB_POOL_MAX_SIZE`` connections, less when ``DB_MAX_CONNECTIONS`` splits
+a budget between them (see ``core.config``). Handlers get a connection through the
+``get_db`` dependency, which hands it back to the pool when the request is done.
+"""
+
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import anyio.to_thread
+import psycopg2
+from anyio import CapacityLimiter
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, connection
+
+from core.config import settings
+from db.connection import get_connection
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out within the pool timeout."""
+
+
+class PoolClosedError(Exception):
+    """Raised when using a pool that is not open."""
+
+
+@dataclass(frozen=True)
+class PoolStats:
+    """Point-in-time snapshot of a pool, as returned by ``ConnectionPool.stats()``."""
+
+    min_size: int
+    max_size: int
+    size: int
+    in_use: int
+    idle: int
+    waiting: int
+    checkouts: int
+    timeouts: int
+    wait_time_total: float
+    wait_time_max: float
+
+    @property
+    def wait_time_avg(self) -> float:
+        return self.wait_time_total / self.checkouts if self.checkouts else 0.0
+
+
+@dataclass
+class _Slot:
+    conn: connection
+    created_at: float
+    last_used: float
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    Sync routes run in Starlette's threadpool, so checkouts are guarded by a condition
+    variable. Idle connections are kept in a LIFO stack: the most recently used one is
+    handed out first and the oldest ones age out through ``idle_timeout``. Expired idle
+    connections are dropped on every checkout and checkin, and closed outside the lock.
+
+    Parameters
+    ----------
+    connect
+        Factory returning a new connection.
+    min_size, max_size
+        Connections kept open at all times / opened at most.
+    timeout
+        Seconds a checkout may wait for a free connection before ``PoolTimeoutError``.
+    idle_timeout
+        Idle connections above ``min_size`` are closed after this many seconds.
+    max_lifetime
+        Connections are recycled once they are this many seconds old.
+    check_after
+        Connections idle for longer than this are pinged with ``SELECT 1`` on checkout;
+        ``None`` disables the check.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], connection],
+        *,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        idle_timeout: float = 600.0,
+        max_lifetime: float = 3600.0,
+        check_after: float | None = 5.0,
+    ) -> None:
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"invalid pool size: min_size={min_size}, max_size={max_size}")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+
+        self._cond = threading.Condition()
+        self._idle: deque[_Slot] = deque()
+        self._in_use: dict[int, _Slot] = {}
+        self._opening = 0
+        self._waiting = 0
+        self._closed = True
+        self._checkout_limiter: CapacityLimiter | None = None
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def open(self) -> None:
+        """Open the pool and fill it up to ``min_size``."""
+        with self._cond:
+            if not self._closed:
+                return
+            self._closed = False
+        for _ in range(self.min_size):
+            slot = self._new_slot()
+            with self._cond:
+                self._idle.append(slot)
+
+    def close(self) -> None:
+        """Close idle connections and refuse new checkouts.
+
+        Connections still checked out are closed when they are returned.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for slot in idle:
+            self._close_conn(slot.conn)
+
+    def getconn(self) -> connection:
+        """Check a connection out, waiting up to ``timeout`` seconds for one to free up."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            slot = None
+            expired: list[_Slot] = []
+            try:
+                with self._cond:
+                    self._waiting += 1
+                    try:
+                        while True:
+                            if self._closed:
+                                raise PoolClosedError("connection pool is closed")
+                            expired += self._take_expired(time.monotonic())
+                            if self._idle:
+                                slot = self._idle.pop()
+                                break
+                            if self.size < self.max_size:
+                                self._opening += 1
+                                break
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                self._timeouts += 1
+                                raise PoolTimeoutError(
+                                    f"no connection available within {self.timeout:.1f}s "
+                                    f"(max_size={self.max_size})"
+                                )
+                            self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+            finally:
+                # Closing can block on the network, so it happens outside the lock.
+                for old in expired:
+                    self._close_conn(old.conn)
+
+            if slot is None:
+                try:
+                    slot = self._new_slot()
+                finally:
+                    with self._cond:
+                        self._opening -= 1
+                        if slot is None:
+                            self._cond.notify()
+                        else:
+                            self._in_use[id(slot.conn)] = slot
+            else:
+                with self._cond:
+                    self._in_use[id(slot.conn)] = slot
+                if not self._is_healthy(slot):
+                    with self._cond:
+                        del self._in_use[id(slot.conn)]
+                        self._cond.notify()
+                    self._close_conn(slot.conn)
+                    continue
+
+            now = time.monotonic()
+            waited = now - start
+            with self._cond:
+                slot.last_used = now
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return slot.conn
+
+    async def getconn_async(self) -> connection:
+        """``getconn`` from the event loop, waiting in a thread outside Starlette's threadpool.
+
+        Sync routes need a threadpool thread to finish and hand their connection back, so
+        checkouts blocked in that threadpool can starve them until the pool timeout. At
+        most ``max_size`` threads wait here; further callers wait on the event loop.
+        """
+        if self._checkout_limiter is None:
+            self._checkout_limiter = CapacityLimiter(self.max_size)
+        return await anyio.to_thread.run_sync(self.getconn, limiter=self._checkout_limiter)
+
+    def putconn(self, conn: connection, discard: bool = False) -> None:
+        """Return a connection to the pool, rolling back any open transaction."""
+        with self._cond:
+            slot = self._in_use.pop(id(conn), None)
+        if slot is None:
+            raise ValueError("connection does not belong to this pool")
+
+        now = time.monotonic()
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed or self._closed or now - slot.created_at > self.max_lifetime:
+            self._close_conn(conn)
+            with self._cond:
+                expired = self._take_expired(now)
+                self._cond.notify()
+        else:
+            slot.last_used = now
+            with self._cond:
+                self._idle.append(slot)
+                expired = self._take_expired(now)
+                self._cond.notify()
+        for old in expired:
+            self._close_conn(old.conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[connection]:
+        """Check out a connection for the duration of a ``with`` block."""
+        conn = self.getconn()
+        try:
+            yield conn
+        except BaseException:
+            self.putconn(conn, discard=conn.closed)
+            raise
+        self.putconn(conn)
+
+    def stats(self) -> PoolStats:
+        with self._cond:
+            return PoolStats(
+                min_size=self.min_size,
+                max_size=self.max_size,
+                size=self.size,
+                in_use=len(self._in_use),
+                idle=len(self._idle),
+                waiting=self._waiting,
+                checkouts=self._checkouts,
+                timeouts=self._timeouts,
+                wait_time_total=self._wait_total,
+                wait_time_max=self._wait_max,
+            )
+
+    def _new_slot(self) -> _Slot:
+        now = time.monotonic()
+        return _Slot(conn=self.connect(), created_at=now, last_used=now)
+
+    def _take_expired(self, now: float) -> list[_Slot]:
+        # Remove idle slots past max_lifetime or idle_timeout and return them for the caller
+        # to close once it has released the lock. Must hold the lock. The stack is ordered
+        # by last use, not by age, so every slot is checked.
+        keep: deque[_Slot] = deque()
+        expired = []
+        total = len(self._idle) + len(self._in_use)
+        for slot in self._idle:
+            stale = now - slot.last_used > self.idle_timeout and total > self.min_size
+            if stale or now - slot.created_at > self.max_lifetime:
+                expired.append(slot)
+                total -= 1
+            else:
+                keep.append(slot)
+        self._idle = keep
+        return expired
+
+    def _is_healthy(self, slot: _Slot) -> bool:
+        if slot.conn.closed:
+            return False
+        if self.check_after is None or time.monotonic() - slot.last_used < self.check_after:
+            return True
+        try:
+            with slot.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            slot.conn.rollback()
+        except psycopg2.Error as e:
+            logger.warning(f"Discarding broken pooled connection: {e}")
+            return False
+        return True
+
+    @staticmethod
+    def _close_conn(conn: connection) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+_pool: ConnectionPool | None = None
+
+
+def open_pool() -> ConnectionPool:
+    """Create and open this worker's pool. Called from the app ``lifespan``."""
+    global _pool
+    if _pool is None or _pool.closed:
+        _pool = ConnectionPool(
+            get_connection,
+            min_size=min(settings.db_pool_min_size, settings.db_sync_pool_size),
+            max_size=settings.db_sync_pool_size,
+            timeout=settings.db_pool_timeout,
+            idle_timeout=settings.db_pool_idle_timeout,
+            max_lifetime=settings.db_pool_max_lifetime,
+            check_after=settings.db_pool_check_after,
+        )
+        _pool.open()
+        logger.info(f"Opened database pool (min={_pool.min_size}, max={_pool.max_size})")
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+def get_pool() -> ConnectionPool:
+    if _pool is None:
+        raise PoolClosedError("database pool is not open; is the app lifespan running?")
+    return _pool
+
+
+async def get_db() -> AsyncIterator[connection]:
+    """FastAPI dependency yielding a pooled connection for the current request.
+
+    ```python
+    @router.get(
+        "/customers/{customer_id}"
+    )
+    def customer(
+        customer_id: int,
+        conn=Depends(
+            get_db
+        ),
+    ): ...
+    ```
+    """
+    pool = get_pool()
+    conn = await pool.getconn_async()
+    try:
+        yield conn
+    finally:
+        await run_in_threadpool(pool.putconn, conn)
@@ -0,0 +1,186 @@
+"""Keyset pagination for listing pages, with opaque cursor tokens.
+
+``LIMIT ... OFFSET n`` makes Postgres produce and throw away ``n`` rows, so deep pages
+get slower the deeper they are. ``fetch_page`` seeks past the last row shown instead
+(``WHERE (created_at, id) > (...)``), which an index on the sort keys answers in the same
+time on every page. Where to continue is handed to the client as a signed token::
+
+    @router.get(
+        "/orders"
+    )
+    async def orders(
+        request: Request,
+        cursor: str
+        | None = None,
+        conn=Depends(
+            get_async_db
+        ),
+    ):
+        try:
+            page = await fetch_page(
+                conn,
+                "SELECT id, total, created_at FROM orders WHERE status = %s",
+                (
+                    "paid",
+                ),
+                order_by=(
+                    "created_at",
+                    "id",
+                ),
+                cursor=cursor,
+            )
+        except InvalidCursorError:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid cursor",
+            )
+        context = {
+            "page": page,
+            "next_url": next_page_url(
+                request,
+                page,
+            ),
+        }
+        return render(
+            request,
+            "orders/list.html",
+            context,
+            block="rows",
+        )
+
+The sort keys must be non-null, unique together (end with the primary key) and in the
+select list; an index on them keeps every page cheap. ``query`` must not have its own
+``ORDER BY`` or ``LIMIT``. For "load more" with HTMX, end the ``rows`` block with the
+``load_more(next_url)`` macro from ``shared/load_more.html``: it renders an element that
+fetches the next page, which ``render`` answers with just the ``rows`` block, and replaces
+itself with it. A token is signed together with the query and sort order it came from,
+so one replayed on another listing raises ``InvalidCursorError`` as well.
+
+The query text is the same for every page, so psycopg 3 prepares it on each pooled
+connection once it has run ``DB_PREPARE_THRESHOLD`` times there and later pages skip
+planning (see ``db.connection.get_async_connection``).
+"""
+
+import hashlib
+import json
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+import psycopg
+from fastapi import Request
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from core.config import settings
+from db.async_pool import Params
+
+# Salted per listing in encode_cursor/decode_cursor.
+_serializer = URLSafeSerializer(
+    settings.secret_key,
+    serializer=json,
+    serializer_kwargs={"default": str, "separators": (",", ":")},
+)
+
+
+class InvalidCursorError(ValueError):
+    """Raised for a cursor token that was tampered with or belongs to another listing."""
+
+
+@dataclass(frozen=True)
+class Page:
+    columns: list[str]
+    rows: list[tuple]
+    next_cursor: str | None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+
+def listing_key(query: str, order_by: Sequence[str], descending: bool = False) -> str:
+    """Fingerprint of a listing; cursors only decode for the listing they came from."""
+    listing = json.dumps([query, list(order_by), descending])
+    return hashlib.sha256(listing.encode()).hexdigest()[:16]
+
+
+def encode_cursor(values: Sequence[Any], listing: str) -> str:
+    """An opaque token for the sort key ``values`` of the last row on a page.
+
+    Values that aren't JSON types are stored as ``str()`` (e.g. datetimes, UUIDs), which
+    Postgres converts back when comparing them with the column. ``listing`` is the
+    ``listing_key`` of the page's query, signed into the token.
+    """
+    return _serializer.dumps(list(values), salt=f"db.queries.cursor:{listing}")
+
+
+def decode_cursor(token: str, keys: int, listing: str) -> list[Any]:
+    try:
+        values = _serializer.loads(token, salt=f"db.queries.cursor:{listing}")
+    except BadSignature as e:
+        raise InvalidCursorError("invalid cursor, or one from another listing") from e
+    if not isinstance(values, list) or len(values) != keys:
+        raise InvalidCursorError("cursor does not match the sort keys")
+    return values
+
+
+async def fetch_page(
+    conn: psycopg.AsyncConnection,
+    query: str,
+    params: Params = None,
+    *,
+    order_by: Sequence[str],
+    cursor: str | None = None,
+    limit: int = 50,
+    descending: bool = False,
+    prepare: bool | None = None,
+) -> Page:
+    """Fetch up to ``limit`` rows of ``query`` sorted by ``order_by``, after ``cursor``.
+
+    Every key is sorted the same way, ascending or ``descending``. ``prepare`` is passed
+    to psycopg as in ``db.async_pool``. Raises ``InvalidCursorError`` if ``cursor`` can't be
+    decoded.
+    """
+    keys = [f'"{key}"' for key in order_by]
+    direction, comparison = ("DESC", "<") if descending else ("ASC", ">")
+    listing = listing_key(query, order_by, descending)
+    after: list[Any] = decode_cursor(cursor, len(order_by), listing) if cursor else []
+    # Named parameters only if the query's are, psycopg doesn't allow mixing the two.
+    if isinstance(params, dict):
+        placeholders = [f"%(_after_{i})s" for i in range(len(after))]
+        all_params: Params = {
+            **params,
+            **{f"_after_{i}": value for i, value in enumerate(after)},
+            "_limit": limit + 1,
+        }
+        limit_placeholder = "%(_limit)s"
+    else:
+        placeholders = ["%s"] * len(after)
+        all_params = [*(params or ()), *after, limit + 1]
+        limit_placeholder = "%s"
+
+    # A plain subquery is flattened by the planner, so the seek condition and ORDER BY
+    # still use an index on the keys.
+    seek = f" WHERE ({', '.join(keys)}) {comparison} ({', '.join(placeholders)})" if after else ""
+    sql = (
+        f"SELECT * FROM ({query}) AS page{seek}"
+        f" ORDER BY {', '.join(f'{key} {direction}' for key in keys)} LIMIT {limit_placeholder}"
+    )
+    async with conn.cursor() as cur:
+        await cur.execute(sql, all_params, prepare=prepare)
+        columns = [column.name for column in cur.description]
+        rows = await cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        indexes = [columns.index(key) for key in order_by]
+        next_cursor = encode_cursor([rows[-1][i] for i in indexes], listing)
+    return Page(columns=columns, rows=rows, next_cursor=next_cursor)
+
+
+def next_page_url(request: Request, page: Page) -> str | None:
+    """The current URL with ``cursor`` set to the next page, or ``None`` on the last page."""
+    if page.next_cursor is None:
+        return None
+    url = request.url.include_query_params(cursor=page.next_cursor)
+    return f"{url.path}?{url.query}"
@@ -0,0 +1,112 @@
+"""Postgres backend and cross-worker invalidation for ``core.cache.ResponseCache``.
+
+Entries live in the ``response_cache`` UNLOGGED table (see migrations), so every worker in
+every container can reuse a response rendered by any of them. Enable it with
+``RESPONSE_CACHE_BACKEND=postgres``.
+
+After a write, call ``invalidate_cache`` (or ``invalidate_cache_async``) on the writing
+connection before committing; every worker drops the matching entries once it commits.
+"""
+
+from collections.abc import Iterable, Sequence
+from datetime import UTC, datetime
+
+from psycopg import AsyncConnection
+from psycopg.types.json import Jsonb
+from psycopg2.extensions import connection
+
+from core.cache import CachedResponse, response_cache
+from core.config import settings
+from db.async_pool import execute, fetch_one, get_async_pool
+from db.bus import InvalidationBus, publish, publish_async
+
+_DELETE_SQL = "DELETE FROM response_cache WHERE key = ANY(%s) OR tags && %s::text[]"
+
+# Expired rows are skipped on read and deleted every this many writes.
+PURGE_EVERY = 1000
+
+
+class PostgresCacheBackend:
+    def __init__(self) -> None:
+        self._writes = 0
+
+    async def get(self, key: str) -> CachedResponse | None:
+        async with get_async_pool().connection() as conn:
+            row = await fetch_one(
+                conn,
+                "SELECT status, headers, body, etag, tags, expires_at FROM response_cache"
+                " WHERE key = %s AND expires_at > now()",
+                (key,),
+            )
+        if row is None:
+            return None
+        status, headers, body, etag, tags, expires_at = row
+        return CachedResponse(
+            status=status,
+            headers=[(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+            body=bytes(body),
+            etag=etag,
+            expires_at=expires_at.timestamp(),
+            tags=tuple(tags),
+        )
+
+    async def set(self, key: str, entry: CachedResponse) -> None:
+        headers = Jsonb([(k.decode("latin-1"), v.decode("latin-1")) for k, v in entry.headers])
+        async with get_async_pool().connection() as conn:
+            await execute(
+                conn,
+                "INSERT INTO response_cache (key, status, headers, body, etag, tags, expires_at)"
+                " VALUES (%s, %s, %s, %s, %s, %s, %s)"
+                " ON CONFLICT (key) DO UPDATE SET status = EXCLUDED.status,"
+                " headers = EXCLUDED.headers, body = EXCLUDED.body, etag = EXCLUDED.etag,"
+                " tags = EXCLUDED.tags, expires_at = EXCLUDED.expires_at",
+                (
+                    key,
+                    entry.status,
+                    headers,
+                    entry.body,
+                    entry.etag,
+                    list(entry.tags),
+                    datetime.fromtimestamp(entry.expires_at, UTC),
+                ),
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                await execute(conn, "DELETE FROM response_cache WHERE expires_at <= now()")
+            await conn.commit()
+
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        async with get_async_pool().connection() as conn:
+            await execute(conn, _DELETE_SQL, (list(keys), list(tags)))
+            await conn.commit()
+
+    async def clear(self) -> None:
+        async with get_async_pool().connection() as conn:
+            await execute(conn, "TRUNCATE response_cache")
+            await conn.commit()
+
+
+def subscribe_response_cache(bus: InvalidationBus) -> None:
+    """Apply published invalidations to this worker's ``response_cache``."""
+    bus.subscribe("cache.key", lambda keys: response_cache.invalidate(keys=keys))
+    bus.subscribe("cache.tag", lambda tags: response_cache.invalidate(tags=tags))
+    bus.on_reset(response_cache.clear)
+
+
+def invalidate_cache(
+    conn: connection, *, keys: Sequence[str] = (), tags: Sequence[str] = ()
+) -> None:
+    """Invalidate cached responses in every worker once ``conn`` commits."""
+    if settings.response_cache_backend == "postgres":
+        with conn.cursor() as cur:
+            cur.execute(_DELETE_SQL, (list(keys), list(tags)))
+    publish(conn, {"cache.key": keys, "cache.tag": tags})
+
+
+async def invalidate_cache_async(
+    conn: AsyncConnection, *, keys: Sequence[str] = (), tags: Sequence[str] = ()
+) -> None:
+    """``invalidate_cache`` for an asyncio connection."""
+    if settings.response_cache_backend == "postgres":
+        await execute(conn, _DELETE_SQL, (list(keys), list(tags)))
+    await publish_async(conn, {"cache.key": keys, "cache.tag": tags})
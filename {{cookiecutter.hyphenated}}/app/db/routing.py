@@ -0,0 +1,283 @@
+"""Read replicas: send read-only work to replica pools and writes to the primary.
+
+With ``DATABASE_REPLICA_URLS`` set, each worker opens an async pool per replica next to
+the primary one (``db.async_pool``). Routes that only read take ``get_read_db``, which
+runs them in a read-only transaction on a replica; routes that write take
+``get_write_db``, which uses the primary::
+
+    @router.get(
+        "/orders"
+    )
+    async def orders(
+        conn=Depends(
+            get_read_db
+        ),
+    ): ...
+
+
+    @router.post(
+        "/orders"
+    )
+    async def create_order(
+        conn=Depends(
+            get_write_db
+        ),
+    ): ...
+
+Replicas apply the primary's changes with a delay, so a user who has just written would
+not always see it on the next page. ``get_write_db`` therefore marks the session, and
+that session's reads go to the primary for ``DB_REPLICA_STICKY_SECONDS``. Outside
+requests use ``replicas.connection()`` or ``read_transaction()``.
+
+Every ``DB_REPLICA_CHECK_INTERVAL`` seconds each replica's replay lag is measured; one
+lagging more than ``DB_REPLICA_MAX_LAG`` seconds, or unreachable, is taken out of
+rotation until it catches up. With no replica in rotation (or none configured) reads go
+to the primary. ``DB_REPLICA_STRATEGY`` picks among the others: ``round_robin``, or
+``least_busy`` for the one with the fewest connections in use.
+"""
+
+import asyncio
+import functools
+import itertools
+import time
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+import psycopg
+from fastapi import Request
+from loguru import logger
+from psycopg.conninfo import conninfo_to_dict
+
+from core.config import settings
+from db.async_pool import AsyncConnectionPool, fetch_val, get_async_pool
+from db.connection import get_async_connection
+from db.pool import PoolStats
+
+# Session key holding the time until which the session reads from the primary.
+PRIMARY_UNTIL_KEY = "_db_primary_until"
+
+# Seconds behind the primary. A replica that has replayed everything it received is
+# current even if the last transaction was long ago; a server that isn't a standby at
+# all reports 0.
+LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+END::float8
+"""
+
+
+@dataclass
+class Replica:
+    name: str
+    pool: AsyncConnectionPool
+    # Seconds behind the primary at the last check; None if it couldn't be measured.
+    lag: float | None = None
+    in_rotation: bool = False
+    checked_at: float | None = None
+
+
+@dataclass(frozen=True)
+class ReplicaStatus:
+    name: str
+    in_rotation: bool
+    lag: float | None
+    checked_at: float | None
+    pool: PoolStats
+
+
+class ReplicaRouter:
+    """Chooses a replica pool for each read, skipping replicas that lag behind.
+
+    Parameters
+    ----------
+    urls
+        Connection URLs of the replicas.
+    strategy
+        ``"round_robin"`` or ``"least_busy"`` (fewest connections in use, relative to
+        pool size).
+    max_lag
+        Replicas further behind the primary than this many seconds get no reads.
+    check_interval
+        Seconds between replay lag checks.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        *,
+        strategy: str = "round_robin",
+        max_lag: float = 5.0,
+        check_interval: float = 2.0,
+    ) -> None:
+        if strategy not in ("round_robin", "least_busy"):
+            raise ValueError(f"unknown replica strategy {strategy!r}")
+        self.urls = list(urls)
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.replicas: list[Replica] = []
+        self._counter = itertools.count()
+        self._task: asyncio.Task | None = None
+
+    async def open(self) -> None:
+        """Create a pool per replica, check their lag and start checking periodically."""
+        if self.replicas or not self.urls:
+            return
+        for url in self.urls:
+            # min_size=0: a replica that is down at startup must not stop the app.
+            pool = AsyncConnectionPool(
+                functools.partial(get_async_connection, url),
+                min_size=0,
+                max_size=settings.db_replica_pool_size,
+                timeout=settings.db_pool_timeout,
+                idle_timeout=settings.db_pool_idle_timeout,
+                max_lifetime=settings.db_pool_max_lifetime,
+                check_after=settings.db_pool_check_after,
+            )
+            await pool.open()
+            self.replicas.append(Replica(name=_replica_name(url), pool=pool))
+        await self.check()
+        self._task = asyncio.create_task(self._run(), name="db:replica-lag")
+        logger.info(f"Opened {len(self.replicas)} replica pools ({self.strategy})")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.pool.close()
+        self.replicas = []
+
+    async def check(self) -> None:
+        """Measure every replica's lag and update which ones are in rotation."""
+        await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+
+    async def _check(self, replica: Replica) -> None:
+        try:
+            async with asyncio.timeout(max(self.check_interval, 1.0)):
+                async with replica.pool.connection() as conn:
+                    replica.lag = await fetch_val(conn, LAG_QUERY, prepare=False)
+        except (psycopg.Error, OSError, TimeoutError) as e:
+            replica.lag = None
+            error = str(e).strip() or type(e).__name__
+        else:
+            error = None
+        in_rotation = replica.lag is not None and replica.lag <= self.max_lag
+        if in_rotation != replica.in_rotation or replica.checked_at is None:
+            if in_rotation:
+                logger.info(f"Replica {replica.name} in rotation (lag {replica.lag:.1f}s)")
+            elif error:
+                logger.warning(f"Replica {replica.name} out of rotation: {error}")
+            else:
+                logger.warning(
+                    f"Replica {replica.name} out of rotation: {replica.lag:.1f}s behind"
+                )
+        replica.in_rotation = in_rotation
+        replica.checked_at = time.time()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    def choose(self) -> AsyncConnectionPool:
+        """The pool the next read should use: a replica in rotation, else the primary."""
+        candidates = [replica for replica in self.replicas if replica.in_rotation]
+        if not candidates:
+            return get_async_pool()
+        if self.strategy == "least_busy":
+            return min(candidates, key=_busyness).pool
+        return candidates[next(self._counter) % len(candidates)].pool
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[psycopg.AsyncConnection]:
+        """Check out a connection for reads from ``choose()``."""
+        async with self.choose().connection() as conn:
+            yield conn
+
+    def status(self) -> list[ReplicaStatus]:
+        return [
+            ReplicaStatus(
+                name=replica.name,
+                in_rotation=replica.in_rotation,
+                lag=replica.lag,
+                checked_at=replica.checked_at,
+                pool=replica.pool.stats(),
+            )
+            for replica in self.replicas
+        ]
+
+
+def _replica_name(url: str) -> str:
+    # Parsed by libpq's rules, so hosts given as ?host=... (e.g. sockets) are found too.
+    params = conninfo_to_dict(url)
+    host, port = params.get("host", "localhost"), params.get("port", 5432)
+    return f"{host}:{port}/{params.get('dbname', '')}"
+
+
+def _busyness(replica: Replica) -> float:
+    stats = replica.pool.stats()
+    return (stats.in_use + stats.waiting) / stats.max_size
+
+
+replicas = ReplicaRouter(
+    settings.database_replica_urls,
+    strategy=settings.db_replica_strategy,
+    max_lag=settings.db_replica_max_lag,
+    check_interval=settings.db_replica_check_interval,
+)
+
+
+@asynccontextmanager
+async def read_transaction(*, primary: bool = False) -> AsyncIterator[psycopg.AsyncConnection]:
+    """A read-only transaction on a replica, or on the primary if ``primary``.
+
+    It is read-only on the primary too, so a write on a read path fails instead of going
+    unnoticed until replicas are enabled.
+    """
+    pool = get_async_pool() if primary else replicas.choose()
+    async with pool.connection() as conn, conn.transaction():
+        await conn.execute("SET TRANSACTION READ ONLY")
+        yield conn
+
+
+def stick_to_primary(request: Request, seconds: float | None = None) -> None:
+    """Send this session's reads to the primary for the next ``seconds``."""
+    if seconds is None:
+        seconds = settings.db_replica_sticky_seconds
+    if seconds > 0 and replicas.replicas and "session" in request.scope:
+        request.session[PRIMARY_UNTIL_KEY] = time.time() + seconds
+
+
+def reads_from_primary(request: Request) -> bool:
+    """True while the request's session has written within the sticky window."""
+    if "session" not in request.scope:
+        return False
+    return request.session.get(PRIMARY_UNTIL_KEY, 0) > time.time()
+
+
+async def get_read_db(request: Request) -> AsyncIterator[psycopg.AsyncConnection]:
+    """FastAPI dependency yielding a connection in a read-only transaction.
+
+    From a replica, unless the session wrote within ``DB_REPLICA_STICKY_SECONDS``.
+    """
+    async with read_transaction(primary=reads_from_primary(request)) as conn:
+        yield conn
+
+
+async def get_write_db(request: Request) -> AsyncIterator[psycopg.AsyncConnection]:
+    """FastAPI dependency yielding a connection to the primary.
+
+    The session's reads then also go to the primary for ``DB_REPLICA_STICKY_SECONDS``.
+    """
+    # Before yielding, so the session is changed before the response is sent.
+    stick_to_primary(request)
+    async with get_async_pool().connection() as conn:
+        yield conn
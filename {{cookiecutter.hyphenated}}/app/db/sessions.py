@@ -0,0 +1,99 @@
+"""Postgres backend and cross-worker invalidation for ``core.sessions.SessionStore``.
+
+Sessions live in the ``sessions`` table (see migrations). Every write publishes the
+session ID on the invalidation bus in the same transaction, so other workers drop their
+cached copy once it commits. The ID is tagged with the writing worker's, which skips its
+own messages: it already holds the new copy. Enable it with ``SESSION_BACKEND=postgres``.
+"""
+
+import os
+import uuid
+from datetime import UTC, datetime
+
+from core.sessions import SessionRecord, SessionStore
+from db.async_pool import execute, fetch_one, get_async_pool
+from db.bus import InvalidationBus, publish_async
+
+# Expired sessions are deleted in batches this size, so no single statement runs long.
+PURGE_BATCH_SIZE = 1000
+
+_worker: tuple[int, str] | None = None
+
+
+def _worker_id() -> str:
+    # Per process, not per import: workers forked from a preloaded app share module state.
+    global _worker
+    if _worker is None or _worker[0] != os.getpid():
+        _worker = (os.getpid(), uuid.uuid4().hex[:12])
+    return _worker[1]
+
+
+def _message(session_id: str) -> dict[str, list[str]]:
+    return {"session": [f"{_worker_id()}:{session_id}"]}
+
+
+class PostgresSessionBackend:
+    async def load(self, session_id: str) -> SessionRecord | None:
+        async with get_async_pool().connection() as conn:
+            # data::text skips decoding; the middleware parses it for each request anyway.
+            row = await fetch_one(
+                conn,
+                "SELECT data::text, expires_at FROM sessions WHERE id = %s AND expires_at > now()",
+                (session_id,),
+            )
+        if row is None:
+            return None
+        data, expires_at = row
+        return SessionRecord(data=data, expires_at=expires_at.timestamp())
+
+    async def save(self, session_id: str, record: SessionRecord) -> None:
+        async with get_async_pool().connection() as conn:
+            await execute(
+                conn,
+                "INSERT INTO sessions (id, data, expires_at) VALUES (%s, %s::jsonb, %s)"
+                " ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data,"
+                " expires_at = EXCLUDED.expires_at",
+                (session_id, record.data, datetime.fromtimestamp(record.expires_at, UTC)),
+            )
+            await publish_async(conn, _message(session_id))
+            await conn.commit()
+
+    async def delete(self, session_id: str) -> None:
+        async with get_async_pool().connection() as conn:
+            await execute(conn, "DELETE FROM sessions WHERE id = %s", (session_id,))
+            await publish_async(conn, _message(session_id))
+            await conn.commit()
+
+    async def purge_expired(self) -> int:
+        """Delete expired sessions; returns how many were deleted."""
+        # Expired sessions can't be loaded, so other workers need no invalidation. SKIP
+        # LOCKED lets workers purging at the same time split the rows between them.
+        purged = 0
+        while True:
+            async with get_async_pool().connection() as conn:
+                deleted = await execute(
+                    conn,
+                    "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions"
+                    " WHERE expires_at <= now() LIMIT %s FOR UPDATE SKIP LOCKED)",
+                    (PURGE_BATCH_SIZE,),
+                )
+                await conn.commit()
+            purged += deleted
+            if deleted < PURGE_BATCH_SIZE:
+                return purged
+
+
+def subscribe_sessions(bus: InvalidationBus, store: SessionStore) -> None:
+    """Drop sessions written by other workers from this worker's ``store``."""
+
+    def invalidate(keys: list[str]) -> None:
+        worker_id = _worker_id()
+        session_ids = []
+        for key in keys:
+            writer, _, session_id = key.rpartition(":")
+            if writer != worker_id:
+                session_ids.append(session_id)
+        store.invalidate(session_ids)
+
+    bus.subscribe("session", invalidate)
+    bus.on_reset(store.clear)
@@ -0,0 +1,137 @@
+"""Stream large query results to the client without loading them into memory.
+
+``fetchall()`` holds the whole result in the worker, and so does a cursor without a name:
+psycopg receives every row when the query runs. ``stream_rows`` instead declares a
+server-side cursor and fetches ``DB_STREAM_FETCH_SIZE`` rows at a time; ``stream_response``
+encodes each batch as it arrives::
+
+    @router.get(
+        "/orders.csv"
+    )
+    async def orders_csv():
+        return stream_response(
+            "SELECT id, customer_id, total, created_at FROM orders ORDER BY id",
+            output_format="csv",
+            filename="orders.csv",
+        )
+
+The next batch is only fetched once the previous one has been handed to the server, which
+waits while the client isn't reading, so memory stays at about one batch per export
+however many rows there are. If the client disconnects, the cursor is closed and the
+connection goes back to the pool.
+
+The connection is checked out of ``db.async_pool`` when the response starts streaming
+and held until it ends, so long exports occupy a pool slot for their whole duration.
+"""
+
+import csv
+import io
+import json
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Any
+
+from markupsafe import escape
+from starlette.responses import StreamingResponse
+
+from core.config import settings
+from db.async_pool import Params, get_async_pool
+
+Row = tuple[Any, ...]
+Encoder = Callable[[Sequence[str], list[Row]], str]
+
+
+async def stream_rows(
+    query: str, params: Params = None, *, fetch_size: int | None = None
+) -> AsyncIterator[tuple[list[str], list[Row]]]:
+    """Yield ``(column names, rows)`` in batches of up to ``fetch_size`` rows.
+
+    There is always at least one batch, possibly empty, so the columns are known.
+    """
+    fetch_size = fetch_size or settings.db_stream_fetch_size
+    async with get_async_pool().connection() as conn:
+        # A named cursor lives in a transaction, which the pool rolls back afterwards.
+        async with conn.cursor(name="stream") as cur:
+            await cur.execute(query, params)
+            columns = [column.name for column in cur.description]
+            while True:
+                rows = await cur.fetchmany(fetch_size)
+                yield columns, rows
+                if len(rows) < fetch_size:
+                    break
+
+
+def encode_csv(columns: Sequence[str], rows: list[Row]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def encode_ndjson(columns: Sequence[str], rows: list[Row]) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, row, strict=True)), default=str) + "\n" for row in rows
+    )
+
+
+def encode_html_rows(columns: Sequence[str], rows: list[Row]) -> str:
+    """``<tr>`` fragments, for appending to a ``<tbody>`` with HTMX."""
+    return "".join(
+        "<tr>" + "".join(f"<td>{escape('' if v is None else v)}</td>" for v in row) + "</tr>\n"
+        for row in rows
+    )
+
+
+def _csv_header(columns: Sequence[str]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue()
+
+
+# format -> (media type, encoder, header written before the first batch)
+FORMATS: dict[str, tuple[str, Encoder, Callable[[Sequence[str]], str] | None]] = {
+    "csv": ("text/csv; charset=utf-8", encode_csv, _csv_header),
+    "ndjson": ("application/x-ndjson", encode_ndjson, None),
+    "html": ("text/html; charset=utf-8", encode_html_rows, None),
+}
+
+
+async def encode_stream(
+    query: str,
+    params: Params = None,
+    *,
+    output_format: str = "csv",
+    fetch_size: int | None = None,
+) -> AsyncIterator[bytes]:
+    """The encoded result of ``query``, one chunk per fetched batch."""
+    _, encode, header = FORMATS[output_format]
+    first = True
+    async for columns, rows in stream_rows(query, params, fetch_size=fetch_size):
+        chunk = encode(columns, rows)
+        if first and header is not None:
+            chunk = header(columns) + chunk
+        first = False
+        if chunk:
+            yield chunk.encode()
+
+
+def stream_response(
+    query: str,
+    params: Params = None,
+    *,
+    output_format: str = "csv",
+    filename: str | None = None,
+    fetch_size: int | None = None,
+) -> StreamingResponse:
+    """A response streaming the result of ``query`` as CSV, NDJSON or HTML table rows.
+
+    ``filename`` makes browsers download it instead of displaying it.
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"unknown output format {output_format!r}")
+    headers = {"cache-control": "no-store"}
+    if filename:
+        headers["content-disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(
+        encode_stream(query, params, output_format=output_format, fetch_size=fetch_size),
+        media_type=FORMATS[output_format][0],
+        headers=headers,
+    )
@@ -0,0 +1,78 @@
+"""Token revocations shared by every worker.
+
+Revoke a token (say, on sign-out) on a connection you commit afterwards; once it commits,
+the revocation is stored in the ``revoked_tokens`` table and every worker rejects the
+token, even if it had already verified and cached it::
+
+    revoke_token(
+        conn,
+        token.token_id,
+        token.expires_at,
+    )
+    conn.commit()
+
+Workers load the stored revocations when they start.
+"""
+
+import asyncio
+from datetime import UTC, datetime
+
+from psycopg import AsyncConnection
+from psycopg2.extensions import connection
+
+from core.security import TokenVerifier
+from db.async_pool import execute, fetch_all, get_async_pool
+from db.bus import InvalidationBus, publish, publish_async
+
+_reload_tasks: set[asyncio.Task] = set()
+
+_INSERT_SQL = (
+    "INSERT INTO revoked_tokens (token_id, expires_at) VALUES (%s, %s)"
+    " ON CONFLICT (token_id) DO NOTHING"
+)
+
+
+def _message(token_id: str, expires_at: float) -> dict[str, list[str]]:
+    return {"token.revoke": [f"{token_id} {expires_at:.0f}"]}
+
+
+def revoke_token(conn: connection, token_id: str, expires_at: float) -> None:
+    """Revoke a token in every worker once ``conn`` commits."""
+    with conn.cursor() as cur:
+        cur.execute(_INSERT_SQL, (token_id, datetime.fromtimestamp(expires_at, UTC)))
+    publish(conn, _message(token_id, expires_at))
+
+
+async def revoke_token_async(conn: AsyncConnection, token_id: str, expires_at: float) -> None:
+    """``revoke_token`` for an asyncio connection."""
+    await execute(conn, _INSERT_SQL, (token_id, datetime.fromtimestamp(expires_at, UTC)))
+    await publish_async(conn, _message(token_id, expires_at))
+
+
+async def load_revocations(verifier: TokenVerifier) -> int:
+    """Apply the stored revocations to ``verifier``; returns how many are in force."""
+    async with get_async_pool().connection() as conn:
+        await execute(conn, "DELETE FROM revoked_tokens WHERE expires_at <= now()")
+        rows = await fetch_all(conn, "SELECT token_id, expires_at FROM revoked_tokens")
+        await conn.commit()
+    for token_id, expires_at in rows:
+        verifier.revoke(token_id, expires_at.timestamp())
+    return len(rows)
+
+
+def subscribe_revocations(bus: InvalidationBus, verifier: TokenVerifier) -> None:
+    """Apply revocations published by other workers to ``verifier``."""
+
+    def on_revoke(keys: list[str]) -> None:
+        for key in keys:
+            token_id, _, expires_at = key.partition(" ")
+            verifier.revoke(token_id, float(expires_at) if expires_at else None)
+
+    def on_reset() -> None:
+        # Revocations published while the bus was disconnected were missed.
+        task = asyncio.create_task(load_revocations(verifier))
+        _reload_tasks.add(task)
+        task.add_done_callback(_reload_tasks.discard)
+
+    bus.subscribe("token.revoke", on_revoke)
+    bus.on_reset(on_reset)
@@ -1,64 +1,157 @@
-import os
-from loguru import logger
-import sys
-import uvicorn
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Depends, HTTPException, Request, Form
-from fastapi.responses import RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI
+from loguru import logger
 from starlette.middleware.sessions import SessionMiddleware
-from contextlib import asynccontextmanager
-import subprocess
 
 {% if cookiecutter.database_url %}
-from db.connection import get_connection
+from db.async_pool import close_async_pool, get_async_pool, open_async_pool
+from db.pool import close_pool, get_pool, open_pool
+from db.routing import replicas
+from db.bus import bus
+from db.response_cache import PostgresCacheBackend, subscribe_response_cache
+from db.sessions import PostgresSessionBackend, subscribe_sessions
+from core.cache import response_cache
 {% endif %}
-from routers import root
+{% if cookiecutter.database_url %}from routers import export
+{% endif %}from routers import health, metrics as metrics_router, root
+from core import assets, metrics
+from core.admission import AdmissionMiddleware, admission
 from core.config import settings
+from core.log import RequestLogMiddleware, setup_logging
+from core.profiling import ProfilingMiddleware
+from core.sessions import ServerSessionMiddleware, session_store
+from core.static_files import StaticAssets
+from core.templates import warm_up
+from core.timing import ServerTimingMiddleware
+
+# Rarely used modules are imported where they are needed rather than here, so they don't
+# add to every worker's startup: the User-Agent parser behind its setting, and (with a
+# database) token revocation with jwt in the lifespan and db.streaming in the export route.
+setup_logging()
+if settings.user_agent_warmup_file:
+    from services import user_agent
+
+    # At import rather than in lifespan, so with APP_PRELOAD the workers share the result.
+    warmed = user_agent.parser.warm_up_from_file(settings.user_agent_warmup_file)
+    logger.debug(f"Warmed up {warmed} User-Agents")
 
-logger.remove()
-logger.add(
-    sys.stderr,
-    level=settings.log_level,
-    enqueue=True,
-    format=settings.log_format
-)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    try:
-        # Use standalone tailwind
-        "uvx --from pytailwindcss tailwindcss -i app/static/css/input.css -o app/static/css/tailwind.css --minify"
-        subprocess.run([
-            "uv",
-            "tool",
-            "run",
-            "--from",
-            "pytailwindcss",
-            "tailwindcss",
-            "-i",
-            "app/static/css/input.css",
-            "-o",
-            "app/static/css/tailwind.css",
-            "--minify"
-        ])
-    except Exception as e:
-        logger.error(f"Error running tailwindcss: {e}")
+    # Assets are built ahead of time by app/build_assets.py. With hot reload the unhashed
+    # sources are served instead, so `build_assets.py --watch` output shows up directly.
+    if not settings.app_hot_reload:
+        assets.load_manifest()
+        logger.debug(f"Warmed up {warm_up()} templates")
+{% if cookiecutter.database_url %}
+    open_pool()
+    await open_async_pool()
+    await replicas.open()
+    if settings.response_cache_backend == "postgres":
+        response_cache.backend = PostgresCacheBackend()
+    subscribe_response_cache(bus)
+    if settings.session_backend == "postgres":
+        session_store.backend = PostgresSessionBackend()
+        subscribe_sessions(bus, session_store)
+    from core.security import token_verifier
+    from db.tokens import load_revocations, subscribe_revocations
 
-    yield
+    subscribe_revocations(bus, token_verifier)
+    await bus.start()
+    await load_revocations(token_verifier)
+    if settings.session_backend != "cookie":
+        session_store.start_purging(settings.session_purge_interval)
+    pool_sampler = metrics.PoolSampler({
+        "sync": lambda: get_pool().stats(),
+        "async": lambda: get_async_pool().stats(),
+        **{f"replica {replica.name}": replica.pool.stats for replica in replicas.replicas},
+    })
+    pool_sampler.start()
+    try:
+        yield
+    finally:
+        await pool_sampler.stop()
+        await session_store.stop()
+        await bus.stop()
+        await replicas.close()
+        await close_async_pool()
+        close_pool()
+        metrics.mark_process_dead()
+{% else %}
+    if settings.session_backend != "cookie":
+        session_store.start_purging(settings.session_purge_interval)
+    try:
+        yield
+    finally:
+        await session_store.stop()
+        metrics.mark_process_dead()
+{% endif %}
 
 app = FastAPI(lifespan=lifespan, title="QuickMart POS", version="1.0.0")
-app.add_middleware(SessionMiddleware, secret_key=settings.secret_key)
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+if settings.session_backend == "cookie":
+    app.add_middleware(
+        SessionMiddleware,
+        secret_key=settings.secret_key,
+        session_cookie=settings.session_cookie,
+        max_age=settings.session_max_age,
+        https_only=settings.session_https_only,
+    )
+else:
+    app.add_middleware(
+        ServerSessionMiddleware,
+        store=session_store,
+        cookie_name=settings.session_cookie,
+        max_age=settings.session_max_age,
+        https_only=settings.session_https_only,
+    )
+if settings.admission_enabled:
+    # Outside the sessions, so a shed request never loads one.
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=admission,
+        bypass_paths=settings.admission_bypass_paths,
+        low_priority_paths=settings.admission_low_priority_paths,
+        retry_after=settings.admission_retry_after,
+    )
+if settings.profiling_token:
+    app.add_middleware(
+        ProfilingMiddleware,
+        token=settings.profiling_token,
+        interval=settings.profiling_interval,
+    )
+if settings.server_timing_enabled:
+    app.add_middleware(ServerTimingMiddleware)
+if settings.metrics_enabled:
+    # Added late so it wraps everything else and times the whole request.
+    app.add_middleware(metrics.MetricsMiddleware)
+# Outermost, so the request ID is set for everything that logs.
+app.add_middleware(
+    RequestLogMiddleware,
+    access_log=settings.log_access,
+    sample_rates=settings.log_sample_rates,
+)
+app.mount(
+    "/static",
+    StaticAssets("app/static", autorefresh=settings.app_hot_reload),
+    name="static",
+)
 
 app.include_router(root.router, tags=["root"])
+app.include_router(health.router)
+{% if cookiecutter.database_url %}app.include_router(export.router, tags=["export"])
+{% endif %}if settings.metrics_enabled:
+    app.include_router(metrics_router.router)
 
 if __name__ == "__main__":
+    import uvicorn
+
+    # Development entry point; production runs app/server.py (see the Dockerfile).
     uvicorn.run(
         "main:app",
         host=settings.app_host,
         port=settings.app_port,
-        workers=settings.app_workers,
-        reload=settings.app_hot_reload
+        reload=settings.app_hot_reload,
+        # Logging is set up by core.log.
+        log_config=None,
     )
@@ -0,0 +1,23 @@
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+router: APIRouter = APIRouter()
+
+# Name -> query for each export offered at /export/{name}. Only these queries can run here.
+EXPORTS: dict[str, str] = {
+    # "customers": "SELECT id, name, email, created_at FROM customers ORDER BY id",
+}
+
+
+@router.get("/export/{name}")
+async def export(name: str, format: Literal["csv", "ndjson", "html"] = "csv") -> StreamingResponse:
+    """Stream a registered export; ``format=html`` returns ``<tr>`` rows for HTMX."""
+    query = EXPORTS.get(name)
+    if query is None:
+        raise HTTPException(status_code=404, detail=f"No export named {name!r}")
+    from db.streaming import stream_response
+
+    filename = f"{name}.{format}" if format != "html" else None
+    return stream_response(query, output_format=format, filename=filename)
@@ -0,0 +1,29 @@
+{% if cookiecutter.database_url %}import psycopg
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from loguru import logger
+
+from db.async_pool import fetch_val, get_async_pool
+from db.pool import PoolTimeoutError
+{% else %}from fastapi import APIRouter
+{% endif %}
+router: APIRouter = APIRouter()
+
+
+@router.get("/health", include_in_schema=False)
+async def health() -> dict:
+    """Liveness: answers as long as the worker's event loop does."""
+    return {"status": "ok"}
+{% if cookiecutter.database_url %}
+
+@router.get("/health/db", include_in_schema=False, response_model=None)
+async def health_db() -> dict | JSONResponse:
+    """Readiness: a round trip through the async pool to the primary; 503 if it fails."""
+    try:
+        async with get_async_pool().connection() as conn:
+            await fetch_val(conn, "SELECT 1")
+    except (psycopg.Error, OSError, PoolTimeoutError) as e:
+        logger.warning(f"Database health check failed: {e}")
+        return JSONResponse({"status": "error"}, status_code=503)
+    return {"status": "ok"}
+{% endif %}
\ No newline at end of file
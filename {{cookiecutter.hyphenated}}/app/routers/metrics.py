@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from core.metrics import render_latest
+
+router: APIRouter = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    # Sync on purpose: aggregating the per-worker files reads from disk.
+    body, content_type = render_latest()
+    return Response(body, media_type=content_type)
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, Request
-from fastapi.templating import Jinja2Templates
 
+from core.cache import cached
+from core.templates import render
+from core.timing import TimedRoute
+
+router: APIRouter = APIRouter(route_class=TimedRoute)
 
-router: APIRouter = APIRouter()
-templates: Jinja2Templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/")
+@cached(ttl=60, vary=("HX-Request", "HX-Target"))
 def home_page(request: Request):
     context = {}
-    return templates.TemplateResponse(request, 'home/index.html', context=context)
\ No newline at end of file
+    return render(request, "home/index.html", context)
@@ -0,0 +1,250 @@
+"""Production server: a preforking supervisor around uvicorn workers.
+
+    python app/server.py
+
+- ``APP_WORKERS`` defaults to the CPUs this container may use (its cgroup CPU quota,
+  rounded up, or the CPU affinity when there is no quota).
+- The app is imported once in the supervisor before forking (``APP_PRELOAD``), so workers
+  share its memory copy-on-write and start instantly. Each worker still runs the app
+  ``lifespan`` itself, so connections are never shared between processes.
+- uvloop and httptools are used when they are installed.
+- ``APP_MAX_REQUESTS`` recycles a worker after that many requests (plus up to 10%
+  jitter so workers don't restart together), capping slow memory growth. Workers that die
+  are replaced.
+- On SIGTERM or SIGINT, workers stop accepting connections and finish the requests in
+  flight; any still running after ``APP_GRACEFUL_TIMEOUT`` seconds are killed.
+
+With ``APP_HOT_RELOAD`` it runs uvicorn's single-process reloader instead.
+"""
+
+import math
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+
+import uvicorn
+
+from core.config import settings
+
+# Seconds between checks on the workers.
+POLL_INTERVAL = 0.1
+# A worker exiting sooner than this after starting counts as a crash loop.
+MIN_WORKER_LIFETIME = 1.0
+MAX_RESPAWN_DELAY = 10.0
+
+
+def available_cpus() -> float:
+    """CPUs this process may use: the cgroup CPU quota if set, else the affinity mask."""
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+    quota = _cgroup_cpu_quota()
+    return min(cpus, quota) if quota else cpus
+
+
+def _cgroup_cpu_quota() -> float | None:
+    try:  # cgroup v2
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:  # cgroup v1
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def default_workers() -> int:
+    # The app is async, so one worker per CPU keeps every core busy.
+    return max(1, math.ceil(available_cpus()))
+
+
+def prepare_metrics_dir() -> None:
+    """Give the workers an empty ``PROMETHEUS_MULTIPROC_DIR`` to aggregate metrics in.
+
+    prometheus_client picks its storage when first imported, so this must run before
+    any app module is.
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+    else:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
+
+class Supervisor:
+    """Fork ``workers`` uvicorn servers sharing one listening socket and keep them running.
+
+    Parameters
+    ----------
+    config
+        uvicorn configuration for the workers.
+    workers
+        Number of worker processes.
+    preload
+        Import the app before forking.
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int, *, preload: bool = True) -> None:
+        self.config = config
+        self.workers = workers
+        self.preload = preload
+        self._children: dict[int, float] = {}  # pid -> start time
+        self._stopping = False
+        self._respawn_delay = 0.0
+
+    def run(self) -> None:
+        from loguru import logger
+
+        sock = self.config.bind_socket()
+        if self.preload:
+            self.config.load()
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        logger.info(
+            f"Starting {self.workers} workers on {self.config.host}:{self.config.port} "
+            f"(pid {os.getpid()}, preload={self.preload})"
+        )
+        for _ in range(self.workers):
+            self._spawn(sock)
+
+        while not self._stopping:
+            time.sleep(POLL_INTERVAL)
+            for pid, status in self._reap():
+                started = self._children.pop(pid)
+                if self._stopping:
+                    continue
+                code = os.waitstatus_to_exitcode(status)
+                if code == 0:
+                    logger.info(f"Worker {pid} recycled")
+                    self._respawn_delay = 0.0
+                else:
+                    logger.warning(f"Worker {pid} died with exit code {code}")
+                    if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                        self._respawn_delay = min(
+                            max(self._respawn_delay * 2, 0.1), MAX_RESPAWN_DELAY
+                        )
+                        time.sleep(self._respawn_delay)
+                self._spawn(sock)
+
+        logger.info("Shutting down workers")
+        self._shutdown()
+        sock.close()
+
+    def _spawn(self, sock: socket.socket) -> None:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = time.monotonic()
+            return
+        # Worker: uvicorn installs its own signal handlers for graceful shutdown.
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            uvicorn.Server(self.config).run(sockets=[sock])
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            # os._exit skips atexit handlers, so flush the log buffer here.
+            from core.log import shutdown_logging
+
+            shutdown_logging()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _reap(self) -> list[tuple[int, int]]:
+        exited = []
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self._children:
+                exited.append((pid, status))
+                _mark_worker_dead(pid)
+        return exited
+
+    def _shutdown(self) -> None:
+        for pid in self._children:
+            _signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + settings.app_graceful_timeout + 5
+        while self._children and time.monotonic() < deadline:
+            for pid, _ in self._reap():
+                self._children.pop(pid, None)
+            time.sleep(POLL_INTERVAL)
+        for pid in self._children:
+            _signal(pid, signal.SIGKILL)
+
+    def _handle_stop(self, signum: int, frame: object) -> None:
+        self._stopping = True
+
+
+def _signal(pid: int, signum: int) -> None:
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def _mark_worker_dead(pid: int) -> None:
+    # Drop the worker's live gauges; a worker that crashed didn't get to do it.
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
+
+
+def main() -> None:
+    if settings.app_hot_reload:
+        uvicorn.run(
+            "main:app",
+            host=settings.app_host,
+            port=settings.app_port,
+            reload=True,
+            log_config=None,
+        )
+        return
+
+    workers = settings.app_workers or default_workers()
+    # Workers read the resolved count, e.g. to split DB_MAX_CONNECTIONS between them.
+    settings.app_workers = workers
+    os.environ["APP_WORKERS"] = str(workers)
+    prepare_metrics_dir()
+
+    # Only now: app modules load prometheus_client, which checks the directory on import.
+    from core.log import setup_logging
+
+    setup_logging()
+    config = uvicorn.Config(
+        "main:app",
+        host=settings.app_host,
+        port=settings.app_port,
+        loop="auto",
+        http="auto",
+        log_config=None,
+        access_log=False,
+        limit_max_requests=settings.app_max_requests,
+        limit_max_requests_jitter=(settings.app_max_requests or 0) // 10,
+        timeout_graceful_shutdown=settings.app_graceful_timeout,
+    )
+    Supervisor(config, workers, preload=settings.app_preload).run()
+
+
+if __name__ == "__main__":
+    main()
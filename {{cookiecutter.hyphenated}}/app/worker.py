@@ -0,0 +1,269 @@
+"""Background job worker: runs the jobs queued with ``db.jobs.enqueue``.
+
+    python app/worker.py
+
+Runs next to the web server (see the ``worker`` service in ``docker-compose.yml``), in as
+many copies as needed; ``FOR UPDATE SKIP LOCKED`` gives every job to one of them.
+
+- Up to ``WORKER_CONCURRENCY`` jobs run at once, claimed ``WORKER_BATCH_SIZE`` at a time
+  from ``WORKER_QUEUES``. Jobs that finish while others are being deleted are deleted
+  together afterwards, in one transaction.
+- When the queues are empty the worker sleeps until a ``NOTIFY`` from ``enqueue`` or the
+  next scheduled job is due, with ``WORKER_POLL_INTERVAL`` as an upper bound.
+- Leases of running jobs are renewed; jobs of a worker that died are taken over once
+  their lease (``JOB_LEASE``) runs out.
+- While the database can't be reached the worker logs it and retries with backoff;
+  jobs it couldn't mark done or failed run again once their lease runs out.
+- On SIGTERM or SIGINT no more jobs are claimed, running ones get
+  ``APP_GRACEFUL_TIMEOUT`` seconds to finish, and the rest go back to the queue.
+"""
+
+import asyncio
+import functools
+import inspect
+import random
+import signal
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+import psycopg
+from loguru import logger
+
+from core.config import settings
+from db import jobs
+from db.async_pool import close_async_pool, get_async_pool, open_async_pool
+from db.bus import InvalidationBus
+from db.pool import PoolTimeoutError
+
+# Errors of a database that is down, restarting or out of connections: logged and retried.
+_DB_ERRORS = (psycopg.Error, OSError, PoolTimeoutError)
+
+
+class Worker:
+    """Claims jobs from ``queues`` and runs up to ``concurrency`` of them at once.
+
+    Parameters
+    ----------
+    queues
+        Queues to take jobs from.
+    concurrency
+        Jobs running at once.
+    batch_size
+        Jobs claimed per dequeue, at most the free slots.
+    processes
+        Size of the process pool for sync handlers; 0 runs them in threads.
+    poll_interval
+        Longest sleep between dequeues when no notification arrives.
+    lease
+        Seconds a claimed job stays locked to this worker; renewed while it runs.
+    """
+
+    def __init__(
+        self,
+        queues: list[str],
+        *,
+        concurrency: int = 16,
+        batch_size: int = 16,
+        processes: int = 0,
+        poll_interval: float = 30.0,
+        lease: float = 60.0,
+    ) -> None:
+        self.queues = queues
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.completed = 0
+        self.failed = 0
+        self._running: dict[asyncio.Task, jobs.Job] = {}
+        self._done: list[int] = []
+        self._flusher: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._executor: Executor | None = None
+
+    def stop(self) -> None:
+        """Stop claiming jobs; ``run`` returns once the running ones are done."""
+        self._stopping.set()
+        self._wake.set()
+
+    def wake(self, queues: list[str] | None = None) -> None:
+        """Dequeue now, e.g. on a notification that ``queues`` got jobs."""
+        if queues is None or any(queue in self.queues for queue in queues):
+            self._wake.set()
+
+    async def run(self, graceful_timeout: float = 30.0) -> None:
+        if self.processes:
+            # Not forked: the worker has a running event loop and open connections.
+            self._executor = ProcessPoolExecutor(
+                self.processes, mp_context=get_context("forkserver"), initializer=jobs.load_tasks
+            )
+        else:
+            self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="job")
+        renewer = asyncio.create_task(self._renew_leases(), name="jobs:renew")
+        try:
+            await self._loop()
+            if self._running:
+                logger.info(f"Waiting for {len(self._running)} running jobs")
+                await asyncio.wait(self._running, timeout=graceful_timeout)
+        finally:
+            renewer.cancel()
+            interrupted = [job.id for job in self._running.values()]
+            cancelled = list(self._running)
+            for running in cancelled:
+                running.cancel()
+            await asyncio.gather(*cancelled, return_exceptions=True)
+            if self._flusher is not None:
+                await self._flusher
+            if interrupted:
+                logger.warning(f"Returning {len(interrupted)} interrupted jobs to the queue")
+                try:
+                    async with get_async_pool().connection() as conn:
+                        await jobs.release(conn, interrupted)
+                except _DB_ERRORS as e:
+                    logger.warning(
+                        f"Could not return interrupted jobs: {e}; requeued when their lease ends"
+                    )
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _loop(self) -> None:
+        delay = 0.1
+        while not self._stopping.is_set():
+            free = self.concurrency - len(self._running)
+            if free <= 0:
+                stopping = asyncio.ensure_future(self._stopping.wait())
+                await asyncio.wait([*self._running, stopping], return_when=asyncio.FIRST_COMPLETED)
+                stopping.cancel()
+                continue
+            # Cleared before dequeueing, so a notification arriving meanwhile isn't lost.
+            self._wake.clear()
+            try:
+                claimed, sleep = await self._claim(min(free, self.batch_size))
+            except _DB_ERRORS as e:
+                logger.warning(f"Worker cannot dequeue: {e}; retrying in {delay:.1f}s")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay * random.uniform(0.5, 1.5))
+                except TimeoutError:
+                    pass
+                delay = min(delay * 2, self.poll_interval)
+                continue
+            delay = 0.1
+            for job in claimed:
+                running = asyncio.create_task(self._run_job(job), name=f"job:{job.id}")
+                self._running[running] = job
+                running.add_done_callback(self._running.pop)
+            if sleep > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), sleep)
+                except TimeoutError:
+                    pass
+
+    async def _claim(self, limit: int) -> tuple[list[jobs.Job], float]:
+        """Claim up to ``limit`` jobs, and how long to sleep if there weren't that many."""
+        async with get_async_pool().connection() as conn:
+            await jobs.recover_expired(conn)
+            claimed = await jobs.dequeue(conn, self.queues, limit, self.lease)
+            if len(claimed) == limit:
+                return claimed, 0.0
+            due = await jobs.seconds_until_due(conn, self.queues)
+        return claimed, self.poll_interval if due is None else min(due, self.poll_interval)
+
+    async def _run_job(self, job: jobs.Job) -> None:
+        handler = jobs.TASKS.get(job.task)
+        try:
+            if handler is None:
+                raise LookupError(f"no handler registered for task {job.task!r}")
+            if inspect.iscoroutinefunction(handler):
+                await handler(**job.args)
+            else:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(
+                    self._executor, functools.partial(jobs.run_task, job.task, job.args)
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            try:
+                async with get_async_pool().connection() as conn:
+                    retry = await jobs.fail(conn, job, "".join(traceback.format_exception(e)))
+            except _DB_ERRORS as db_error:
+                outcome = f"could not record it ({db_error}), retried once its lease runs out"
+            else:
+                outcome = "will retry" if retry else "giving up"
+            logger.opt(exception=e).warning(
+                f"Job {job.id} ({job.task}) failed on attempt {job.attempts}; {outcome}"
+            )
+            return
+        self._done.append(job.id)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._complete_done(), name="jobs:complete")
+
+    async def _complete_done(self) -> None:
+        while self._done:
+            job_ids, self._done = self._done, []
+            try:
+                async with get_async_pool().connection() as conn:
+                    await jobs.complete(conn, job_ids)
+            except _DB_ERRORS as e:
+                # Still running in the table: they are run again once their lease expires.
+                logger.warning(f"Could not mark {len(job_ids)} jobs done: {e}")
+                continue
+            self.completed += len(job_ids)
+
+    async def _renew_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not self._running:
+                continue
+            try:
+                async with get_async_pool().connection() as conn:
+                    await jobs.renew(conn, [job.id for job in self._running.values()], self.lease)
+            except _DB_ERRORS as e:
+                # Two more tries before the lease runs out.
+                logger.warning(f"Could not renew the lease of running jobs: {e}")
+
+
+async def serve() -> None:
+    handlers = jobs.load_tasks()
+    worker = Worker(
+        settings.worker_queues,
+        concurrency=settings.worker_concurrency,
+        batch_size=settings.worker_batch_size,
+        processes=settings.worker_processes,
+        poll_interval=settings.worker_poll_interval,
+        lease=settings.job_lease,
+    )
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, worker.stop)
+
+    await open_async_pool()
+    bus = InvalidationBus(settings.jobs_channel)
+    bus.subscribe(jobs.NAMESPACE, worker.wake)
+    # Notifications sent while disconnected are lost; look at the queues again.
+    bus.on_reset(worker.wake)
+    await bus.start()
+    logger.info(
+        f"Worker running {len(handlers)} tasks from queues {', '.join(worker.queues)}"
+        f" (concurrency {worker.concurrency})"
+    )
+    try:
+        await worker.run(graceful_timeout=settings.app_graceful_timeout)
+    finally:
+        await bus.stop()
+        await close_async_pool()
+    logger.info(f"Worker stopped: {worker.completed} jobs done, {worker.failed} failed")
+
+
+def main() -> None:
+    from core.log import setup_logging
+
+    setup_logging()
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""Benchmarks for the app. Run them from the project root, for example::
+
+    uv run --env-file .env.dev python -m bench.db_sync_vs_async
+
+Each module's docstring says what it measures and how to run it.
+"""
+
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+# Application modules import each other as top-level packages (``from core.config ...``).
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
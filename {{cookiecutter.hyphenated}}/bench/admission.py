@@ -0,0 +1,116 @@
+"""Latency under overload with and without admission control.
+
+    uv run --env-file .env.dev python -m bench.admission --overload 2 --duration 10
+
+An in-process app has a route backed by a resource that serves ``--capacity`` requests
+at a time, ``--service-ms`` each (a stand-in for a saturated database or threadpool),
+and a ``/health`` route. Requests for the route are sent open loop at ``--overload``
+times what the resource can serve, with one ``/health`` request in ten. Without
+admission control every request is accepted and waits its turn, so latency keeps
+growing for as long as the spike lasts; with ``core.admission`` the excess is answered
+with 503 straight away and the admitted requests stay fast. Latencies are of successful
+requests.
+"""
+
+import argparse
+import asyncio
+import collections
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from bench.common import print_table, summarize  # importing bench puts app/ on sys.path
+from core.admission import AdmissionController, AdmissionMiddleware
+
+
+def build_app(args: argparse.Namespace, admission: bool) -> tuple[FastAPI, AdmissionController]:
+    app = FastAPI()
+    backend = asyncio.Semaphore(args.capacity)
+
+    @app.get("/work")
+    async def work() -> PlainTextResponse:
+        async with backend:
+            await asyncio.sleep(args.service_ms / 1000)
+        return PlainTextResponse("ok")
+
+    @app.get("/health")
+    async def health() -> PlainTextResponse:
+        return PlainTextResponse("ok")
+
+    controller = AdmissionController(
+        initial_limit=args.capacity * 4,
+        min_limit=1,
+        max_limit=args.capacity * 16,
+        latency_target=args.latency_target,
+        queue_size=args.queue_size,
+        queue_timeout=args.queue_timeout,
+    )
+    if admission:
+        app.add_middleware(AdmissionMiddleware, controller=controller, bypass_paths=["/health"])
+    return app, controller
+
+
+async def measure(args: argparse.Namespace, admission: bool) -> list[dict]:
+    app, controller = build_app(args, admission)
+    # Nine in ten requests go to /work.
+    rps = args.capacity * 1000 / args.service_ms * args.overload * 10 / 9
+    latencies: dict[str, list[float]] = collections.defaultdict(list)
+    statuses: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+    loop = asyncio.get_running_loop()
+
+    async def send(client: httpx.AsyncClient, path: str, scheduled: float) -> None:
+        response = await client.get(path)
+        statuses[path][response.status_code] += 1
+        if response.status_code == 200:
+            latencies[path].append(loop.time() - scheduled)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tasks = []
+        start = loop.time()
+        for i in range(round(rps * args.duration)):
+            scheduled = start + i / rps
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            path = "/health" if i % 10 == 0 else "/work"
+            tasks.append(asyncio.create_task(send(client, path, scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+
+    rows = []
+    for path in ("/work", "/health"):
+        summary = summarize(latencies[path], elapsed)
+        rows.append({
+            "admission": admission,
+            "path": path,
+            "ok": statuses[path][200],
+            "shed": statuses[path][503],
+            "ok_rps": summary["rps"],
+            "p50_ms": summary["p50_ms"],
+            "p99_ms": summary["p99_ms"],
+            "limit": int(controller.limit) if admission else None,
+        })
+    return rows
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--service-ms", type=float, default=25)
+    parser.add_argument("--overload", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--latency-target", type=float, default=0.1)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--queue-timeout", type=float, default=0.5)
+    args = parser.parse_args()
+
+    rows = []
+    for admission in (False, True):
+        rows += await measure(args, admission)
+    print_table(rows, ["admission", "path", "ok", "shed", "ok_rps", "p50_ms", "p99_ms", "limit"])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
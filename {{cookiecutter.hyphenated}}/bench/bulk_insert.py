@@ -0,0 +1,119 @@
+"""Row-by-row INSERT vs batched ``insert_values`` vs ``copy_rows``.
+
+    uv run --env-file .env.dev python -m bench.bulk_insert --rows 10000 100000 1000000
+    uv run --extra tests python -m bench.bulk_insert --testcontainer
+
+Loads ``--rows`` generated rows into an unlogged scratch table with each method, in one
+transaction each, and reports rows per second. ``--testcontainer`` runs against a
+throwaway ``postgres:16-alpine`` container (as ``tests/conftest.py`` does) instead of
+``DATABASE_URL``. Row-by-row at a million rows takes a while; leave it out with
+``--methods batched copy``.
+"""
+
+import argparse
+import time
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
+
+import psycopg2
+from psycopg2.extensions import connection
+
+from bench.common import print_table  # importing bench puts app/ on sys.path
+from db.bulk import copy_rows, insert_values
+from db.connection import get_connection
+
+TABLE = "bench_bulk_insert"
+COLUMNS = ("id", "user_id", "kind", "payload", "created_at")
+_EPOCH = datetime(2026, 1, 1, tzinfo=UTC)
+
+
+def generate(count: int) -> Iterator[tuple]:
+    for i in range(count):
+        kind = ("view", "click", "buy")[i % 3]
+        yield (i, i % 5000, kind, f"item-{i}", _EPOCH + timedelta(seconds=i))
+
+
+def row_by_row(conn: connection, rows: Iterator[tuple], page_size: int) -> None:
+    with conn.cursor() as cur:
+        for row in rows:
+            cur.execute(
+                f"INSERT INTO {TABLE} (id, user_id, kind, payload, created_at)"
+                " VALUES (%s, %s, %s, %s, %s)",
+                row,
+            )
+
+
+def batched(conn: connection, rows: Iterator[tuple], page_size: int) -> None:
+    insert_values(conn, TABLE, COLUMNS, rows, page_size=page_size)
+
+
+def copy(conn: connection, rows: Iterator[tuple], page_size: int) -> None:
+    copy_rows(conn, TABLE, COLUMNS, rows)
+
+
+METHODS = {"row_by_row": row_by_row, "batched": batched, "copy": copy}
+
+
+def measure(conn: connection, method: str, count: int, page_size: int) -> dict:
+    with conn.cursor() as cur:
+        cur.execute(f"TRUNCATE {TABLE}")
+    conn.commit()
+    start = time.perf_counter()
+    METHODS[method](conn, generate(count), page_size)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    return {"method": method, "rows": count, "seconds": elapsed, "rows_per_s": count / elapsed}
+
+
+def run(conn: connection, args: argparse.Namespace) -> list[dict]:
+    with conn.cursor() as cur:
+        cur.execute(
+            f"CREATE UNLOGGED TABLE IF NOT EXISTS {TABLE} (id bigint PRIMARY KEY,"
+            " user_id int NOT NULL, kind text NOT NULL, payload text, created_at timestamptz)"
+        )
+    conn.commit()
+    rows = []
+    try:
+        for count in args.rows:
+            results = [measure(conn, method, count, args.page_size) for method in args.methods]
+            slowest = max(result["seconds"] for result in results)
+            for result in results:
+                result["speedup"] = slowest / result["seconds"]
+            rows.extend(results)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        conn.commit()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--methods", nargs="+", default=list(METHODS), choices=list(METHODS))
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--testcontainer", action="store_true")
+    args = parser.parse_args()
+
+    if args.testcontainer:
+        from testcontainers.postgres import PostgresContainer
+
+        with PostgresContainer("postgres:16-alpine") as postgres:
+            url = postgres.get_connection_url().replace("postgresql+psycopg2://", "postgresql://")
+            conn = psycopg2.connect(url)
+            try:
+                rows = run(conn, args)
+            finally:
+                conn.close()
+    else:
+        conn = get_connection()
+        try:
+            rows = run(conn, args)
+        finally:
+            conn.close()
+
+    print_table(rows, ["method", "rows", "seconds", "rows_per_s", "speedup"])
+
+
+if __name__ == "__main__":
+    main()
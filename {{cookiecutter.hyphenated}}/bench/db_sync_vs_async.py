@@ -0,0 +1,107 @@
+"""Sync-in-threadpool vs native async database access under concurrency.
+
+Runs the same query through a ``def`` route using ``db.pool.get_db`` and an ``async def``
+route using ``db.async_pool.get_async_db``, driving each with N concurrent clients::
+
+    uv run --env-file .env.dev python -m bench.db_sync_vs_async --concurrency 10 100 500
+
+Both pools hold ``--pool-size`` connections (default 20) whatever the concurrency, as a
+deployment with a connection budget would, so the only difference between the two runs is
+how the route waits on the database. Requests that fail, e.g. with ``PoolTimeoutError``,
+are counted as errors.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Annotated
+
+import httpx
+import psycopg
+from fastapi import Depends, FastAPI
+from psycopg2.extensions import connection
+
+from bench.common import print_table, summarize  # importing bench puts app/ on sys.path
+from db import async_pool, pool
+from db.connection import get_async_connection, get_connection
+
+QUERY = "SELECT pg_sleep(%s), 1"
+
+
+def build_app(sleep: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/sync")
+    def sync_route(conn: Annotated[connection, Depends(pool.get_db)]) -> dict:
+        with conn.cursor() as cur:
+            cur.execute(QUERY, (sleep,))
+            return {"value": cur.fetchone()[1]}
+
+    @app.get("/async")
+    async def async_route(
+        conn: Annotated[psycopg.AsyncConnection, Depends(async_pool.get_async_db)],
+    ) -> dict:
+        row = await async_pool.fetch_one(conn, QUERY, (sleep,))
+        return {"value": row[1]}
+
+    return app
+
+
+async def drive(app: FastAPI, path: str, concurrency: int, requests: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker() -> None:
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {**summarize(latencies, elapsed), "errors": errors}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--sleep", type=float, default=0.005, help="pg_sleep seconds")
+    parser.add_argument("--pool-size", type=int, default=20)
+    args = parser.parse_args()
+
+    app = build_app(args.sleep)
+    rows = []
+    for concurrency in args.concurrency:
+        pool._pool = pool.ConnectionPool(get_connection, min_size=0, max_size=args.pool_size)
+        pool._pool.open()
+        async_pool._pool = async_pool.AsyncConnectionPool(
+            get_async_connection, min_size=0, max_size=args.pool_size
+        )
+        await async_pool._pool.open()
+        try:
+            for mode in ("sync", "async"):
+                result = await drive(app, f"/{mode}", concurrency, args.requests)
+                rows.append({"mode": mode, "concurrency": concurrency, **result})
+        finally:
+            pool.close_pool()
+            await async_pool.close_async_pool()
+
+    print_table(rows, ["mode", "concurrency", "rps", "p50_ms", "p95_ms", "p99_ms", "errors"])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
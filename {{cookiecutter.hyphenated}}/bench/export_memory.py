@@ -0,0 +1,135 @@
+"""Worker memory while streaming a large export, with a pass/fail limit.
+
+    uv run --env-file .env.dev python -m bench.export_memory --rows 2000000
+    uv run --env-file .env.dev python -m bench.export_memory --rows 200000 --fetchall
+
+Streams ``--rows`` generated rows through ``db.streaming.stream_response`` in-process and
+samples the resident set size (Linux ``/proc``) while the body is sent. Exits with status
+1 when it grows by more than ``--max-growth-mib``, so it can gate CI. ``--fetchall`` also
+runs the same export built with ``fetchall()`` for comparison (not gated; keep ``--rows``
+modest, it holds everything in memory).
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from bench.common import print_table  # importing bench puts app/ on sys.path
+from db import async_pool
+from db.streaming import FORMATS, encode_csv, stream_response
+
+QUERY = (
+    "SELECT g AS id, md5(g::text) AS name, now() - g * interval '1 second' AS created_at"
+    " FROM generate_series(1, %s) AS g"
+)
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_mib() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE / 2**20
+
+
+def build_app(rows: int, fetch_size: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/stream/{output_format}")
+    async def stream(output_format: str) -> Response:
+        return stream_response(QUERY, (rows,), output_format=output_format, fetch_size=fetch_size)
+
+    @app.get("/fetchall")
+    async def fetchall() -> Response:
+        async with async_pool.get_async_pool().connection() as conn:
+            result = await async_pool.fetch_all(conn, QUERY, (rows,))
+        body = encode_csv(["id", "name", "created_at"], result)
+        return Response(body, media_type="text/csv")
+
+    return app
+
+
+async def export(app: FastAPI, path: str) -> dict:
+    gc.collect()
+    before = rss_mib()
+    peak = before
+    sent = 0
+    chunks = 0
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+
+    async def receive() -> dict:
+        # Starlette waits on this for a disconnect while streaming; never send one.
+        await asyncio.Event().wait()
+        return {}
+
+    async def send(message: dict) -> None:
+        nonlocal peak, sent, chunks
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+            chunks += 1
+            if chunks % 10 == 0:
+                peak = max(peak, rss_mib())
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    peak = max(peak, rss_mib())
+    return {
+        "seconds": time.perf_counter() - start,
+        "sent_mib": sent / 2**20,
+        "chunks": chunks,
+        "rss_before_mib": before,
+        "rss_peak_mib": peak,
+        "growth_mib": peak - before,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--fetch-size", type=int, default=2000)
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=list(FORMATS))
+    parser.add_argument("--max-growth-mib", type=float, default=64.0)
+    parser.add_argument("--fetchall", action="store_true")
+    args = parser.parse_args()
+
+    app = build_app(args.rows, args.fetch_size)
+    await async_pool.open_async_pool()
+    rows = []
+    try:
+        for output_format in args.formats:
+            rows.append({"export": output_format, **await export(app, f"/stream/{output_format}")})
+        if args.fetchall:
+            rows.append({"export": "csv (fetchall)", **await export(app, "/fetchall")})
+    finally:
+        await async_pool.close_async_pool()
+
+    print(f"{args.rows} rows, fetch size {args.fetch_size}")
+    columns = ["export", "seconds", "sent_mib", "chunks"]
+    print_table(rows, [*columns, "rss_before_mib", "rss_peak_mib", "growth_mib"])
+    streamed = [row for row in rows if row["export"] in FORMATS]
+    worst = max(row["growth_mib"] for row in streamed)
+    if worst > args.max_growth_mib:
+        print(f"Memory grew by {worst:.1f} MiB while streaming (limit {args.max_growth_mib} MiB)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
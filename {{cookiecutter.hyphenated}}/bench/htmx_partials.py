@@ -0,0 +1,56 @@
+"""Full page vs HTMX partial renders: response bytes and latency.
+
+    uv run --env-file .env.dev python -m bench.htmx_partials --path / --requests 2000
+
+Requests go through the whole ASGI app in-process, once as a normal navigation and once
+with the ``HX-Request`` header so ``core.templates.render`` returns only the block.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from bench.common import print_table, summarize
+
+MODES = {
+    "full": {},
+    "partial": {"HX-Request": "true", "HX-Target": "main_content"},
+}
+
+
+async def measure(client: httpx.AsyncClient, path: str, headers: dict, requests: int) -> dict:
+    latencies = []
+    size = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - t0)
+        response.raise_for_status()
+        size = len(response.content)
+    return {**summarize(latencies, time.perf_counter() - start), "bytes": size}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    from main import app
+
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for headers in MODES.values():
+            await measure(client, args.path, headers, 50)  # warm up
+        for mode, headers in MODES.items():
+            rows.append({"mode": mode, **await measure(client, args.path, headers, args.requests)})
+
+    print_table(rows, ["mode", "bytes", "rps", "mean_ms", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Fail when importing the app takes longer than a budget.
+
+    uv run --env-file .env.prod python -m bench.import_budget --budget-ms 1000
+
+Every worker imports ``main`` before it can serve (all of them at once without
+``APP_PRELOAD``), so import time is cold-start time. This runs
+``python -X importtime -c "import main"`` in fresh interpreters, keeps the fastest run,
+prints the top-level packages that took longest and exits with status 1 if the total is
+over budget, so it can gate CI. The budget defaults to ``IMPORT_BUDGET_MS``, else 1500;
+``tests/test_import_budget.py`` checks it as part of the test suite.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from bench.common import print_table
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET_MS = 1500.0
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """``{module: (self us, cumulative us)}`` for one import of ``module``."""
+    env = {**os.environ, "PYTHONPATH": str(ROOT / "app")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def by_package(times: dict[str, tuple[int, int]]) -> dict[str, int]:
+    """Self time summed per top-level package, in microseconds."""
+    totals: dict[str, int] = defaultdict(int)
+    for name, (self_us, _) in times.items():
+        totals[name.partition(".")[0]] += self_us
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.environ.get("IMPORT_BUDGET_MS", DEFAULT_BUDGET_MS)),
+    )
+    parser.add_argument("--runs", type=int, default=5, help="keep the fastest of this many")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # The first run may be compiling bytecode; it doesn't count.
+    import_times(args.module)
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda times: times[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    packages = sorted(by_package(best).items(), key=lambda item: item[1], reverse=True)
+    print_table(
+        [{"package": name, "self_ms": us / 1000} for name, us in packages[: args.top]],
+        ["package", "self_ms"],
+    )
+    print(f"\nimport {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if total_ms > args.budget_ms:
+        print("Over budget: import heavy modules lazily where they are used.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Job queue throughput: enqueueing, draining per batch size, and wake-up latency.
+
+    uv run --env-file .env.dev python -m bench.job_queue --jobs 5000 --batch-sizes 1 16 64
+
+Needs the ``jobs`` table (``dbmate up``); only jobs on the ``bench`` queue are touched.
+
+- enqueue: ``--jobs`` jobs with ``db.jobs.enqueue``, committing after each one and in a
+  single transaction.
+- drain: ``--jobs`` queued no-op jobs run by an in-process ``Worker`` for every batch
+  size, with an async and a sync (thread) handler; jobs per second include claiming and
+  deleting them.
+- wake: an idle worker is woken through ``NOTIFY`` rather than by polling; latency is
+  from the enqueueing commit to the handler starting, over ``--wakeups`` jobs.
+"""
+
+import argparse
+import asyncio
+import time
+
+from bench.common import percentile, print_table  # importing bench puts app/ on sys.path
+from core.config import settings
+from db import jobs
+from db.async_pool import close_async_pool, execute, get_async_pool, open_async_pool
+from db.bus import InvalidationBus
+from db.connection import get_connection
+from worker import Worker
+
+QUEUE = "bench"
+_started: list[float] = []
+
+
+@jobs.task("bench.noop")
+async def noop(i: int = 0) -> None:
+    pass
+
+
+@jobs.task("bench.noop_sync")
+def noop_sync(i: int = 0) -> None:
+    pass
+
+
+@jobs.task("bench.timed")
+async def timed(i: int = 0) -> None:
+    _started.append(time.perf_counter())
+
+
+async def clear() -> None:
+    async with get_async_pool().connection() as conn:
+        await execute(conn, "DELETE FROM jobs WHERE queue = %s", (QUEUE,))
+        await conn.commit()
+
+
+async def measure_enqueue(count: int) -> list[dict]:
+    rows = []
+    conn = get_connection()
+    try:
+        for mode in ("commit_each", "one_transaction"):
+            await clear()
+            start = time.perf_counter()
+            for i in range(count):
+                jobs.enqueue(conn, "bench.noop", {"i": i}, queue=QUEUE)
+                if mode == "commit_each":
+                    conn.commit()
+            conn.commit()
+            elapsed = time.perf_counter() - start
+            rows.append({"mode": mode, "jobs": count, "jobs_per_s": count / elapsed})
+    finally:
+        conn.close()
+    return rows
+
+
+async def measure_drain(task: str, count: int, batch_size: int, concurrency: int) -> dict:
+    await clear()
+    conn = get_connection()
+    try:
+        for i in range(count):
+            jobs.enqueue(conn, task, {"i": i}, queue=QUEUE)
+        conn.commit()
+    finally:
+        conn.close()
+
+    worker = Worker([QUEUE], concurrency=concurrency, batch_size=batch_size)
+    start = time.perf_counter()
+    runner = asyncio.create_task(worker.run())
+    while worker.completed + worker.failed < count:
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - start
+    worker.stop()
+    await runner
+    return {
+        "task": task,
+        "batch_size": batch_size,
+        "jobs": count,
+        "failed": worker.failed,
+        "seconds": elapsed,
+        "jobs_per_s": count / elapsed,
+    }
+
+
+async def measure_wake(count: int) -> dict:
+    await clear()
+    worker = Worker([QUEUE], poll_interval=30.0)
+    bus = InvalidationBus(settings.jobs_channel)
+    bus.subscribe(jobs.NAMESPACE, worker.wake)
+    await bus.start()
+    runner = asyncio.create_task(worker.run())
+    latencies = []
+    try:
+        for i in range(count):
+            # Let the worker go idle, so only the notification can wake it up.
+            await asyncio.sleep(0.05)
+            _started.clear()
+            async with get_async_pool().connection() as conn:
+                await jobs.enqueue_async(conn, "bench.timed", {"i": i}, queue=QUEUE)
+                await conn.commit()
+                committed = time.perf_counter()
+            while not _started:
+                await asyncio.sleep(0.0005)
+            latencies.append(_started[0] - committed)
+    finally:
+        worker.stop()
+        await runner
+        await bus.stop()
+    return {
+        "wakeups": count,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=5000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--wakeups", type=int, default=50)
+    args = parser.parse_args()
+
+    await open_async_pool()
+    try:
+        print_table(await measure_enqueue(args.jobs), ["mode", "jobs", "jobs_per_s"])
+        print()
+        rows = [
+            await measure_drain(task, args.jobs, batch_size, args.concurrency)
+            for task in ("bench.noop", "bench.noop_sync")
+            for batch_size in args.batch_sizes
+        ]
+        print_table(rows, ["task", "batch_size", "jobs", "failed", "seconds", "jobs_per_s"])
+        print()
+        print_table([await measure_wake(args.wakeups)], ["wakeups", "p50_ms", "p99_ms", "max_ms"])
+    finally:
+        await clear()
+        await close_async_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,296 @@
+"""HTTP load test of the app's main routes, with regression gates against a baseline.
+
+    uv run --env-file .env.prod python -m bench.load --rps 200 --duration 10 --save-baseline
+    uv run --env-file .env.prod python -m bench.load --rps 200 --duration 10
+    uv run --env-file .env.dev python -m bench.load --in-process --scenario page partial
+    uv run --env-file .env.prod load-test --rps 200 --duration 10
+
+The last form is the ``load-test`` script from ``pyproject.toml``, for CI; run it from the
+project root like the others.
+
+Starts ``app/server.py`` on a free port with ``--workers`` workers, or with
+``--in-process`` drives ``main.app`` through ASGI in this process (no HTTP parsing, and
+RSS is this process's). Each scenario gets ``--rps`` requests per second for
+``--duration`` seconds from an async client. Requests leave on schedule whether or not
+earlier ones have finished (up to ``--concurrency`` in flight) and latency counts from
+the scheduled time, so a server that falls behind shows it in the percentiles rather
+than by being sent fewer requests.
+
+Per scenario it records p50/p95/p99 latency, throughput, errors and the largest worker
+RSS, writes them as JSON to ``--output`` and compares them with ``--baseline``: latency
+or RSS more than ``--tolerance`` above the baseline (and latency at least ``--slack-ms``
+above it), throughput more than ``--tolerance`` below it, or an error rate above
+``--max-error-rate`` is a regression, and the exit status is 1. ``--save-baseline``
+stores the results as the new baseline. Record the baseline on the machine that runs the
+comparison; numbers from another machine mean little.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import time
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+
+from bench.common import print_table, summarize  # importing bench puts app/ on sys.path
+from bench.startup import SERVER, children, free_port, memory_mib, wait_until_ready
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_TOLERANCE = 0.25
+
+# Metric -> 1 if a higher value is worse, -1 if a lower one is.
+GATED_METRICS = {"p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "rps": -1, "worker_rss_mib": 1}
+
+# Results are only comparable with a baseline run the same way.
+COMPARABLE_META = ("mode", "workers", "rps", "duration", "concurrency")
+
+
+@dataclass(frozen=True)
+class Scenario:
+    path: str
+    headers: Mapping[str, str] = field(default_factory=dict)
+
+
+SCENARIOS = {
+    # Middleware stack and routing only
+    "health": Scenario("/health"),
+    "static": Scenario("/static/css/input.css"),
+    "page": Scenario("/"),
+    "partial": Scenario("/", {"HX-Request": "true", "HX-Target": "main_content"}),
+{% if cookiecutter.database_url %}    # Async pool checkout and a round trip to Postgres
+    "db": Scenario("/health/db"),
+{% endif %}}
+
+
+class RssSampler:
+    """Tracks the largest RSS of the given processes while the load runs."""
+
+    def __init__(self, pids: Callable[[], list[int]], interval: float = 0.25) -> None:
+        self.pids = pids
+        self.interval = interval
+        self.peak = 0.0
+
+    def sample(self) -> None:
+        for pid in self.pids():
+            try:
+                self.peak = max(self.peak, memory_mib(pid)["rss_mib"])
+            except OSError:
+                pass  # a worker restarting
+
+    async def run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    args: argparse.Namespace,
+    rss: RssSampler,
+) -> dict:
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def send(scheduled: float) -> None:
+        nonlocal errors
+        async with in_flight:
+            try:
+                response = await client.get(scenario.path, headers=dict(scenario.headers))
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+        if failed:
+            errors += 1
+        else:
+            latencies.append(loop.time() - scheduled)
+
+    for _ in range(args.warmup):
+        await client.get(scenario.path, headers=dict(scenario.headers))
+
+    rss.peak = 0.0
+    sampler = asyncio.create_task(rss.run())
+    total = round(args.rps * args.duration)
+    start = loop.time()
+    tasks = []
+    for i in range(total):
+        scheduled = start + i / args.rps
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(scheduled)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+    sampler.cancel()
+    rss.sample()
+
+    return {
+        **summarize(latencies, elapsed),
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "worker_rss_mib": rss.peak,
+    }
+
+
+async def run_all(
+    args: argparse.Namespace,
+    base_url: str,
+    transport: httpx.AsyncBaseTransport | None,
+    pids: Callable[[], list[int]],
+) -> dict:
+    rss = RssSampler(pids)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(
+        transport=transport, base_url=base_url, limits=limits, timeout=args.timeout
+    ) as client:
+        for name in args.scenario:
+            results[name] = await run_scenario(client, SCENARIOS[name], args, rss)
+    return results
+
+
+async def in_process(args: argparse.Namespace) -> dict:
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        return await run_all(args, "http://bench", transport, lambda: [os.getpid()])
+
+
+def on_server(args: argparse.Namespace) -> dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "APP_HOST": "127.0.0.1",
+        "APP_PORT": str(port),
+        "APP_WORKERS": str(args.workers),
+        "APP_HOT_RELOAD": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+    process = subprocess.Popen([sys.executable, str(SERVER)], env=env)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_ready(f"{base_url}/health", args.timeout)
+        time.sleep(1)  # let every worker finish its lifespan startup
+        return asyncio.run(run_all(args, base_url, None, lambda: children(process.pid)))
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+
+def compare(current: dict, baseline: dict, args: argparse.Namespace) -> list[dict]:
+    """One row per gated metric and scenario; ``result`` is ``"REGRESSED"`` for failures."""
+    rows = []
+    for name, metrics in current["scenarios"].items():
+        rows.append({
+            "scenario": name,
+            "metric": "error_rate",
+            "current": metrics["error_rate"],
+            "limit": args.max_error_rate,
+            "result": "ok" if metrics["error_rate"] <= args.max_error_rate else "REGRESSED",
+        })
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        for metric, direction in GATED_METRICS.items():
+            limit = before[metric] * (1 + direction * args.tolerance)
+            if metric.endswith("_ms"):
+                limit = max(limit, before[metric] + args.slack_ms)
+            regressed = (metrics[metric] - limit) * direction > 0
+            change = metrics[metric] / before[metric] - 1 if before[metric] else 0.0
+            rows.append({
+                "scenario": name,
+                "metric": metric,
+                "baseline": before[metric],
+                "current": metrics[metric],
+                "change": f"{change * 100:+.0f}%",
+                "limit": limit,
+                "result": "REGRESSED" if regressed else "ok",
+            })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--in-process", action="store_true")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--rps", type=float, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=50, help="requests before measuring")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output", type=Path, help="write the results here as JSON")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=float(os.environ.get("LOAD_TOLERANCE", DEFAULT_TOLERANCE)),
+        help="allowed relative change (default LOAD_TOLERANCE, else 0.25)",
+    )
+    parser.add_argument("--slack-ms", type=float, default=1.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.in_process:
+        scenarios = asyncio.run(in_process(args))
+    else:
+        scenarios = on_server(args)
+    results = {
+        "meta": {
+            "mode": "in-process" if args.in_process else "server",
+            "workers": None if args.in_process else args.workers,
+            "rps": args.rps,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "machine": platform.node(),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "scenarios": scenarios,
+    }
+
+    print_table(
+        [{"scenario": name, **metrics} for name, metrics in scenarios.items()],
+        ["scenario", "requests", "rps", "p50_ms", "p95_ms", "p99_ms", "errors", "worker_rss_mib"],
+    )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nSaved baseline to {args.baseline}")
+        return
+
+    baseline = None
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        meta = baseline["meta"]
+        differs = [key for key in COMPARABLE_META if meta.get(key) != results["meta"][key]]
+        if differs:
+            sys.exit(
+                f"\n{args.baseline} was recorded with different {', '.join(differs)};"
+                " rerun with the same options or --save-baseline"
+            )
+    else:
+        print(f"\nNo baseline at {args.baseline}; only the error rate is checked")
+
+    rows = compare(results, baseline or {"scenarios": {}}, args)
+    print()
+    print_table(rows, ["scenario", "metric", "baseline", "current", "change", "limit", "result"])
+    if any(row["result"] != "ok" for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
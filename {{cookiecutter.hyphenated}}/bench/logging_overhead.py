@@ -0,0 +1,86 @@
+"""Logging cost per request: the old enqueue=True setup vs batched JSON lines.
+
+    uv run --env-file .env.dev python -m bench.logging_overhead --requests 20000
+
+Each request goes through ``RequestLogMiddleware`` (one access record) and a handler that
+logs one more record, with output going to ``os.devnull``. The time measured is what the
+request itself pays; the writing happens on other threads or processes in both setups.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from loguru import logger
+
+from bench.common import print_table, summarize
+from bench.metrics_overhead import call
+from core.config import settings
+from core.log import BatchedWriter, RequestLogMiddleware, json_line, setup_logging
+
+
+def build_app(sample_rates: dict[str, float] | None = None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    async def index() -> PlainTextResponse:
+        logger.info("rendering index")
+        return PlainTextResponse("ok")
+
+    app.add_middleware(RequestLogMiddleware, sample_rates=sample_rates)
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        await call(app, "/")
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_logging()  # request IDs and stdlib interception, as in the app
+    devnull = open(os.devnull, "w")  # noqa: SIM115
+    rows = []
+
+    logger.remove()
+    rows.append({"setup": "no logging", **await measure(build_app(), args.requests)})
+
+    logger.add(devnull, level="INFO", enqueue=True, colorize=True, format=settings.log_format)
+    rows.append({"setup": "enqueue=True, text", **await measure(build_app(), args.requests)})
+    logger.remove()  # waits for the queue to drain
+
+    for name, sample_rates in (
+        ("batched JSON", None),
+        ("batched JSON, INFO 10%", {"INFO": 0.1}),
+    ):
+        writer = BatchedWriter(devnull)
+        logger.add(
+            lambda m, writer=writer: writer.write(json_line(m.record)),
+            level="INFO",
+            format="{message}",
+        )
+        result = await measure(build_app(sample_rates), args.requests)
+        logger.remove()
+        writer.close()
+        counts = {"written": writer.written, "dropped": writer.dropped}
+        rows.append({"setup": name, **result, **counts})
+
+    base = rows[0]["mean_ms"]
+    for row in rows[1:]:
+        row["overhead_us"] = (row["mean_ms"] - base) * 1000
+    print_table(rows, ["setup", "rps", "mean_ms", "p99_ms", "overhead_us", "written", "dropped"])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""Per-request cost of ``MetricsMiddleware``.
+
+    uv run --env-file .env.dev python -m bench.metrics_overhead --requests 20000
+    PROMETHEUS_MULTIPROC_DIR=$(mktemp -d) uv run --env-file .env.dev \
+        python -m bench.metrics_overhead
+
+The same small app is driven through raw ASGI calls, so HTTP client overhead doesn't hide
+the difference, once without and once with the middleware. The second form measures the
+multi-worker mode, where samples go to memory-mapped files.
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from bench.common import print_table, summarize
+from core.metrics import MetricsMiddleware, multiprocess_enabled
+
+
+def build_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    async def index() -> PlainTextResponse:
+        return PlainTextResponse("ok")
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int) -> PlainTextResponse:
+        return PlainTextResponse(str(item_id))
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def call(app: FastAPI, path: str) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict) -> None:
+        pass
+
+    await app(scope, receive, send)
+
+
+async def measure(app: FastAPI, requests: int) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        await call(app, f"/items/{i % 100}" if i % 2 else "/")
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    apps = {"baseline": build_app(False), "metrics": build_app(True)}
+    for app in apps.values():
+        await measure(app, 500)  # warm up
+
+    # Alternate between the apps and keep each one's best round, to filter out noise.
+    best: dict[str, dict] = {}
+    for _ in range(args.rounds):
+        for name, app in apps.items():
+            result = await measure(app, args.requests // args.rounds)
+            if name not in best or result["mean_ms"] < best[name]["mean_ms"]:
+                best[name] = result
+    rows = [{"app": name, **result} for name, result in best.items()]
+    overhead = (rows[1]["mean_ms"] - rows[0]["mean_ms"]) * 1000
+    rows[1]["overhead_us"] = overhead
+
+    print(f"multiprocess mode: {multiprocess_enabled()}")
+    print_table(rows, ["app", "rps", "mean_ms", "p50_ms", "p99_ms", "overhead_us"])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+"""OFFSET vs keyset pagination latency at increasing page depth.
+
+    uv run --env-file .env.dev python -m bench.pagination --pages 1 100 10000
+
+Fills an unlogged scratch table with ``--rows`` rows indexed on ``(created_at, id)`` and
+times fetching one page at each depth with ``LIMIT ... OFFSET`` and with
+``db.queries.fetch_page``, the latter both planned every time (``prepare=False``) and as
+a prepared statement (``prepare=True``). Reports the median of ``--repeat`` runs.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
+
+import psycopg
+
+from bench.common import print_table  # importing bench puts app/ on sys.path
+from db.bulk import copy_rows
+from db.connection import get_async_connection, get_connection
+from db.queries import Page, encode_cursor, fetch_page, listing_key
+
+TABLE = "bench_pagination"
+QUERY = f"SELECT id, title, created_at FROM {TABLE} WHERE NOT hidden"
+_EPOCH = datetime(2026, 1, 1, tzinfo=UTC)
+
+
+def seed(rows: int) -> None:
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"DROP TABLE IF EXISTS {TABLE};"
+                f" CREATE UNLOGGED TABLE {TABLE} (id bigint PRIMARY KEY, title text NOT NULL,"
+                " hidden boolean NOT NULL, created_at timestamptz NOT NULL)"
+            )
+        # Three rows per second, so created_at alone isn't unique and id breaks ties.
+        copy_rows(
+            conn,
+            TABLE,
+            ("id", "title", "hidden", "created_at"),
+            (
+                (i, f"Item {i}", i % 50 == 0, _EPOCH + timedelta(seconds=i // 3))
+                for i in range(rows)
+            ),
+        )
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE INDEX ON {TABLE} (created_at, id); ANALYZE {TABLE}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def drop() -> None:
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def timed(repeat: int, run: Callable[[], Awaitable[object]]) -> float:
+    """Median milliseconds of ``repeat`` calls of ``run``, after one untimed call."""
+    await run()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await run()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+async def measure(conn: psycopg.AsyncConnection, page: int, page_size: int, repeat: int) -> dict:
+    offset = (page - 1) * page_size
+    offset_sql = f"{QUERY} ORDER BY created_at, id LIMIT %s OFFSET %s"
+
+    async def by_offset() -> list[tuple]:
+        async with conn.cursor() as cur:
+            await cur.execute(offset_sql, (page_size, offset), prepare=False)
+            return await cur.fetchall()
+
+    # The cursor a client would hold on this page: the keys of the previous page's last row.
+    cursor = None
+    if offset:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"SELECT created_at, id FROM ({QUERY}) AS q ORDER BY created_at, id"
+                " LIMIT 1 OFFSET %s",
+                (offset - 1,),
+            )
+            cursor = encode_cursor(await cur.fetchone(), listing_key(QUERY, ("created_at", "id")))
+
+    def by_keyset(prepare: bool) -> Callable[[], Awaitable[Page]]:
+        async def run() -> Page:
+            return await fetch_page(
+                conn,
+                QUERY,
+                order_by=("created_at", "id"),
+                cursor=cursor,
+                limit=page_size,
+                prepare=prepare,
+            )
+
+        return run
+
+    offset_rows = await by_offset()
+    keyset_rows = (await by_keyset(False)()).rows
+    assert offset_rows == keyset_rows, f"page {page}: OFFSET and keyset pages differ"
+
+    result = {
+        "page": page,
+        "offset_ms": await timed(repeat, by_offset),
+        "keyset_ms": await timed(repeat, by_keyset(False)),
+        "keyset_prepared_ms": await timed(repeat, by_keyset(True)),
+    }
+    result["speedup"] = result["offset_ms"] / result["keyset_prepared_ms"]
+    return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    visible = args.rows - args.rows // 50
+    if max(args.pages) * args.page_size > visible:
+        parser.error(f"--rows {args.rows} has fewer than {max(args.pages)} pages")
+
+    seed(args.rows)
+    try:
+        conn = await get_async_connection(autocommit=True)
+        try:
+            rows = [await measure(conn, page, args.page_size, args.repeat) for page in args.pages]
+        finally:
+            await conn.close()
+    finally:
+        drop()
+
+    print(f"{args.rows} rows, {args.page_size} per page")
+    print_table(rows, ["page", "offset_ms", "keyset_ms", "keyset_prepared_ms", "speedup"])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
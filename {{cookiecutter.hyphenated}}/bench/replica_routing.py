@@ -0,0 +1,254 @@
+"""Check read-replica routing end to end, with a pass/fail exit status.
+
+    uv run --extra tests python -m bench.replica_routing --testcontainers
+    uv run --env-file .env.dev python -m bench.replica_routing --pause-replay
+
+Drives ``db.routing.get_read_db`` and ``get_write_db`` through an ASGI app in-process
+and checks that:
+
+- reads are spread over the replicas in rotation (``--requests`` concurrent reads)
+- a session that wrote reads from the primary until ``--sticky`` seconds have passed
+- with ``--pause-replay`` (real streaming replicas, superuser): a replica whose replay is
+  paused while the primary takes writes leaves the rotation, and comes back once resumed
+- with ``--testcontainers``: a replica that stops is taken out of rotation and reads fall
+  back to the primary without errors
+
+``--testcontainers`` starts two ``postgres:16-alpine`` containers, one acting as the
+primary and one as the replica; they don't replicate, so replay lag isn't exercised.
+Otherwise it uses ``DATABASE_URL`` and ``DATABASE_REPLICA_URLS``. Exits with status 1 if
+a check fails.
+"""
+
+import argparse
+import asyncio
+import collections
+import functools
+import sys
+import time
+from collections.abc import Callable
+from typing import Annotated, Protocol
+
+import httpx
+import psycopg
+from fastapi import Depends, FastAPI
+from starlette.middleware.sessions import SessionMiddleware
+
+from bench.common import print_table, summarize  # importing bench puts app/ on sys.path
+from core.config import settings
+from db import async_pool, routing
+from db.connection import get_async_connection
+
+# Which server answered: the replica pools' names, or "primary".
+WHO = "SELECT pg_is_in_recovery() OR system_identifier <> %s FROM pg_control_system()"
+
+ReadConnection = Annotated[psycopg.AsyncConnection, Depends(routing.get_read_db)]
+WriteConnection = Annotated[psycopg.AsyncConnection, Depends(routing.get_write_db)]
+
+
+class Check(Protocol):
+    def __call__(self, name: str, passed: bool, detail: str = "") -> None: ...
+
+
+def build_app(primary_id: int) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(SessionMiddleware, secret_key="bench")
+
+    @app.get("/read")
+    async def read(conn: ReadConnection) -> dict:
+        on_replica = await async_pool.fetch_val(conn, WHO, (primary_id,))
+        return {"server": _pool_name(conn) if on_replica else "primary"}
+
+    @app.post("/write")
+    async def write(conn: WriteConnection) -> dict:
+        await conn.execute("CREATE TABLE IF NOT EXISTS bench_replica_routing (at timestamptz)")
+        await conn.execute("INSERT INTO bench_replica_routing VALUES (now())")
+        await conn.commit()
+        return {"server": "primary"}
+
+    return app
+
+
+def _pool_name(conn: psycopg.AsyncConnection) -> str:
+    for replica in routing.replicas.replicas:
+        if id(conn) in replica.pool._in_use:
+            return replica.name
+    return "?"
+
+
+async def reads(client: httpx.AsyncClient, requests: int, concurrency: int) -> dict:
+    servers: collections.Counter[str] = collections.Counter()
+    latencies: list[float] = []
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.get("/read")
+            latencies.append(time.perf_counter() - start)
+            servers[response.json()["server"] if response.status_code == 200 else "error"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"servers": servers, **summarize(latencies, time.perf_counter() - start)}
+
+
+async def server_of_next_read(client: httpx.AsyncClient) -> str:
+    return (await client.get("/read")).json()["server"]
+
+
+async def wait_for(condition: Callable[[], bool], timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(0.1)
+    return condition()
+
+
+async def run(
+    args: argparse.Namespace,
+    primary_url: str | None,
+    replica_urls: list[str],
+    stop_replica: Callable[[], None] | None = None,
+) -> tuple[list[dict], dict]:
+    results = []
+
+    def check(name: str, passed: bool, detail: str = "") -> None:
+        results.append({"check": name, "result": "ok" if passed else "FAILED", "detail": detail})
+
+    async_pool._pool = async_pool.AsyncConnectionPool(
+        functools.partial(get_async_connection, primary_url), min_size=0, max_size=20
+    )
+    await async_pool._pool.open()
+    routing.replicas = routing.ReplicaRouter(
+        replica_urls,
+        strategy=args.strategy,
+        max_lag=args.max_lag,
+        check_interval=args.check_interval,
+    )
+    settings.db_replica_sticky_seconds = args.sticky
+    try:
+        async with async_pool.get_async_pool().connection() as conn:
+            primary_id = await async_pool.fetch_val(
+                conn, "SELECT system_identifier FROM pg_control_system()"
+            )
+        await routing.replicas.open()
+        in_rotation = [s.name for s in routing.replicas.status() if s.in_rotation]
+        check("replicas in rotation", bool(in_rotation), ", ".join(in_rotation))
+
+        app = build_app(primary_id)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            spread = await reads(client, args.requests, args.concurrency)
+            servers = spread.pop("servers")
+            check(
+                "reads spread over replicas",
+                set(servers) == set(in_rotation),
+                ", ".join(f"{name}: {count}" for name, count in sorted(servers.items())),
+            )
+
+            await client.post("/write")
+            after_write = await server_of_next_read(client)
+            await asyncio.sleep(args.sticky + 0.1)
+            after_window = await server_of_next_read(client)
+            check(
+                "read-after-write sticks to the primary",
+                after_write == "primary" and after_window != "primary",
+                f"right after: {after_write}, after {args.sticky}s: {after_window}",
+            )
+
+            if args.pause_replay:
+                await pause_replay(args, client, replica_urls, check)
+
+            if stop_replica is not None:
+                stop_replica()
+                out = await wait_for(
+                    lambda: not any(s.in_rotation for s in routing.replicas.status()),
+                    args.check_interval * 3 + 5,
+                )
+                fallback = await reads(client, 20, 5)
+                check(
+                    "stopped replica leaves rotation",
+                    out and set(fallback["servers"]) == {"primary"},
+                    ", ".join(f"{k}: {v}" for k, v in fallback["servers"].items()),
+                )
+    finally:
+        await routing.replicas.close()
+        await async_pool.close_async_pool()
+    return results, spread
+
+
+async def pause_replay(
+    args: argparse.Namespace, client: httpx.AsyncClient, replica_urls: list[str], check: Check
+) -> None:
+    conns = [await psycopg.AsyncConnection.connect(url, autocommit=True) for url in replica_urls]
+    try:
+        for conn in conns:
+            await conn.execute("SELECT pg_wal_replay_pause()")
+        # Replay lag only grows while the primary has something to replay.
+        deadline = time.monotonic() + args.max_lag + args.check_interval * 3 + 5
+        while time.monotonic() < deadline:
+            await client.post("/write")
+            if not any(s.in_rotation for s in routing.replicas.status()):
+                break
+            await asyncio.sleep(0.2)
+        lags = ", ".join(f"{s.name}: {s.lag:.1f}s" for s in routing.replicas.status() if s.lag)
+        check(
+            "lagging replicas leave rotation",
+            not any(s.in_rotation for s in routing.replicas.status()),
+            lags,
+        )
+    finally:
+        for conn in conns:
+            await conn.execute("SELECT pg_wal_replay_resume()")
+            await conn.close()
+    back = await wait_for(
+        lambda: all(s.in_rotation for s in routing.replicas.status()),
+        args.check_interval * 3 + 5,
+    )
+    check("caught-up replicas rejoin", back)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--testcontainers", action="store_true")
+    parser.add_argument("--pause-replay", action="store_true")
+    parser.add_argument("--strategy", choices=["round_robin", "least_busy"], default="round_robin")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--sticky", type=float, default=1.0)
+    parser.add_argument("--max-lag", type=float, default=1.0)
+    parser.add_argument("--check-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.testcontainers:
+        from testcontainers.postgres import PostgresContainer
+
+        with (
+            PostgresContainer("postgres:16-alpine") as primary,
+            PostgresContainer("postgres:16-alpine") as replica,
+        ):
+            urls = [
+                c.get_connection_url().replace("postgresql+psycopg2://", "postgresql://")
+                for c in (primary, replica)
+            ]
+            stop = replica.get_wrapped_container().stop
+            results, spread = await run(args, urls[0], urls[1:], stop_replica=stop)
+    else:
+        if not settings.database_replica_urls:
+            parser.error("DATABASE_REPLICA_URLS is not set; use --testcontainers")
+        results, spread = await run(args, None, settings.database_replica_urls)
+
+    print(
+        f"{args.requests} reads ({args.strategy}, concurrency {args.concurrency}):"
+        f" {spread['rps']:.0f}/s, p50 {spread['p50_ms']:.2f} ms, p99 {spread['p99_ms']:.2f} ms"
+    )
+    print_table(results, ["check", "result", "detail"])
+    if any(result["result"] != "ok" for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""Per-request cost of cookie sessions and server-side sessions.
+
+    uv run --env-file .env.dev python -m bench.session_overhead --session-bytes 2000
+
+A client with an established session reads it on most requests and changes it on one in
+``--write-every``. With Starlette's ``SessionMiddleware`` every request carries the whole
+signed session, which is verified and decoded each time and signed and resent whenever it
+changes. ``ServerSessionMiddleware`` (in-memory store here, so only the middleware is
+measured) sends a cookie only when the session is created or renewed.
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from starlette.middleware.sessions import SessionMiddleware
+
+from bench.common import print_table, summarize
+from core.sessions import ServerSessionMiddleware, SessionStore
+
+
+def build_app(kind: str, session_bytes: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/login")
+    async def login(request: Request) -> PlainTextResponse:
+        request.session["user"] = "bench"
+        request.session["cart"] = "x" * session_bytes
+        return PlainTextResponse("ok")
+
+    @app.get("/read")
+    async def read(request: Request) -> PlainTextResponse:
+        return PlainTextResponse(request.session["user"])
+
+    @app.get("/write")
+    async def write(request: Request) -> PlainTextResponse:
+        request.session["visits"] = request.session.get("visits", 0) + 1
+        return PlainTextResponse("ok")
+
+    if kind == "cookie":
+        app.add_middleware(SessionMiddleware, secret_key="bench")
+    else:
+        app.add_middleware(ServerSessionMiddleware, store=SessionStore(1000))
+    return app
+
+
+class Client:
+    """Raw ASGI calls that keep the session cookie, counting response header bytes."""
+
+    def __init__(self, app: FastAPI) -> None:
+        self.app = app
+        self.cookie = b""
+        self.header_bytes = 0
+
+    async def get(self, path: str) -> None:
+        headers = [(b"host", b"bench")]
+        if self.cookie:
+            headers.append((b"cookie", self.cookie))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": headers,
+            "client": ("127.0.0.1", 1234),
+            "server": ("bench", 80),
+        }
+
+        async def receive() -> dict:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: dict) -> None:
+            if message["type"] != "http.response.start":
+                return
+            for name, value in message["headers"]:
+                self.header_bytes += len(name) + len(value)
+                if name == b"set-cookie":
+                    self.cookie = value.split(b";", 1)[0]
+
+        await self.app(scope, receive, send)
+
+
+async def measure(client: Client, requests: int, write_every: int) -> dict:
+    client.header_bytes = 0
+    latencies = []
+    start = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        await client.get("/write" if i % write_every == 0 else "/read")
+        latencies.append(time.perf_counter() - t0)
+    result = summarize(latencies, time.perf_counter() - start)
+    result["cookie_bytes"] = len(client.cookie)
+    result["resp_header_bytes"] = client.header_bytes / requests
+    return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--session-bytes", type=int, default=500)
+    parser.add_argument("--write-every", type=int, default=10)
+    args = parser.parse_args()
+
+    clients = {}
+    for kind in ("cookie", "server"):
+        client = Client(build_app(kind, args.session_bytes))
+        await client.get("/login")
+        await measure(client, 500, args.write_every)  # warm up
+        clients[kind] = client
+
+    # Alternate between the apps and keep each one's best round, to filter out noise.
+    best: dict[str, dict] = {}
+    for _ in range(args.rounds):
+        for kind, client in clients.items():
+            result = await measure(client, args.requests // args.rounds, args.write_every)
+            if kind not in best or result["mean_ms"] < best[kind]["mean_ms"]:
+                best[kind] = result
+    rows = [{"sessions": kind, **result} for kind, result in best.items()]
+    print_table(
+        rows,
+        ["sessions", "rps", "mean_ms", "p50_ms", "p99_ms", "cookie_bytes", "resp_header_bytes"],
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""Startup time and memory per worker of ``app/server.py``, with and without preloading.
+
+    uv run --env-file .env.prod python -m bench.startup --workers 4
+
+Starts the server on a free port, times how long until ``/`` answers, then reads each
+worker's RSS and PSS from ``/proc`` (Linux only). PSS splits shared pages between the
+processes sharing them, so it shows what preloading saves: workers forked after the app
+is imported share its modules copy-on-write.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+from bench.common import print_table
+
+SERVER = Path(__file__).resolve().parent.parent / "app" / "server.py"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(url: str, timeout: float) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except OSError:
+            time.sleep(0.02)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def children(pid: int) -> list[int]:
+    pids = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        pids += [int(p) for p in (task / "children").read_text().split()]
+    return pids
+
+
+def memory_mib(pid: int) -> dict[str, float]:
+    values = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, value, *_ = line.split()
+        values[name.rstrip(":")] = int(value) / 1024
+    return {"rss_mib": values["Rss"], "pss_mib": values["Pss"]}
+
+
+def measure(workers: int, preload: bool, timeout: float) -> dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "APP_HOST": "127.0.0.1",
+        "APP_PORT": str(port),
+        "APP_WORKERS": str(workers),
+        "APP_HOT_RELOAD": "false",
+        "APP_PRELOAD": str(preload).lower(),
+        "LOG_LEVEL": "WARNING",
+    }
+    process = subprocess.Popen([sys.executable, str(SERVER)], env=env)
+    try:
+        startup = wait_until_ready(f"http://127.0.0.1:{port}/", timeout)
+        time.sleep(1)  # let every worker finish its lifespan startup
+        worker_memory = [memory_mib(pid) for pid in children(process.pid)]
+        supervisor = memory_mib(process.pid)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+    count = len(worker_memory) or 1
+    rss = sum(m["rss_mib"] for m in worker_memory) / count
+    pss = sum(m["pss_mib"] for m in worker_memory) / count
+    return {
+        "preload": preload,
+        "workers": len(worker_memory),
+        "startup_s": startup,
+        "worker_rss_mib": rss,
+        "worker_pss_mib": pss,
+        "total_pss_mib": pss * len(worker_memory) + supervisor["pss_mib"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    rows = [measure(args.workers, preload, args.timeout) for preload in (True, False)]
+    print_table(
+        rows,
+        ["preload", "workers", "startup_s", "worker_rss_mib", "worker_pss_mib", "total_pss_mib"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Cost of verifying a bearer token with and without ``TokenVerifier``'s cache.
+
+    uv run --env-file .env.dev python -m bench.token_verification --tokens 1000
+
+Verifies tokens drawn from ``--tokens`` distinct ones, as many clients each reusing their
+own token would, with the cache disabled and enabled.
+"""
+
+import argparse
+import random
+import time
+
+from bench.common import print_table
+from core.security import TokenVerifier
+
+
+def measure(verifier: TokenVerifier, tokens: list[str], calls: int) -> dict:
+    rng = random.Random(0)
+    sequence = [rng.choice(tokens) for _ in range(calls)]
+    for token in tokens:
+        verifier.verify(token)  # warm up
+    start = time.perf_counter()
+    for token in sequence:
+        verifier.verify(token)
+    elapsed = time.perf_counter() - start
+    return {"calls_per_s": calls / elapsed, "mean_us": elapsed / calls * 1e6}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=1000, help="distinct tokens in use")
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    secret = "bench-" + "x" * 32
+    issuer = TokenVerifier(secret)
+    tokens = [
+        issuer.create(str(i), claims={"role": "user", "scopes": ["orders:read"]})
+        for i in range(args.tokens)
+    ]
+    verifiers = {
+        "uncached": TokenVerifier(secret, max_entries=0),
+        "cached": TokenVerifier(secret, max_entries=max(args.tokens, 1)),
+    }
+
+    best: dict[str, dict] = {}
+    for _ in range(args.rounds):
+        for name, verifier in verifiers.items():
+            result = measure(verifier, tokens, args.calls // args.rounds)
+            if name not in best or result["mean_us"] < best[name]["mean_us"]:
+                best[name] = result
+    rows = [{"verify": name, **result} for name, result in best.items()]
+    rows[1]["speedup"] = rows[0]["mean_us"] / rows[1]["mean_us"]
+    print_table(rows, ["verify", "calls_per_s", "mean_us", "speedup"])
+
+
+if __name__ == "__main__":
+    main()
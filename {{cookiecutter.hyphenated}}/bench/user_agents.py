@@ -0,0 +1,84 @@
+"""User-Agent parsing with and without ``UserAgentParser``'s cache.
+
+    uv run python -m bench.user_agents --distinct 5000 --cache-size 4096
+
+Real traffic is heavily skewed: a few browser builds send most requests and a long tail
+sends a handful each. Requests here draw from ``--distinct`` synthetic User-Agents with
+Zipf-distributed popularity (``--skew``), so the hit rate is close to a production one.
+"""
+
+import argparse
+import random
+import time
+
+from bench.common import print_table
+from services.user_agent import UserAgentParser, _parse
+
+_TEMPLATES = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/{major}.0.{build}.{patch} Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+    "Version/{minor}.{patch} Safari/605.1.15",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{major}.0) Gecko/20100101 Firefox/{major}.0",
+    "Mozilla/5.0 (Linux; Android {minor}; SM-S9{patch}B) AppleWebKit/537.36 (KHTML, like "
+    "Gecko) Chrome/{major}.0.{build}.{patch} Mobile Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_{minor} like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.{minor} Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/{major}.0.{build}.{patch} Safari/537.36 Edg/{major}.0.{build}.{patch}",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+]
+
+
+def synthetic_user_agents(count: int, rng: random.Random) -> list[str]:
+    user_agents: dict[str, None] = {}
+    while len(user_agents) < count:
+        template = rng.choice(_TEMPLATES)
+        user_agents[
+            template.format(
+                major=rng.randint(100, 130),
+                minor=rng.randint(1, 17),
+                build=rng.randint(4000, 7000),
+                patch=rng.randint(0, 200),
+            )
+        ] = None
+    return list(user_agents)
+
+
+def measure(parse: object, requests: list[str]) -> dict:
+    start = time.perf_counter()
+    for header in requests:
+        parse(header)
+    elapsed = time.perf_counter() - start
+    return {"parses_per_s": len(requests) / elapsed, "mean_us": elapsed / len(requests) * 1e6}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--distinct", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--cache-size", type=int, default=4096)
+    parser.add_argument("--uncached-requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    population = synthetic_user_agents(args.distinct, rng)
+    weights = [1 / rank**args.skew for rank in range(1, len(population) + 1)]
+    requests = rng.choices(population, weights, k=args.requests)
+
+    _parse(population[0])  # import user_agents outside the timings
+    cached = UserAgentParser(args.cache_size)
+    rows = [
+        {"parser": "uncached", **measure(_parse, requests[: args.uncached_requests])},
+        {"parser": "cached", **measure(cached.parse, requests)},
+    ]
+    stats = cached.stats()
+    rows[1]["hit_rate"] = stats.hit_rate
+    rows[1]["speedup"] = rows[0]["mean_us"] / rows[1]["mean_us"]
+    print(f"{args.distinct} distinct User-Agents, {stats.entries} cached")
+    print_table(rows, ["parser", "parses_per_s", "mean_us", "hit_rate", "speedup"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+-- migrate:up
+-- Shared response cache (see app/db/response_cache.py). UNLOGGED: contents are
+-- disposable, so skip WAL writes and lose the table on crash.
+CREATE UNLOGGED TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    status SMALLINT NOT NULL,
+    headers JSONB NOT NULL,
+    body BYTEA NOT NULL,
+    etag TEXT NOT NULL,
+    tags TEXT[] NOT NULL DEFAULT ARRAY[]::TEXT[],
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS response_cache_tags_idx ON response_cache USING GIN (tags);
+CREATE INDEX IF NOT EXISTS response_cache_expires_at_idx ON response_cache (expires_at);
+
+-- migrate:down
+DROP TABLE IF EXISTS response_cache;
@@ -0,0 +1,12 @@
+-- migrate:up
+-- Server-side sessions (see app/db/sessions.py). The session cookie holds only the id.
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data JSONB NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS sessions_expires_at_idx ON sessions (expires_at);
+
+-- migrate:down
+DROP TABLE IF EXISTS sessions;
@@ -0,0 +1,12 @@
+-- migrate:up
+-- Bearer tokens revoked before they expire (see app/db/tokens.py). Rows are useless once
+-- the token has expired and are deleted when workers start.
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    token_id TEXT PRIMARY KEY,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS revoked_tokens_expires_at_idx ON revoked_tokens (expires_at);
+
+-- migrate:down
+DROP TABLE IF EXISTS revoked_tokens;
@@ -0,0 +1,31 @@
+-- migrate:up
+-- Background jobs (see app/db/jobs.py and app/worker.py). Workers claim due jobs with
+-- FOR UPDATE SKIP LOCKED, so each job goes to one worker however many are polling.
+-- Finished jobs are deleted; jobs that used up their attempts stay as 'failed'.
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    queue TEXT NOT NULL DEFAULT 'default',
+    task TEXT NOT NULL,
+    args JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'failed')),
+    priority SMALLINT NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    -- While running: when the worker's lease runs out and another worker may take it over
+    locked_until TIMESTAMPTZ,
+    -- Optional deduplication key: at most one queued or running job per key
+    key TEXT,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS jobs_dequeue_idx ON jobs (queue, priority DESC, run_at, id)
+    WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS jobs_locked_until_idx ON jobs (locked_until)
+    WHERE status = 'running';
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_key_idx ON jobs (key)
+    WHERE status <> 'failed';
+
+-- migrate:down
+DROP TABLE IF EXISTS jobs;
@@ -0,0 +1,105 @@
+"""Each test starts from an empty database, however its writes were committed.
+
+The tests come in pairs: the first commits a row, the second checks it is gone.
+"""
+
+import os
+from typing import Annotated
+
+import psycopg
+import psycopg2.extensions
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from core.config import settings
+from db.async_pool import execute, fetch_val, get_async_db
+from db.pool import get_db
+from main import app
+from tests.conftest import get_test_connection
+
+INSERT = "INSERT INTO revoked_tokens (token_id, expires_at) VALUES (%s, now() + interval '1 hour')"
+COUNT = "SELECT count(*) FROM revoked_tokens"
+
+SyncConnection = Annotated[psycopg2.extensions.connection, Depends(get_db)]
+AsyncConnection = Annotated[psycopg.AsyncConnection, Depends(get_async_db)]
+
+routes = FastAPI()
+# The conftest overrides the database dependencies on the app's own overrides.
+routes.dependency_overrides = app.dependency_overrides
+
+
+@routes.post("/sync/{token_id}")
+def revoke_sync(token_id: str, conn: SyncConnection) -> None:
+    with conn.cursor() as cur:
+        cur.execute(INSERT, (token_id,))
+    conn.commit()
+
+
+@routes.post("/async/{token_id}")
+async def revoke_async(token_id: str, conn: AsyncConnection) -> None:
+    await execute(conn, INSERT, (token_id,))
+    await conn.commit()
+
+
+@routes.get("/async")
+async def count_async(conn: AsyncConnection) -> int:
+    return await fetch_val(conn, COUNT)
+
+
+def count(conn: psycopg2.extensions.connection) -> int:
+    with conn.cursor() as cur:
+        cur.execute(COUNT)
+        return cur.fetchone()[0]
+
+
+def test_commit_through_get_db():
+    client = TestClient(routes)
+    assert client.post("/sync/a").status_code == 200
+    assert count(get_test_connection()) == 1
+
+
+def test_commit_through_get_db_is_rolled_back():
+    assert count(get_test_connection()) == 0
+
+
+def test_commit_through_get_async_db():
+    with TestClient(routes) as client:
+        assert client.post("/async/a").status_code == 200
+        assert client.post("/async/b").status_code == 200
+        assert client.get("/async").json() == 2
+
+
+def test_commit_through_get_async_db_is_rolled_back():
+    with TestClient(routes) as client:
+        assert client.get("/async").json() == 0
+    assert count(get_test_connection()) == 0
+
+
+@pytest.mark.truncate
+def test_truncate_commits_for_real():
+    conn = get_test_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(INSERT, ("a",))
+        conn.commit()
+        other = get_test_connection()
+        try:
+            assert count(other) == 1
+        finally:
+            other.close()
+    finally:
+        conn.close()
+
+
+def test_truncate_empties_tables():
+    assert count(get_test_connection()) == 0
+
+
+def test_database_per_worker(setup_test_database):
+    # Under pytest-xdist every worker has a database of its own, which the app uses too.
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "main")
+    assert settings.database_url == setup_test_database
+    with get_test_connection().cursor() as cur:
+        cur.execute("SELECT current_database()")
+        assert cur.fetchone()[0].endswith(f"_{worker}_{os.getpid()}")
@@ -0,0 +1,104 @@
+"""Exports stream through ``db.streaming`` without holding the rows in memory."""
+
+import asyncio
+import gc
+
+import pytest
+from fastapi import FastAPI
+
+from bench.export_memory import rss_mib
+from db import async_pool
+from db.streaming import FORMATS
+from routers import export
+
+ROWS = 250_000
+# Fetched all at once the rows take about 60 MiB; streamed, only a batch at a time is held.
+MAX_GROWTH_MIB = 16.0
+
+
+@pytest.fixture
+def export_rows(db_conn, monkeypatch):
+    """A committed table of ``ROWS`` rows, registered as the ``rows`` export."""
+    with db_conn.cursor() as cur:
+        cur.execute(
+            "CREATE TABLE IF NOT EXISTS export_rows"
+            " (id bigint PRIMARY KEY, name text NOT NULL, created_at timestamptz NOT NULL)"
+        )
+        cur.execute(
+            "INSERT INTO export_rows"
+            " SELECT g, md5(g::text), now() - g * interval '1 second'"
+            " FROM generate_series(1, %s) AS g",
+            (ROWS,),
+        )
+    db_conn.commit()
+    monkeypatch.setitem(
+        export.EXPORTS, "rows", "SELECT id, name, created_at FROM export_rows ORDER BY id"
+    )
+
+
+async def stream(app: FastAPI, path: str, query: str) -> tuple[int, int, float]:
+    """GET ``path`` from ``app`` over ASGI, without keeping the body.
+
+    Returns the status, the number of lines sent and the RSS growth in MiB at the peak.
+    """
+    status = 0
+    lines = 0
+    chunks = 0
+    gc.collect()
+    before = peak = rss_mib()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"test")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+
+    async def receive() -> dict:
+        # Starlette waits on this for a disconnect while streaming; there is none.
+        await asyncio.Event().wait()
+        return {}
+
+    async def send(message: dict) -> None:
+        nonlocal status, lines, chunks, peak
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            lines += message.get("body", b"").count(b"\n")
+            chunks += 1
+            if chunks % 10 == 0:
+                peak = max(peak, rss_mib())
+
+    await app(scope, receive, send)
+    return status, lines, max(peak, rss_mib()) - before
+
+
+@pytest.mark.truncate
+def test_export_memory_stays_flat(export_rows):
+    app = FastAPI()
+    app.include_router(export.router)
+
+    async def run() -> dict[str, tuple[int, int, float]]:
+        await async_pool.open_async_pool()
+        try:
+            return {
+                output_format: await stream(app, "/export/rows", f"format={output_format}")
+                for output_format in FORMATS
+            }
+        finally:
+            await async_pool.close_async_pool()
+
+    for output_format, (status, lines, growth) in asyncio.run(run()).items():
+        assert status == 200
+        # One line per row, plus the header for CSV.
+        assert lines >= ROWS, f"{output_format}: only {lines} of {ROWS} rows sent"
+        assert growth < MAX_GROWTH_MIB, (
+            f"{output_format}: RSS grew by {growth:.1f} MiB (limit {MAX_GROWTH_MIB} MiB)"
+        )
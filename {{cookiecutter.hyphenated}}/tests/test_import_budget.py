@@ -0,0 +1,41 @@
+"""Importing the app stays within the cold-start budget of ``bench/import_budget.py``."""
+
+import os
+import subprocess
+import sys
+
+from bench.import_budget import DEFAULT_BUDGET_MS, ROOT
+
+BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", DEFAULT_BUDGET_MS))
+RUNS = 3
+
+
+def import_cpu_ms(module: str) -> float:
+    """CPU time of importing ``module`` in a fresh interpreter, in milliseconds.
+
+    Unlike the wall time ``-X importtime`` reports, it doesn't grow while tests on other
+    pytest-xdist workers take the CPU.
+    """
+    code = (
+        "import time; start = time.process_time(); "
+        f"import {module}; print(time.process_time() - start)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": str(ROOT / "app")},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.splitlines()[-1]) * 1000
+
+
+def test_import_main_within_budget():
+    # The first import may be compiling bytecode; it doesn't count.
+    import_cpu_ms("main")
+    total_ms = min(import_cpu_ms("main") for _ in range(RUNS))
+    assert total_ms <= BUDGET_MS, (
+        f"import main took {total_ms:.0f} ms (budget {BUDGET_MS:.0f} ms): "
+        "import heavy modules lazily where they are used"
+    )
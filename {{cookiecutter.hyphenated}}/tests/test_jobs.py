@@ -0,0 +1,197 @@
+"""The job queue in ``db.jobs`` and the worker in ``app/worker.py``.
+
+Jobs are claimed and finished on connections of the async pool, which commit for real,
+so these tests truncate the tables afterwards instead of rolling back.
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+import psycopg
+import pytest
+
+from db import jobs
+from db.async_pool import close_async_pool, execute, fetch_one, get_async_pool, open_async_pool
+from tests.conftest import get_test_connection
+from worker import Worker
+
+pytestmark = pytest.mark.truncate
+
+T = TypeVar("T")
+
+QUEUE = "tests"
+_ran: list[int] = []
+
+
+@jobs.task("tests.record")
+async def record(i: int) -> None:
+    _ran.append(i)
+
+
+def enqueue(count: int, task: str = "tests.record", **kwargs) -> list[int]:
+    conn = get_test_connection()
+    try:
+        ids = [jobs.enqueue(conn, task, {"i": i}, queue=QUEUE, **kwargs) for i in range(count)]
+        conn.commit()
+    finally:
+        conn.close()
+    return ids
+
+
+def with_pool(test: Callable[[], Awaitable[T]]) -> T:
+    """Run ``test`` in a new event loop, with the async pool open."""
+
+    async def run() -> T:
+        await open_async_pool()
+        try:
+            return await test()
+        finally:
+            await close_async_pool()
+
+    return asyncio.run(run())
+
+
+async def wait_for(condition: Callable[[], bool], timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_dequeue_skips_locked_jobs():
+    ids = enqueue(20)
+
+    async def test() -> list[jobs.Job]:
+        pool = get_async_pool()
+        async with pool.connection() as holder, pool.connection() as conn:
+            # Another transaction holds the first five jobs: dequeue passes them by.
+            await execute(holder, "SELECT id FROM jobs ORDER BY id LIMIT 5 FOR UPDATE")
+            claimed = await asyncio.wait_for(jobs.dequeue(conn, [QUEUE], 10, lease=60), 5)
+            await holder.rollback()
+            return claimed
+
+    claimed = with_pool(test)
+    assert [job.id for job in claimed] == ids[5:15]
+    assert all(job.attempts == 1 for job in claimed)
+
+
+def test_concurrent_dequeues_get_disjoint_jobs():
+    ids = enqueue(100)
+
+    async def claim() -> list[int]:
+        async with get_async_pool().connection() as conn:
+            return [job.id for job in await jobs.dequeue(conn, [QUEUE], 25, lease=60)]
+
+    async def test() -> list[list[int]]:
+        return await asyncio.gather(*(claim() for _ in range(4)))
+
+    batches = with_pool(test)
+    assert [len(batch) for batch in batches] == [25] * 4
+    assert sorted(job_id for batch in batches for job_id in batch) == ids
+
+
+def test_fail_retries_with_backoff_then_gives_up(monkeypatch):
+    monkeypatch.setattr(jobs.settings, "job_retry_base_delay", 10.0)
+    monkeypatch.setattr(jobs.settings, "job_retry_max_delay", 15.0)
+    monkeypatch.setattr(jobs.random, "uniform", lambda low, high: 1.0)
+    [job_id] = enqueue(1, max_attempts=3)
+
+    async def attempt(conn: psycopg.AsyncConnection) -> tuple[bool, tuple]:
+        # Make the job due again, whatever its backoff.
+        await execute(conn, "UPDATE jobs SET run_at = now() WHERE id = %s", (job_id,))
+        await conn.commit()
+        [job] = await jobs.dequeue(conn, [QUEUE], 10, lease=60)
+        retry = await jobs.fail(conn, job, "boom")
+        row = await fetch_one(
+            conn,
+            "SELECT status, attempts, last_error,"
+            " round(extract(epoch FROM run_at - now()))::int FROM jobs WHERE id = %s",
+            (job_id,),
+        )
+        await conn.commit()
+        return retry, row
+
+    async def test() -> list[tuple[bool, tuple]]:
+        async with get_async_pool().connection() as conn:
+            results = [await attempt(conn) for _ in range(3)]
+            # Not due while backing off.
+            await execute(conn, "UPDATE jobs SET status = 'queued' WHERE id = %s", (job_id,))
+            assert await jobs.dequeue(conn, [QUEUE], 10, lease=60) == []
+            return results
+
+    # The delay doubles from JOB_RETRY_BASE_DELAY up to JOB_RETRY_MAX_DELAY.
+    assert with_pool(test) == [
+        (True, ("queued", 1, "boom", 10)),
+        (True, ("queued", 2, "boom", 15)),
+        (False, ("failed", 3, "boom", 15)),
+    ]
+
+
+def test_worker_survives_database_errors(monkeypatch):
+    _ran.clear()
+    enqueue(3)
+    dequeue = jobs.dequeue
+    calls = 0
+
+    async def flaky_dequeue(*args, **kwargs) -> list[jobs.Job]:
+        nonlocal calls
+        calls += 1
+        if calls <= 2:
+            raise psycopg.OperationalError("server closed the connection unexpectedly")
+        return await dequeue(*args, **kwargs)
+
+    monkeypatch.setattr(jobs, "dequeue", flaky_dequeue)
+
+    async def test() -> Worker:
+        worker = Worker([QUEUE], poll_interval=0.1)
+        runner = asyncio.create_task(worker.run())
+        try:
+            await wait_for(lambda: worker.completed == 3)
+        finally:
+            worker.stop()
+            await runner
+        return worker
+
+    worker = with_pool(test)
+    assert calls > 2
+    assert sorted(_ran) == [0, 1, 2]
+    assert worker.failed == 0
+
+
+def test_worker_reruns_jobs_it_could_not_mark_done(monkeypatch):
+    _ran.clear()
+    enqueue(1)
+    complete = jobs.complete
+    calls = 0
+
+    async def flaky_complete(*args, **kwargs) -> None:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise psycopg.OperationalError("server closed the connection unexpectedly")
+        await complete(*args, **kwargs)
+
+    monkeypatch.setattr(jobs, "complete", flaky_complete)
+
+    async def test() -> Worker:
+        # The job stays running in the table until its lease runs out, then runs again.
+        worker = Worker([QUEUE], poll_interval=0.1, lease=1.0)
+        runner = asyncio.create_task(worker.run())
+        try:
+            await wait_for(lambda: worker.completed == 1)
+        finally:
+            worker.stop()
+            await runner
+        return worker
+
+    with_pool(test)
+    assert _ran == [0, 0]
+    conn = get_test_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM jobs")
+            assert cur.fetchone()[0] == 0
+    finally:
+        conn.close()
@@ -0,0 +1,164 @@
+"""Read replica routing in ``db.routing``.
+
+The replicas are the ``replica_url`` database under different ``application_name``s, so
+each read shows which pool served it.
+"""
+
+import asyncio
+import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Annotated
+from urllib.parse import urlsplit
+
+import psycopg
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from starlette.middleware.sessions import SessionMiddleware
+
+from db import routing
+from db.async_pool import close_async_pool, fetch_one, fetch_val, open_async_pool
+from db.routing import ReplicaRouter, get_read_db, get_write_db
+
+NAME = "SELECT current_setting('application_name')"
+
+ReadConnection = Annotated[psycopg.AsyncConnection, Depends(get_read_db)]
+WriteConnection = Annotated[psycopg.AsyncConnection, Depends(get_write_db)]
+
+
+def named(url: str, name: str) -> str:
+    """``url``, connecting with ``application_name`` set to ``name``."""
+    parts = urlsplit(url)
+    query = f"{parts.query}&" if parts.query else ""
+    return parts._replace(query=f"{query}application_name={name}").geturl()
+
+
+@asynccontextmanager
+async def open_router(replica_url: str, **kwargs) -> AsyncIterator[ReplicaRouter]:
+    """An open router over replicas ``a`` and ``b``, with the primary's pool open too."""
+    router = ReplicaRouter(
+        [named(replica_url, "a"), named(replica_url, "b")], check_interval=60, **kwargs
+    )
+    await open_async_pool()
+    await router.open()
+    try:
+        yield router
+    finally:
+        await router.close()
+        await close_async_pool()
+
+
+async def read_from(router: ReplicaRouter) -> str:
+    async with router.connection() as conn:
+        return await fetch_val(conn, NAME)
+
+
+def test_round_robin_alternates(replica_url):
+    async def test() -> list[str]:
+        async with open_router(replica_url) as router:
+            return [await read_from(router) for _ in range(4)]
+
+    assert asyncio.run(test()) == ["a", "b", "a", "b"]
+
+
+def test_least_busy_avoids_the_busy_replica(replica_url):
+    async def test() -> list[str]:
+        async with open_router(replica_url, strategy="least_busy") as router:
+            a, b = router.replicas
+            async with a.pool.connection():
+                reads = [await read_from(router) for _ in range(2)]
+            async with b.pool.connection():
+                reads += [await read_from(router) for _ in range(2)]
+            return reads
+
+    assert asyncio.run(test()) == ["b", "b", "a", "a"]
+
+
+def test_lagging_replicas_leave_rotation(replica_url, monkeypatch):
+    async def test() -> list[list[str]]:
+        async with open_router(replica_url, max_lag=5.0) as router:
+            primary = await read_from(ReplicaRouter([]))
+            reads = []
+            for lag_query in (
+                # b is 30 seconds behind
+                "SELECT CASE current_setting('application_name') WHEN 'b' THEN 30 ELSE 0 END",
+                # both are
+                "SELECT 30",
+                # both caught up
+                "SELECT 0",
+            ):
+                monkeypatch.setattr(routing, "LAG_QUERY", f"{lag_query}::float8")
+                await router.check()
+                names = [await read_from(router) for _ in range(2)]
+                reads.append(["primary" if name == primary else name for name in names])
+            return reads
+
+    assert asyncio.run(test()) == [["a", "a"], ["primary", "primary"], ["a", "b"]]
+
+
+def test_reads_stick_to_primary_after_a_write(replica_url, monkeypatch):
+    monkeypatch.setattr(routing.settings, "db_replica_sticky_seconds", 0.5)
+    router = ReplicaRouter([named(replica_url, "a")], check_interval=60)
+    monkeypatch.setattr(routing, "replicas", router)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        await open_async_pool()
+        await router.open()
+        yield
+        await router.close()
+        await close_async_pool()
+
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(SessionMiddleware, secret_key="test")
+
+    @app.get("/read")
+    async def read(conn: ReadConnection) -> str:
+        return await fetch_val(conn, NAME)
+
+    @app.post("/write")
+    async def write(conn: WriteConnection) -> str:
+        return await fetch_val(conn, NAME)
+
+    with TestClient(app) as client:
+        assert client.get("/read").json() == "a"
+        primary = client.post("/write").json()
+        assert primary != "a"
+        # The session that wrote reads its write back from the primary...
+        assert client.get("/read").json() == primary
+        # ...others read from the replica.
+        session = dict(client.cookies)
+        client.cookies.clear()
+        assert client.get("/read").json() == "a"
+        client.cookies.update(session)
+        assert client.get("/read").json() == primary
+        time.sleep(0.6)
+        assert client.get("/read").json() == "a"
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_REPLICA_URL"), reason="needs TEST_REPLICA_URL")
+@pytest.mark.truncate
+def test_replica_replays_the_primarys_writes(replica_url, db_conn):
+    with db_conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO revoked_tokens (token_id, expires_at)"
+            " VALUES ('replicated', now() + interval '1 hour')"
+        )
+    db_conn.commit()
+
+    async def test() -> tuple[bool, int, list[bool]]:
+        async with open_router(replica_url) as router:
+            deadline = time.monotonic() + 10
+            while True:
+                async with router.connection() as conn:
+                    in_recovery, count = await fetch_one(
+                        conn,
+                        "SELECT pg_is_in_recovery(), (SELECT count(*) FROM revoked_tokens)",
+                    )
+                if count or time.monotonic() > deadline:
+                    return in_recovery, count, [r.in_rotation for r in router.replicas]
+                await asyncio.sleep(0.05)
+
+    assert asyncio.run(test()) == (True, 1, [True, True])